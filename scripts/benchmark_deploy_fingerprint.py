@@ -0,0 +1,136 @@
+#!/usr/bin/env python3
+"""
+Checks that the Deploy task (tasks/deploy.py) builds byte-identical packages from
+the same source and skips deploys an org already has, against the mock Metadata API.
+
+A synthetic source tree is built twice, the second time after its files' mtimes
+move and with the transform cache warm; both packages must be the same bytes.
+With skip_unchanged, deploying it again must make no deploy call, while a changed
+class, another org or other test settings must deploy.  Validations (check_only)
+neither skip nor change what is recorded.
+
+    python scripts/benchmark_deploy_fingerprint.py [--classes 1000] [--objects 50]
+
+Requires CumulusCI to be installed.
+"""
+
+import argparse
+import json
+import os
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from generate_synthetic_source import TOKEN, generate
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.deploy import Deploy
+
+USERNAME = "fingerprint@example.com"
+
+
+def make_task(path: Path, api: MockMetadataApi, work: Path, org_id: str = "00D000000000000001", **options):
+    org_config = OrgConfig(
+        {"instance_url": api.url, "org_id": org_id, "username": USERNAME, "access_token": "TOKEN"},
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(
+        Deploy,
+        {
+            "path": str(path),
+            "unmanaged": True,
+            "skip_unchanged": True,
+            "transform_cache": True,
+            "source_convert": "python",
+            "poll_min_interval": 0.02,
+            "poll_max_interval": 0.1,
+            "transforms": [
+                {
+                    "transform": "find_replace",
+                    "options": {"patterns": [{"find": TOKEN, "inject_username": True}]},
+                }
+            ],
+            **options,
+        },
+        org_config=org_config,
+    )
+    task.project_config.repo_info["root"] = str(work)
+    task.project_config._cache_dir = work / ".cci"
+    return task
+
+
+def build(path: Path, api: MockMetadataApi, work: Path):
+    task = make_task(path, api, work)
+    started = time.perf_counter()
+    package_zip = task._get_package_zip(str(path))
+    return package_zip, time.perf_counter() - started
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=1000)
+    parser.add_argument("--objects", type=int, default=50)
+    args = parser.parse_args()
+    problems = []
+
+    with tempfile.TemporaryDirectory() as work, MockMetadataApi(checks_until_done=1) as api:
+        work = Path(work)
+        tree = generate(str(work), objects=args.objects, classes=args.classes, resource_kb=256, token_ratio=0.2)
+        (work / "sfdx-project.json").write_text(
+            json.dumps({"packageDirectories": [{"path": "force-app", "default": True}]}), "utf-8"
+        )
+        root = Path(tree.root)
+
+        first, cold = build(root, api, work)
+        later = time.time() + 3600
+        for path in root.rglob("*"):
+            os.utime(path, (later, later))
+        second, warm = build(root, api, work)
+        print(f"build, cold cache          {cold:6.2f}s  ({len(first)} bytes)")
+        print(f"build, warm cache          {warm:6.2f}s")
+        if first != second:
+            problems.append("two builds of the same source gave different packages")
+
+        def deploy(label: str, expect_deploy: bool, **options) -> None:
+            count = len(api.deploys)
+            task = make_task(root, api, work, **options)
+            started = time.perf_counter()
+            task._run_task()
+            elapsed = time.perf_counter() - started
+            deployed = len(api.deploys) - count
+            print(f"{label:<26} {elapsed:6.2f}s  ({deployed} deploys)")
+            if deployed != (1 if expect_deploy else 0):
+                problems.append(f"{label}: {deployed} deploys, expected {1 if expect_deploy else 0}")
+
+        deploy("first deploy", True)
+        deploy("unchanged", False)
+        deploy("unchanged, chunked", False, chunked=True)
+        deploy("validation", True, check_only=True)
+        deploy("unchanged after it", False)
+        deploy("other test level", True, test_level="RunLocalTests")
+        deploy("back to the first", True)
+        deploy("another org", True, org_id="00D000000000000002")
+        deploy("unchanged in that org", False, org_id="00D000000000000002")
+
+        cls = root / "main" / "default" / "classes" / "SyntheticClass00001.cls"
+        with open(cls, "a", encoding="utf-8") as f:
+            f.write("// changed\n")
+        deploy("one class changed", True)
+        deploy("unchanged again", False)
+        deploy("without skip_unchanged", True, skip_unchanged=False)
+        deploy("unchanged once more", False)
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Compares the stock fixed-schedule deploy status polling with the Deploy task's
+adaptive polling (tasks/deploy_polling.py) against a simulated status endpoint.
+
+Each scenario is a deploy timeline (time queued, time deploying components, time
+running tests) served by scripts/mock_metadata_api.py.  For both pollers this
+reports the number of status checks and how long after the deploy actually
+finished the poller noticed.  Timelines and poll intervals are multiplied by
+--time-scale so the comparison runs quickly; the ratios are what matter.
+
+    python scripts/benchmark_deploy_polling.py [--time-scale 0.05] [--repeat 3]
+
+Requires CumulusCI to be installed.
+"""
+
+import argparse
+import logging
+import statistics
+import time
+from types import SimpleNamespace
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.salesforce_api.metadata import ApiDeploy
+from cumulusci.tests.util import DummyKeychain, create_project_config
+
+from tasks.deploy import DeployApi
+
+# An empty zip: the mock doesn't look inside it
+EMPTY_ZIP = "UEsFBgAAAAAAAAAAAAAAAAAAAAAAAA=="
+
+# name: (queue, component, test seconds, components, tests)
+SCENARIOS = {
+    "components_only": (2, 15, 0, 400, 0),
+    "with_tests": (5, 20, 120, 400, 250),
+    "long_queue": (90, 20, 60, 400, 100),
+}
+
+
+def run(api_class, api: MockMetadataApi, scale: float):
+    ApiDeploy.check_interval = scale
+    task = SimpleNamespace(
+        org_config=OrgConfig(
+            {
+                "instance_url": api.url,
+                "org_id": "00D000000000000001",
+                "username": "benchmark@example.com",
+                "access_token": "TOKEN",
+            },
+            "benchmark",
+            keychain=DummyKeychain(),
+        ),
+        project_config=create_project_config(),
+        logger=logging.getLogger("benchmark"),
+        poll_intervals=(1 * scale, 30 * scale),
+        progress_listeners=[],
+    )
+    checks_before = api.calls["checkDeployStatus"]
+    api_class(task, EMPTY_ZIP, purge_on_delete=False)()
+    noticed = time.monotonic()
+    return api.calls["checkDeployStatus"] - checks_before, noticed - api.done_at(api.deploys[-1])
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--time-scale", type=float, default=0.05)
+    parser.add_argument("--repeat", type=int, default=3)
+    args = parser.parse_args()
+    scale = args.time_scale
+
+    print(f"{'scenario':<16} {'poller':<9} {'checks':>7} {'late by (s, unscaled)':>22}")
+    for name, (queue, components_s, tests_s, components, tests) in SCENARIOS.items():
+        with MockMetadataApi(
+            checks_until_done=1,
+            queue_seconds=queue * scale,
+            component_seconds=components_s * scale,
+            test_seconds=tests_s * scale,
+            components=components,
+            tests=tests,
+        ) as api:
+            for label, api_class in (("stock", ApiDeploy), ("adaptive", DeployApi)):
+                runs = [run(api_class, api, scale) for _ in range(args.repeat)]
+                checks = statistics.median(checks for checks, _ in runs)
+                late = statistics.median(late for _, late in runs) / scale
+                print(f"{name:<16} {label:<9} {checks:>7.0f} {late:>22.1f}")
+
+
+if __name__ == "__main__":
+    main()
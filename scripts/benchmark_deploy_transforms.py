@@ -0,0 +1,220 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the Deploy task's package transforms against the chained behavior they replaced.
+
+The package is built by zipping a source tree (force-app/main/default by default) and
+adding a package.xml with a CustomIndex section, which is close enough to the MDAPI
+zip that sfdx force:source:convert hands to the transforms.
+
+Peak memory (traced Python allocations, excluding the input package) is reported for the
+chained transforms and for the pipeline with its output kept in memory and spilled to disk
+beyond --spool-mb.
+
+    python scripts/benchmark_deploy_transforms.py [--source DIR] [--repeat N] [--spool-mb MB]
+
+Requires CumulusCI to be installed (the transforms import it).
+"""
+
+import argparse
+import io
+import os
+import re
+import statistics
+import sys
+import time
+import tracemalloc
+import xml.etree.ElementTree as ET
+import zipfile
+from types import SimpleNamespace
+
+from cumulusci.core.source_transforms.transforms import (
+    FindReplaceTransform,
+    FindReplaceTransformOptions,
+)
+
+# CumulusCI replaces the top-level ``tasks`` package with a synthetic one and
+# adds the project's tasks/ directory to it when it loads cumulusci.yml.
+import tasks
+
+tasks.__path__.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tasks"))
+
+from tasks.deploy import (  # noqa: E402
+    FindReplaceWithFilename,
+    StreamingTransformPipeline,
+    StripCustomIndexTransform,
+)
+from tasks.package_xml import PackageXml  # noqa: E402
+
+SOURCE = "force-app/main/default"
+USERNAME = "benchmark@example.com"
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types>
+        <members>NetworkEntity__c.OrgIdTxt__c</members>
+        <members>SyncItem__c.GlobalSourceIdTxt__c</members>
+        <name>CustomIndex</name>
+    </types>
+    <version>61.0</version>
+</Package>
+"""
+
+
+def build_package(source: str) -> bytes:
+    """Zip a source tree the way MetadataPackageZipBuilder does."""
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        for root, _, files in os.walk(source):
+            for f in files:
+                path = os.path.join(root, f)
+                zf.write(path, arcname=os.path.relpath(path, source).replace(os.sep, "/"))
+        zf.writestr("package.xml", PACKAGE_XML)
+    return buffer.getvalue()
+
+
+def find_replace_options() -> FindReplaceTransformOptions:
+    return FindReplaceTransformOptions.parse_obj(
+        {"patterns": [{"find": "%%%CURRENT_USER%%%", "inject_username": True}]}
+    )
+
+
+def legacy_strip_custom_index_from_package_xml(content: bytes) -> bytes:
+    text = content.decode("utf-8")
+    text = re.sub(
+        r"<types>\s*(?:<members>[^<]*</members>\s*)*<name>CustomIndex</name>\s*</types>\s*",
+        "",
+        text,
+        flags=re.DOTALL,
+    )
+    return text.encode("utf-8")
+
+
+def run_chained(zf: zipfile.ZipFile, context) -> zipfile.ZipFile:
+    """The transforms as they ran before the streaming pipeline: three full rebuilds."""
+    options = find_replace_options()
+
+    # find_replace on file contents
+    zf = FindReplaceTransform(options).process(zf, context)
+
+    # find_replace on filenames
+    zip_dest = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+    for name in zf.namelist():
+        content = zf.read(name)
+        new_name = name
+        for pattern in options.patterns:
+            if pattern.find and pattern.find in new_name:
+                new_name = new_name.replace(pattern.find, pattern.get_replace_string(context))
+        zip_dest.writestr(new_name, content)
+    zf = zip_dest
+
+    # CustomIndex stripping
+    zip_dest = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+    for name in zf.namelist():
+        if "customindex" in name.lower():
+            continue
+        content = zf.read(name)
+        if name.lower().endswith("package.xml"):
+            content = legacy_strip_custom_index_from_package_xml(content)
+        zip_dest.writestr(name, content)
+    return zip_dest
+
+
+def run_streaming(zf: zipfile.ZipFile, context, spool_threshold=None) -> zipfile.ZipFile:
+    pipeline = StreamingTransformPipeline(
+        [FindReplaceWithFilename(find_replace_options()), StripCustomIndexTransform()]
+    )
+    if spool_threshold is not None:
+        pipeline.spool_threshold = spool_threshold
+    return pipeline.process(zf, context)
+
+
+def canonical(content: bytes):
+    """XML in canonical form (the stock find_replace writes every XML member it
+    parses back out, in its own layout); anything else as it is."""
+    try:
+        return ET.canonicalize(content.decode("utf-8"))
+    except (UnicodeDecodeError, ET.ParseError):
+        return content
+
+
+def contents(zf: zipfile.ZipFile) -> dict:
+    """Member contents, with package.xml compared by its types rather than its layout."""
+    members = {name: canonical(zf.read(name)) for name in zf.namelist()}
+    if "package.xml" in members:
+        package = PackageXml.parse(zf.read("package.xml"))
+        members["package.xml"] = (package.types, package.version)
+    return members
+
+
+def measure(runner, package: bytes, context, repeat: int):
+    timings = []
+    result = None
+    for _ in range(repeat):
+        zf = zipfile.ZipFile(io.BytesIO(package), "r")
+        start = time.perf_counter()
+        result = runner(zf, context)
+        timings.append(time.perf_counter() - start)
+    return timings, result
+
+
+def measure_peak_memory(runner, package: bytes, context) -> int:
+    """Peak traced memory while running a transform and reading its output."""
+    zf = zipfile.ZipFile(io.BytesIO(package), "r")
+    tracemalloc.start()
+    try:
+        result = runner(zf, context)
+        result.fp.seek(0)
+        result.fp.read()
+        return tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[1])
+    parser.add_argument("--source", default=SOURCE, help=f"Source tree to package (default: {SOURCE})")
+    parser.add_argument("--repeat", type=int, default=5, help="Runs per implementation (default: 5)")
+    parser.add_argument(
+        "--spool-mb", type=float, default=1, help="Spill threshold for the memory comparison (default: 1)"
+    )
+    args = parser.parse_args()
+
+    package = build_package(args.source)
+    context = SimpleNamespace(
+        org_config=SimpleNamespace(username=USERNAME),
+        logger=None,
+    )
+    with zipfile.ZipFile(io.BytesIO(package)) as zf:
+        members = len(zf.namelist())
+    print(f"Package: {members} members, {len(package) / 1024 / 1024:.1f} MB compressed\n")
+
+    chained, chained_zf = measure(run_chained, package, context, args.repeat)
+    streaming, streaming_zf = measure(run_streaming, package, context, args.repeat)
+
+    if contents(chained_zf) != contents(streaming_zf):
+        print("ERROR: streaming pipeline output differs from the chained transforms")
+        sys.exit(1)
+
+    for label, timings in (("chained", chained), ("streaming", streaming)):
+        print(
+            f"  {label:<10} median {statistics.median(timings) * 1000:8.1f} ms"
+            f"   min {min(timings) * 1000:8.1f} ms"
+        )
+    print(f"\nSpeedup: {statistics.median(chained) / statistics.median(streaming):.1f}x\n")
+
+    spool_threshold = int(args.spool_mb * 1024 * 1024)
+    for label, runner in (
+        ("chained", run_chained),
+        ("streaming, in memory", lambda zf, context: run_streaming(zf, context, sys.maxsize)),
+        (
+            f"streaming, spilled past {args.spool_mb:g} MB",
+            lambda zf, context: run_streaming(zf, context, spool_threshold),
+        ),
+    ):
+        peak = measure_peak_memory(runner, package, context)
+        print(f"  {label:<30} peak {peak / 1024 / 1024:6.1f} MB")
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    main()
@@ -0,0 +1,176 @@
+#!/usr/bin/env python3
+"""
+Checks the deploy_watch task (tasks/deploy_watch.py) against the mock Metadata API
+and times how long a save takes to reach the org, next to a full deploy.
+
+A synthetic tree (Apex classes and an LWC bundle) is watched while the script
+edits it: one class, then the bundle, then a burst of saves to several classes,
+then a new class.  Each edit must produce exactly one deploy holding only the
+components it touched, with the deploy transforms (username injection) applied.
+
+    python scripts/benchmark_deploy_watch.py [--classes 2000]
+
+Requires CumulusCI to be installed.  No sfdx conversion is involved: the tree
+has a package.xml, so it is treated as Metadata API format.
+"""
+
+import argparse
+import os
+import sys
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from generate_synthetic_source import TOKEN, generate
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.deploy import Deploy
+from tasks.deploy_watch import DeployWatch
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types><members>*</members><name>ApexClass</name></types>
+    <types><members>*</members><name>LightningComponentBundle</name></types>
+    <version>61.0</version>
+</Package>
+"""
+
+USERNAME = "watch@example.com"
+
+
+def make_task(task_class, path: Path, api: MockMetadataApi, work: Path, **options):
+    org_config = OrgConfig(
+        {
+            "instance_url": api.url,
+            "org_id": "00D000000000000001",
+            "username": USERNAME,
+            "access_token": "TOKEN",
+        },
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(
+        task_class,
+        {
+            "path": str(path),
+            "unmanaged": True,
+            "poll_min_interval": 0.02,
+            "poll_max_interval": 0.1,
+            "transforms": [
+                {
+                    "transform": "find_replace",
+                    "options": {"patterns": [{"find": TOKEN, "inject_username": True}]},
+                }
+            ],
+            **options,
+        },
+        org_config=org_config,
+    )
+    task.project_config.repo_info["root"] = str(work)
+    return task
+
+
+def wait_for_deploy(api: MockMetadataApi, count: int, timeout: float = 30) -> float:
+    """Wait until the mock has received ``count`` deploys and the last one was
+    reported done; returns when that happened (time.monotonic())."""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        if len(api.deploys) >= count and api.calls["checkDeployStatus"] >= count:
+            return time.monotonic()
+        time.sleep(0.01)
+    raise TimeoutError(f"no deploy {count} after {timeout}s")
+
+
+def edit(path: Path) -> None:
+    with open(path, "a", encoding="utf-8") as f:
+        f.write(f"// edited {time.time()} by {TOKEN}\n")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=2000)
+    args = parser.parse_args()
+    problems = []
+
+    with tempfile.TemporaryDirectory() as work, MockMetadataApi(checks_until_done=1) as api:
+        work = Path(work)
+        tree = generate(str(work), objects=0, classes=args.classes, resource_kb=0, token_ratio=0.2)
+        root = Path(tree.root, "main", "default")
+        (root / "package.xml").write_text(PACKAGE_XML, "utf-8")
+        bundle = root / "lwc" / "workItemBoard"
+        bundle.mkdir(parents=True)
+        (bundle / "workItemBoard.js").write_text("export default class WorkItemBoard {}\n", "utf-8")
+        (bundle / "workItemBoard.html").write_text("<template></template>\n", "utf-8")
+        (bundle / "workItemBoard.js-meta.xml").write_text("<LightningComponentBundle/>\n", "utf-8")
+        classes = root / "classes"
+
+        started = time.monotonic()
+        # An incremental deploy records what the org has, as a developer's last deploy would
+        make_task(Deploy, root, api, work, incremental=True)._run_task()
+        full = time.monotonic() - started
+        print(f"full deploy task                 {full:6.2f}s  ({len(api.deploys[-1].members)} files)")
+
+        task = make_task(DeployWatch, root, api, work, watch_interval=0.05, debounce=0.2)
+        watcher = threading.Thread(target=task._run_task)
+        watcher.start()
+        try:
+            # The manifest is current after the full deploy, so nothing is pushed on startup
+            time.sleep(1)
+            if len(api.deploys) != 1:
+                problems.append(f"startup: expected no deploy, got {len(api.deploys) - 1}")
+
+            steps = (
+                ("one class", [classes / "SyntheticClass00001.cls"], {"ApexClass:SyntheticClass00001"}),
+                ("lwc bundle", [bundle / "workItemBoard.js"], {"LightningComponentBundle:workItemBoard"}),
+                (
+                    "burst of 3 classes",
+                    [classes / f"SyntheticClass0000{i}.cls" for i in (2, 3, 4)],
+                    {f"ApexClass:SyntheticClass0000{i}" for i in (2, 3, 4)},
+                ),
+                ("new class", [classes / "SyntheticClassNew.cls"], {"ApexClass:SyntheticClassNew"}),
+            )
+            for label, paths, expected in steps:
+                count = len(api.deploys) + 1
+                saved = time.monotonic()
+                for path in paths:
+                    if not path.exists():
+                        path.write_text("public class SyntheticClassNew {}\n", "utf-8")
+                        Path(f"{path}-meta.xml").write_text(
+                            (classes / "SyntheticClass00001.cls-meta.xml").read_text("utf-8"), "utf-8"
+                        )
+                    edit(path)
+                    time.sleep(0.05)
+                done = wait_for_deploy(api, count)
+                time.sleep(0.5)
+                members = api.deploys[count - 1].members
+                print(f"{label:<32} {done - saved:6.2f}s  ({len(members)} files)")
+                received = {
+                    f"{'ApexClass' if name.startswith('classes/') else 'LightningComponentBundle'}:"
+                    + name.split("/")[1].split(".")[0]
+                    for name in members
+                    if name != "package.xml"
+                }
+                if received != expected:
+                    problems.append(f"{label}: deployed {sorted(received)}")
+                if len(api.deploys) != count:
+                    problems.append(f"{label}: {len(api.deploys) - count + 1} deploys")
+                text = b"".join(members.values())
+                if TOKEN.encode() in text or USERNAME.encode() not in text:
+                    problems.append(f"{label}: username not injected")
+        finally:
+            task.stop()
+            watcher.join()
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,165 @@
+#!/usr/bin/env python3
+"""
+Checks the incremental dataset extract (tasks/incremental_extract.py) against the
+mock org in mock_bulk_api.py, and times a refresh next to a full extract.
+
+The mock org gets --accounts accounts and three contacts for each.  After a full
+extract, some records are changed, some added (contacts of new accounts among
+them) and some deleted, and the dataset is refreshed.  The refreshed dataset
+must hold the same records, with the same lookups, as a full extract taken
+afterwards, and a refresh with nothing changed must leave the file as it was.
+
+    python scripts/benchmark_incremental_extract.py [--accounts 20000] [--changes 200]
+
+Requires CumulusCI to be installed.
+"""
+
+import argparse
+import json
+import random
+import sqlite3
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from mock_bulk_api import MockBulkApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.incremental_extract import IncrementalExtract
+
+MAPPING = {
+    "Insert Account": {"sf_object": "Account", "table": "Account", "fields": ["Name", "Industry"]},
+    "Insert Contact": {
+        "sf_object": "Contact",
+        "table": "Contact",
+        "fields": ["LastName", "Email"],
+        "lookups": {"AccountId": {"table": "Account"}},
+    },
+}
+
+
+def extract(api: MockBulkApi, work: Path, sql_path: Path, state_dir: Path, **options):
+    org_config = OrgConfig(
+        {
+            "instance_url": api.url,
+            "org_id": "00D000000000000001",
+            "username": "extract@example.com",
+            "access_token": "TOKEN",
+        },
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    org_config._is_person_accounts_enabled = False
+    task = create_task(
+        IncrementalExtract,
+        {
+            "mapping": str(work / "mapping.yml"),
+            "sql_path": str(sql_path),
+            "state_dir": str(state_dir),
+            **options,
+        },
+        org_config=org_config,
+    )
+    task.sf = api.sf
+    started = time.monotonic()
+    task._run_task()
+    return time.monotonic() - started, task.return_values
+
+
+def contents(sql_path: Path) -> set:
+    """The dataset's contacts as (name, email, account name, industry), and its
+    accounts as (name, industry): what it holds, whatever the local ids."""
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(sql_path.read_text("utf-8"))
+    accounts = set(conn.execute('SELECT "Name", "Industry" FROM "Account"'))
+    contacts = set(
+        conn.execute(
+            'SELECT c."LastName", c."Email", a."Name", a."Industry" FROM "Contact" c '
+            'LEFT JOIN "Account" a ON a.id = c."AccountId"'
+        )
+    )
+    conn.close()
+    return accounts | contacts
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--accounts", type=int, default=20000)
+    parser.add_argument("--changes", type=int, default=200, help="Records changed, added and deleted")
+    args = parser.parse_args()
+    rng = random.Random(0)
+    problems = []
+
+    with tempfile.TemporaryDirectory() as work, MockBulkApi(rest_seconds=0.02) as api:
+        work = Path(work)
+        (work / "mapping.yml").write_text(json.dumps(MAPPING, indent=2), "utf-8")
+        accounts = [api.insert("Account", {"Name": f"Account {i}", "Industry": "Technology"}) for i in range(args.accounts)]
+        contacts = [
+            api.insert("Contact", {"LastName": f"Contact {i}", "Email": f"c{i}@example.com", "AccountId": accounts[i // 3]})
+            for i in range(args.accounts * 3)
+        ]
+        # Saved well before the extracts, as in a real org
+        api.age(3600)
+        sql_path, state_dir = work / "dataset.sql", work / "state"
+
+        elapsed, result = extract(api, work, sql_path, state_dir)
+        print(f"{'run':<28} {'seconds':>8} {'rows':>7} {'pages':>6}")
+
+        def report(label, elapsed, result):
+            rows = sum(step["upserted"] + step["deleted"] for step in result["steps"])
+            pages = sum(step["pages"] for step in result["steps"])
+            print(f"{label:<28} {elapsed:>8.2f} {rows:>7} {pages:>6}")
+
+        report("full extract", elapsed, result)
+
+        before = sql_path.read_bytes()
+        elapsed, result = extract(api, work, sql_path, state_dir)
+        report("refresh, no changes", elapsed, result)
+        if result["full"] or sql_path.read_bytes() != before:
+            problems.append("refresh with no changes rewrote the dataset")
+
+        for record_id in rng.sample(accounts, args.changes // 4):
+            api.update("Account", record_id, {"Industry": "Biotechnology"})
+        for record_id in rng.sample(contacts, args.changes // 4):
+            api.update("Contact", record_id, {"Email": f"moved-{record_id}@example.com", "AccountId": rng.choice(accounts)})
+        # Contacts first, so new accounts come after them in the org; the
+        # refresh sees them in mapping order regardless
+        new_accounts = [api.insert("Account", {"Name": f"New account {i}", "Industry": "Energy"}) for i in range(args.changes // 8)]
+        for i in range(args.changes // 8):
+            api.insert("Contact", {"LastName": f"New contact {i}", "Email": f"n{i}@example.com", "AccountId": rng.choice(new_accounts)})
+        for record_id in rng.sample(contacts, args.changes // 4):
+            api.delete("Contact", record_id)
+
+        elapsed, result = extract(api, work, sql_path, state_dir)
+        report(f"refresh, {args.changes} changes", elapsed, result)
+        if result["full"]:
+            problems.append("the refresh extracted everything")
+
+        fresh = work / "fresh.sql"
+        elapsed, _ = extract(api, work, fresh, work / "fresh-state")
+        report("full extract afterwards", elapsed, _)
+        refreshed, expected = contents(sql_path), contents(fresh)
+        if refreshed != expected:
+            problems.append(
+                f"refreshed dataset differs from a full extract: {len(refreshed - expected)} extra, "
+                f"{len(expected - refreshed)} missing"
+            )
+
+        # A dataset edited since the last extract isn't trusted
+        sql_path.write_text(sql_path.read_text("utf-8") + "\n", "utf-8")
+        _, result = extract(api, work, sql_path, state_dir)
+        if not result["full"]:
+            problems.append("an edited dataset was refreshed instead of extracted again")
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
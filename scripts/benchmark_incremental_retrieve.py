@@ -0,0 +1,235 @@
+#!/usr/bin/env python3
+"""
+Checks the snapshot-based retrieve in RetrieveChanges (tasks/retrieve_changes.py)
+against the mock Metadata API in mock_metadata_api.py, and times it on a small and
+a large project with the same change.
+
+A synthetic source tree is generated and the mock org is given the same
+components, with the username in place of %%%CURRENT_USER%%%; retrieving them all
+must reproduce the tree without writing to it.  Some classes, fields and one
+object are then changed in the org, and a few more components have their
+revision bumped without a change.  The retrieve must ask for exactly those
+components, write the changed files with the token back in place, decompose the
+object, and leave every other file (and its mtime) alone.  A second bump of the
+same revisions must write nothing.
+
+    python scripts/benchmark_incremental_retrieve.py [--classes 200] [--objects 50] [--changes 20]
+
+Requires CumulusCI to be installed.
+"""
+
+import argparse
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from generate_synthetic_source import TOKEN, USERNAME, generate
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.salesforce_api.metadata import ApiRetrieveUnpackaged
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.metadata_index import MetadataIndex
+from tasks.retrieve_changes import RetrieveChanges
+
+ApiRetrieveUnpackaged.check_interval = 0.01
+
+
+class FakeTooling:
+    """SourceMember records for the mock org, as the tooling API returns them."""
+
+    def __init__(self):
+        self.revisions = {}
+
+    def bump(self, component):
+        self.revisions[component] = self.revisions.get(component, 0) + 1
+
+    def query_all(self, soql):
+        return {
+            "records": [
+                {"MemberType": mdtype, "MemberName": member, "RevisionCounter": revision}
+                for (mdtype, member), revision in self.revisions.items()
+            ]
+        }
+
+
+def _inner(text: str) -> str:
+    """The lines of a source file between its root element's tags."""
+    lines = text.splitlines(keepends=True)
+    return "".join(lines[2:-1])
+
+
+def org_pieces(base: Path, path: Path, text: str):
+    """(component, MDAPI pieces) for one source file, as the org would hold it."""
+    org_text = text.replace(TOKEN, USERNAME)
+    relative = path.relative_to(base).as_posix()
+    parts = relative.split("/")
+    if parts[0] == "classes":
+        name = parts[1].split(".", 1)[0]
+        return ("ApexClass", name), [(relative, org_text.encode("utf-8"))]
+    if parts[0] == "objects" and len(parts) == 3:
+        obj = parts[1]
+        return ("CustomObject", obj), [(f"objects/{obj}.object", _inner(org_text).encode("utf-8"))]
+    if parts[0] == "objects" and parts[2] == "fields":
+        obj, field = parts[1], parts[3].split(".", 1)[0]
+        element = "    <fields>\n" + "".join(
+            "    " + line if line.lstrip().startswith("<") else line
+            for line in _inner(org_text).splitlines(keepends=True)
+        ) + "    </fields>\n"
+        return ("CustomField", f"{obj}.{field}"), [(f"objects/{obj}.object", element.encode("utf-8"))]
+    return None, None
+
+
+def sync_org(api: MockMetadataApi, tooling: FakeTooling, base: Path, sources: dict, component=None):
+    """Put the source files of one component (or all) into the org."""
+    pieces = {}
+    for path, text in sources.items():
+        key, files = org_pieces(base, path, text)
+        if key is not None and (component is None or key == component):
+            pieces.setdefault(key, []).extend(files)
+    for key, files in pieces.items():
+        if component is None or api.org_source.get(key) != files:
+            api.org_source[key] = files
+            tooling.bump(key)
+
+
+def run(work: Path, objects: int, classes: int, changes: int, problems: list) -> dict:
+    os.chdir(work)
+    Path("sfdx-project.json").write_text(
+        json.dumps({"packageDirectories": [{"path": "force-app", "default": True}]}), "utf-8"
+    )
+    tree = generate(str(work), objects=objects, fields=10, classes=classes, resource_kb=0, token_ratio=0.3)
+    base = Path(tree.root, "main", "default")
+    sources = {
+        path: path.read_text("utf-8")
+        for path in base.rglob("*")
+        if path.is_file() and "customindex" not in path.parts
+    }
+    rng = random.Random(1)
+
+    with MockMetadataApi() as api:
+        tooling = FakeTooling()
+        sync_org(api, tooling, base, sources)
+        org_config = OrgConfig(
+            {"instance_url": api.url, "org_id": "00D000000000000001", "username": USERNAME, "access_token": "T"},
+            "dev",
+            keychain=DummyKeychain(),
+        )
+
+        def retrieve():
+            task = create_task(
+                RetrieveChanges, {"path": "force-app", "preserve_tokens": TOKEN}, org_config=org_config
+            )
+            task.project_config._cache_dir = work / ".cci"
+            task.tooling = tooling
+            started = time.perf_counter()
+            task._run_task()
+            return time.perf_counter() - started
+
+        # A first retrieve brings in everything, which is already on disk
+        mtimes = {path: path.stat().st_mtime_ns for path in sources}
+        retrieve()
+        if any(path.stat().st_mtime_ns != mtime for path, mtime in mtimes.items()):
+            problems.append("the first retrieve rewrote files that were already up to date")
+        calls = len(api.retrieves)
+
+        expected = {}
+        changed = set()
+        class_paths = sorted(path for path in sources if path.suffix == ".cls")
+        field_paths = sorted(path for path in sources if path.name.endswith(".field-meta.xml"))
+        for path in rng.sample(class_paths, changes // 2):
+            expected[path] = sources[path].replace("{\n", "{\n    // Retrieved by " + TOKEN + "\n", 1)
+        for path in rng.sample(field_paths, changes // 2):
+            expected[path] = sources[path].replace(
+                "    <label>", f"    <description>Owned by {TOKEN}</description>\n    <label>", 1
+            )
+        obj = sorted(path for path in sources if path.name.endswith(".object-meta.xml"))[0]
+        expected[obj] = sources[obj].replace("<sharingModel>ReadWrite", "<sharingModel>Private")
+        new_class = base / "classes" / "RetrievedClass.cls"
+        expected[new_class] = "public class RetrievedClass {\n    String owner = '" + TOKEN + "';\n}\n"
+        expected[new_class.with_name("RetrievedClass.cls-meta.xml")] = sources[class_paths[0].with_suffix(".cls-meta.xml")]
+
+        for path, text in expected.items():
+            key, _ = org_pieces(base, path, text)
+            changed.add(key)
+            sync_org(api, tooling, base, {**sources, **expected}, key)
+        touched = set()
+        for path in rng.sample(class_paths, changes // 4):
+            key, _ = org_pieces(base, path, sources[path])
+            if key not in changed:
+                tooling.bump(key)
+                touched.add(key)
+
+        elapsed = retrieve()
+        requested = api.retrieves[calls] if len(api.retrieves) > calls else set()
+        if requested != changed | touched:
+            problems.append(
+                f"retrieved {len(requested)} components, expected {len(changed | touched)}"
+            )
+        for path, text in expected.items():
+            if not path.exists() or path.read_text("utf-8") != text:
+                problems.append(f"{path.relative_to(base)} wasn't retrieved as expected")
+        rewritten = [
+            path for path, mtime in mtimes.items() if path not in expected and path.stat().st_mtime_ns != mtime
+        ]
+        if rewritten:
+            problems.append(f"{len(rewritten)} unchanged files were rewritten, e.g. {rewritten[0]}")
+
+        # Revisions moved again but nothing changed: nothing is written
+        mtimes = {path: path.stat().st_mtime_ns for path in base.rglob("*") if path.is_file()}
+        for key in changed | touched:
+            tooling.bump(key)
+        again = retrieve()
+        if any(path.stat().st_mtime_ns != mtime for path, mtime in mtimes.items()):
+            problems.append("a retrieve with no content changes wrote files")
+
+        with MetadataIndex(work / "scan.sqlite", "force-app") as index:
+            started = time.perf_counter()
+            index.refresh()
+            scan = time.perf_counter() - started
+
+    return {
+        "files": len(sources),
+        "components": len(changed | touched),
+        "retrieve": elapsed,
+        "again": again,
+        "scan": scan,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=200)
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--changes", type=int, default=20, help="Classes and fields changed in the org")
+    args = parser.parse_args()
+    problems = []
+    cwd = os.getcwd()
+
+    print(f"{'project files':>13} {'components':>10} {'retrieve':>9} {'no-op':>7} {'full scan':>10}")
+    try:
+        for scale in (1, 10):
+            with tempfile.TemporaryDirectory() as work:
+                result = run(Path(work), args.objects * scale, args.classes * scale, args.changes, problems)
+                os.chdir(cwd)
+            print(
+                f"{result['files']:>13} {result['components']:>10} {result['retrieve']:>8.2f}s "
+                f"{result['again']:>6.2f}s {result['scan']:>9.2f}s"
+            )
+    finally:
+        os.chdir(cwd)
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,128 @@
+#!/usr/bin/env python3
+"""
+Compares running Robot suites serially with the parallel robot task
+(tasks/parallel_robot.py), on generated suites that only sleep.
+
+Suite durations are skewed the way UI suites usually are: a few long suites and
+many short ones.  The suites run serially, then in parallel twice: first with no
+duration history (every suite is assumed to take the same time), then balanced
+by the durations the first parallel run recorded.  Each run's merged output is
+checked to hold every test, with the one deliberately failing test failed.
+
+    python scripts/benchmark_parallel_robot.py [--suites 16] [--processes 4] [--time-scale 0.2]
+
+Requires CumulusCI (and so Robot Framework) to be installed.  No org or browser
+is used.
+"""
+
+import argparse
+import logging
+import random
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+
+from robot.api import ExecutionResult
+
+from cumulusci.core.exceptions import RobotTestFailure
+from cumulusci.tasks.salesforce.tests.util import create_task
+
+from tasks.parallel_robot import ParallelRobot
+
+TESTS_PER_SUITE = 3
+
+SUITE = """\
+*** Test Cases ***
+{tests}
+"""
+
+TEST = """\
+{name}
+    Sleep  {seconds:.3f}s
+    Should Be Equal  {actual}  {expected}
+"""
+
+
+def generate(root: Path, suites: int, scale: float, seed: int = 0) -> int:
+    """Writes the suites under root; returns the total number of tests."""
+    rng = random.Random(seed)
+    root.mkdir(parents=True)
+    for i in range(suites):
+        seconds = min(rng.paretovariate(1.5), 12) * scale
+        tests = "\n".join(
+            TEST.format(
+                name=f"Test {j}",
+                seconds=seconds / TESTS_PER_SUITE,
+                actual=1,
+                # One failing test, to check failures survive the merge
+                expected=2 if (i, j) == (0, 0) else 1,
+            )
+            for j in range(TESTS_PER_SUITE)
+        )
+        (root / f"suite_{i:02d}.robot").write_text(SUITE.format(tests=tests), "utf-8")
+    return suites * TESTS_PER_SUITE
+
+
+def run(suites: Path, output: Path, durations: Path, processes: int, **options):
+    task = create_task(
+        ParallelRobot,
+        {
+            "suites": str(suites),
+            "processes": processes,
+            "durations_path": str(durations),
+            "options": {"outputdir": str(output)},
+            **options,
+        },
+    )
+    task.working_path = str(suites.parent)
+    task.logger = logging.getLogger("benchmark")
+    started = time.monotonic()
+    error = None
+    try:
+        task._run_task()
+    except RobotTestFailure as e:
+        error = str(e)
+    return time.monotonic() - started, error
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--suites", type=int, default=16)
+    parser.add_argument("--processes", type=int, default=4)
+    parser.add_argument("--time-scale", type=float, default=0.2, help="Seconds per unit of suite length")
+    args = parser.parse_args()
+    problems = []
+
+    with tempfile.TemporaryDirectory() as work:
+        work = Path(work)
+        total = generate(work / "tests", args.suites, args.time_scale)
+        durations = work / "durations.json"
+        cases = (
+            ("serial", 1, {}),
+            ("parallel, no history", args.processes, {}),
+            ("parallel, with history", args.processes, {}),
+            ("parallel, test level", args.processes, {"testlevelsplit": True}),
+        )
+        print(f"{'run':<24} {'seconds':>8} {'pass':>5} {'fail':>5}")
+        for i, (label, processes, options) in enumerate(cases):
+            output = work / f"results-{i}"
+            elapsed, error = run(work / "tests", output, durations, processes, **options)
+            stats = ExecutionResult(str(output / "output.xml")).suite.statistics
+            print(f"{label:<24} {elapsed:>8.2f} {stats.passed:>5} {stats.failed:>5}")
+            if (stats.passed, stats.failed) != (total - 1, 1):
+                problems.append(f"{label}: {stats.passed} passed and {stats.failed} failed")
+            if error != "1 test failed.":
+                problems.append(f"{label}: unexpected outcome {error!r}")
+            if processes > 1 and not (output / "log.html").exists():
+                problems.append(f"{label}: no merged log")
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
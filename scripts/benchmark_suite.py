@@ -0,0 +1,379 @@
+#!/usr/bin/env python3
+"""
+Benchmarks the project's Python tasks and scripts against synthetic source trees.
+
+Each scale generates a tree with scripts/generate_synthetic_source.py and runs, offline:
+
+  deploy_transforms       the Deploy task's streaming transform pipeline on the zipped tree
+  deploy_hashes           component hashing for incremental deploys
+  source_convert          in-process source-to-MDAPI conversion of the tree (one process)
+  metadata_index_cold     building the metadata index from scratch
+  metadata_index_warm     refreshing an up-to-date metadata index
+  update_field_metadata   scripts/update_field_metadata.py (dry run) over the generated fields
+  retrieve_tokens         RetrieveChanges token preservation over freshly "retrieved" files
+  permsets_bulk           bulk permission assignment for many users against an in-process API
+
+For each it records throughput, latency percentiles over --repeat runs, and peak traced
+memory (from one extra run).  --baseline writes the results as JSON; --compare checks
+them against a baseline and exits 1 if a median time or peak grew by more than
+--tolerance.
+
+    python scripts/benchmark_suite.py [--scales small,medium] [--repeat N]
+        [--baseline FILE | --compare FILE [--tolerance 0.25]] [--only NAME,...]
+
+Requires CumulusCI to be installed (the tasks import it).
+"""
+
+import argparse
+import contextlib
+import io
+import json
+import os
+import platform
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+import tracemalloc
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from types import SimpleNamespace
+from typing import Callable, Dict, List, NamedTuple
+
+# Imports CumulusCI and puts the project's tasks/ on the tasks package path.
+from benchmark_deploy_transforms import build_package, run_streaming  # noqa: E402
+from generate_synthetic_source import USERNAME, generate  # noqa: E402
+from mock_composite_api import MockCompositeApi  # noqa: E402
+
+from cumulusci.core.config import OrgConfig  # noqa: E402
+from cumulusci.tasks.salesforce.tests.util import create_task  # noqa: E402
+from cumulusci.tests.util import DummyKeychain  # noqa: E402
+
+from tasks.deploy_manifest import component_hashes  # noqa: E402
+from tasks.metadata_index import MetadataIndex  # noqa: E402
+from tasks.permsets import AssignPermissionSetsWithFindReplace  # noqa: E402
+from tasks.retrieve_changes import RetrieveChanges  # noqa: E402
+from tasks.source_convert import convert_source, plan_conversion  # noqa: E402
+
+import update_field_metadata  # noqa: E402
+
+SCALES = {
+    "small": dict(objects=50, fields=10, classes=100, resource_kb=512, users=50),
+    "medium": dict(objects=500, fields=10, classes=1000, resource_kb=2048, users=200),
+    "large": dict(objects=5000, fields=10, classes=5000, resource_kb=4096, users=1000),
+}
+
+
+class Benchmark(NamedTuple):
+    name: str
+    # (work dir, scale) -> state; not timed, run before every measured call
+    setup: Callable
+    # state -> number of items processed
+    run: Callable
+
+
+def _org_config() -> OrgConfig:
+    return OrgConfig(
+        {
+            "instance_url": "https://test.salesforce.com",
+            "org_id": "ORG_ID",
+            "username": USERNAME,
+            "access_token": "TOKEN",
+        },
+        "benchmark",
+        keychain=DummyKeychain(),
+    )
+
+
+# deploy ---------------------------------------------------------------------
+
+
+def _setup_package(work, scale):
+    return build_package(os.path.join(work, "tree", "force-app", "main", "default"))
+
+
+def _run_deploy_transforms(package):
+    context = SimpleNamespace(org_config=SimpleNamespace(username=USERNAME), logger=None)
+    zf = zipfile.ZipFile(io.BytesIO(package))
+    run_streaming(zf, context)
+    return len(zf.infolist())
+
+
+def _run_deploy_hashes(package):
+    return len(component_hashes(zipfile.ZipFile(io.BytesIO(package))))
+
+
+def _setup_source_convert(work, scale):
+    return os.path.join(work, "tree", "force-app")
+
+
+def _run_source_convert(root):
+    plan = plan_conversion(Path(root), "61.0")
+    for _ in convert_source(plan):
+        pass
+    return plan.files
+
+
+# metadata index -------------------------------------------------------------
+
+
+def _setup_index_cold(work, scale):
+    db = os.path.join(work, "index.sqlite")
+    if os.path.exists(db):
+        os.unlink(db)
+    return db, os.path.join(work, "tree", "force-app")
+
+
+def _setup_index_warm(work, scale):
+    db, root = _setup_index_cold(work, scale)
+    with MetadataIndex(db, root) as index:
+        index.refresh()
+    return db, root
+
+
+def _run_index(state):
+    db, root = state
+    with MetadataIndex(db, root) as index:
+        return index.refresh().scanned
+
+
+# update_field_metadata.py ---------------------------------------------------
+
+
+def _setup_update_field_metadata(work, scale):
+    state = _setup_index_warm(work, scale)
+    module = update_field_metadata
+    module.INDEX_PATH, module.SOURCE_ROOT = state
+    module.BASE = os.path.join(module.SOURCE_ROOT, "main", "default", "objects")
+    module.FIELD_META = scale["field_meta"]
+    return module
+
+
+def _run_update_field_metadata(module):
+    jobs, _ = module.find_field_files()
+    with ThreadPoolExecutor(max_workers=min(32, (os.cpu_count() or 1) + 4)) as pool:
+        results = list(pool.map(lambda job: module._run_job(job, True), jobs))
+    errors = [result for result in results if result.error]
+    if errors:
+        raise RuntimeError(f"update_field_metadata failed: {errors[0].error}")
+    return len(jobs)
+
+
+# retrieve_changes -----------------------------------------------------------
+
+
+def _setup_retrieve_tokens(work, scale):
+    # Every run starts from files as a retrieve leaves them: username, not token
+    retrieved = os.path.join(work, "retrieved")
+    shutil.rmtree(retrieved, ignore_errors=True)
+    tree = generate(
+        retrieved,
+        objects=0,
+        classes=scale["classes"],
+        resource_kb=scale["resource_kb"],
+        token_ratio=0.2,
+        resolved=True,
+    )
+    task = create_task(
+        RetrieveChanges,
+        {"path": tree.root, "preserve_tokens": "%%%CURRENT_USER%%%"},
+        org_config=_org_config(),
+    )
+    paths = [
+        os.path.join(directory, filename)
+        for directory, _, filenames in os.walk(tree.root)
+        for filename in filenames
+    ]
+    return task, paths
+
+
+def _run_retrieve_tokens(state):
+    task, paths = state
+    task._preserve_tokens(paths)
+    return len(paths)
+
+
+# permsets -------------------------------------------------------------------
+
+
+def _setup_permsets(work, scale):
+    users = scale["users"]
+    task = create_task(
+        AssignPermissionSetsWithFindReplace,
+        {
+            "bulk": True,
+            "api_names": "PermissionSet0,PermissionSet1,PermissionSet2",
+            # One license by DeveloperName, one by PermissionSetLicenseKey
+            "permission_set_licenses": "PermissionSetLicense0,PermissionSetLicenseKey1",
+            "permission_set_groups": "PermissionSetGroup0,PermissionSetGroup1",
+            "user_alias": ",".join(f"u{i}" for i in range(users)),
+        },
+        org_config=_org_config(),
+    )
+    task.sf = MockCompositeApi(
+        {
+            "PermissionSet": [{"Name": f"PermissionSet{i}"} for i in range(3)],
+            "PermissionSetLicense": [
+                {"DeveloperName": f"PermissionSetLicense{i}", "PermissionSetLicenseKey": f"PermissionSetLicenseKey{i}"}
+                for i in range(2)
+            ],
+            "PermissionSetGroup": [{"DeveloperName": f"PermissionSetGroup{i}"} for i in range(2)],
+        },
+        users,
+    )
+    task.logger = SimpleNamespace(info=lambda *a: None, warning=lambda *a: None)
+    return task, users
+
+
+def _run_permsets(state):
+    task, users = state
+    with contextlib.redirect_stdout(io.StringIO()):
+        task._run_task()
+    inserted = len(task.sf.inserted)
+    if inserted != users * 7:
+        raise AssertionError(f"assigned {inserted} permissions, expected {users * 7}")
+    return inserted
+
+
+BENCHMARKS = [
+    Benchmark("deploy_transforms", _setup_package, _run_deploy_transforms),
+    Benchmark("deploy_hashes", _setup_package, _run_deploy_hashes),
+    Benchmark("source_convert", _setup_source_convert, _run_source_convert),
+    Benchmark("metadata_index_cold", _setup_index_cold, _run_index),
+    Benchmark("metadata_index_warm", _setup_index_warm, _run_index),
+    Benchmark("update_field_metadata", _setup_update_field_metadata, _run_update_field_metadata),
+    Benchmark("retrieve_tokens", _setup_retrieve_tokens, _run_retrieve_tokens),
+    Benchmark("permsets_bulk", _setup_permsets, _run_permsets),
+]
+
+
+def percentile(values: List[float], p: float) -> float:
+    """Linear-interpolated percentile, p in 0..100."""
+    ordered = sorted(values)
+    k = (len(ordered) - 1) * p / 100
+    lower = int(k)
+    upper = min(lower + 1, len(ordered) - 1)
+    return ordered[lower] + (ordered[upper] - ordered[lower]) * (k - lower)
+
+
+def measure(benchmark: Benchmark, work: str, scale: dict, repeat: int) -> Dict:
+    timings = []
+    items = 0
+    for _ in range(repeat):
+        state = benchmark.setup(work, scale)
+        start = time.perf_counter()
+        items = benchmark.run(state)
+        timings.append(time.perf_counter() - start)
+
+    state = benchmark.setup(work, scale)
+    tracemalloc.start()
+    try:
+        benchmark.run(state)
+        peak = tracemalloc.get_traced_memory()[1]
+    finally:
+        tracemalloc.stop()
+
+    median = statistics.median(timings)
+    return {
+        "items": items,
+        "runs": repeat,
+        "p50_ms": median * 1000,
+        "p90_ms": percentile(timings, 90) * 1000,
+        "p99_ms": percentile(timings, 99) * 1000,
+        "max_ms": max(timings) * 1000,
+        "items_per_second": items / median if median else None,
+        "peak_mb": peak / 1024 / 1024,
+    }
+
+
+def compare(results: Dict, baseline: Dict, tolerance: float) -> List[str]:
+    regressions = []
+    for scale, benchmarks in results["scales"].items():
+        for name, result in benchmarks.items():
+            before = baseline.get("scales", {}).get(scale, {}).get(name)
+            if not before:
+                continue
+            for metric in ("p50_ms", "peak_mb"):
+                if result[metric] > before[metric] * (1 + tolerance):
+                    regressions.append(
+                        f"{scale}/{name}: {metric} {before[metric]:.1f} -> {result[metric]:.1f}"
+                    )
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scales", default="small,medium", help=f"Any of {', '.join(SCALES)}")
+    parser.add_argument("--repeat", type=int, default=5, help="Timed runs per benchmark (default: 5)")
+    parser.add_argument("--only", help="Comma-separated benchmark names to run")
+    parser.add_argument("--baseline", help="Write results to this JSON file")
+    parser.add_argument("--compare", help="Compare results with this baseline JSON file")
+    parser.add_argument(
+        "--tolerance", type=float, default=0.25, help="Allowed growth before a regression (default: 0.25)"
+    )
+    args = parser.parse_args()
+
+    scales = [scale.strip() for scale in args.scales.split(",")]
+    unknown = [scale for scale in scales if scale not in SCALES]
+    if unknown:
+        parser.error(f"unknown scales: {', '.join(unknown)}")
+    benchmarks = BENCHMARKS
+    if args.only:
+        names = set(args.only.split(","))
+        benchmarks = [benchmark for benchmark in BENCHMARKS if benchmark.name in names]
+
+    results = {
+        "created_at": datetime.now(timezone.utc).isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        "scales": {},
+    }
+    for scale_name in scales:
+        scale = dict(SCALES[scale_name])
+        with tempfile.TemporaryDirectory() as work:
+            tree = generate(
+                os.path.join(work, "tree"),
+                objects=scale["objects"],
+                fields=scale["fields"],
+                classes=scale["classes"],
+                resource_kb=scale["resource_kb"],
+            )
+            scale["field_meta"] = tree.field_meta
+            print(
+                f"\n{scale_name}: {scale['objects']} objects, {scale['objects'] * scale['fields']} fields, "
+                f"{tree.files} files, {tree.bytes / 1024 / 1024:.1f} MB"
+            )
+            results["scales"][scale_name] = {}
+            for benchmark in benchmarks:
+                result = measure(benchmark, work, scale, args.repeat)
+                results["scales"][scale_name][benchmark.name] = result
+                print(
+                    f"  {benchmark.name:<22} p50 {result['p50_ms']:9.1f} ms"
+                    f"  p90 {result['p90_ms']:9.1f} ms  p99 {result['p99_ms']:9.1f} ms"
+                    f"  {result['items_per_second']:11.0f} items/s  peak {result['peak_mb']:7.1f} MB"
+                )
+
+    if args.baseline:
+        with open(args.baseline, "w", encoding="utf-8") as f:
+            json.dump(results, f, indent=2)
+        print(f"\nBaseline written to {args.baseline}")
+
+    if args.compare:
+        with open(args.compare, encoding="utf-8") as f:
+            baseline = json.load(f)
+        regressions = compare(results, baseline, args.tolerance)
+        if regressions:
+            print(f"\nRegressions beyond {args.tolerance:.0%}:")
+            for regression in regressions:
+                print(f"  {regression}")
+            sys.exit(1)
+        print(f"\nNo regressions beyond {args.tolerance:.0%} against {args.compare}")
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    main()
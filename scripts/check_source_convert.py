@@ -0,0 +1,226 @@
+#!/usr/bin/env python3
+"""
+Checks the in-process source converter (tasks/source_convert.py) against a
+reference conversion, and times it on this project's tree and a larger
+synthetic one.
+
+scripts/fixtures/source_convert/ is a small sfdx project (force-app/) holding
+each kind of source the converter handles, with expected/ the Metadata API tree
+it should convert to.  expected/ was written by hand from the Metadata API's
+file layout, not made by sfdx: run --refresh where sfdx is installed to replace
+it with force:source:convert's output, and review the diff.  The converted
+package must match it, as the deploy sees it: without CustomIndex, which the
+deploy strips, or the LWC test files the package builder leaves out.  XML is compared as parsed, with the
+elements of .object files in any order; static resource zips by their files;
+everything else byte for byte.
+
+Converting this project's force-app must also give back its source: each
+converted .object file, split again as a retrieve would, has to match the
+object's source files.  The Deploy task, with source_convert: python, must build
+the fixture project's package through the converter.  The Deploy task uses sfdx
+by default until expected/ has been regenerated with sfdx.
+
+    python scripts/check_source_convert.py [--classes 5000] [--objects 200]
+    python scripts/check_source_convert.py --refresh   # rewrite expected/ with sfdx
+
+Requires CumulusCI to be installed, and sfdx on the PATH for --refresh.
+"""
+
+import argparse
+import base64
+import io
+import os
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+import xml.etree.ElementTree as ET
+import zipfile
+from pathlib import Path
+
+import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+from generate_synthetic_source import generate
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.deploy import Deploy
+from tasks.package_xml import PackageXml
+from tasks.source_convert import convert_source, plan_conversion
+from tasks.source_format import in_bundle, object_source_files, read_forceignore
+
+FIXTURE = Path(__file__).resolve().parent / "fixtures" / "source_convert"
+REPO = Path(__file__).resolve().parent.parent
+VERSION = "61.0"
+
+
+def convert(root: Path, ignore_root: Path, workers: int = 1):
+    """(plan, {name: content}) of a tree converted in process."""
+    plan = plan_conversion(root, VERSION, read_forceignore(ignore_root / ".forceignore"))
+    files = {"package.xml": plan.package.tobytes()}
+    for fragment in convert_source(plan, workers):
+        with zipfile.ZipFile(io.BytesIO(fragment)) as zf:
+            files.update((name, zf.read(name)) for name in zf.namelist())
+    return plan, files
+
+
+def expected_files(expected: Path) -> dict:
+    """The expected tree, less what the deploy drops from a conversion."""
+    files = {}
+    for path in sorted(expected.rglob("*")):
+        name = path.relative_to(expected).as_posix()
+        directory, _, rest = name.partition("/")
+        if not path.is_file() or directory == "customindex":
+            continue
+        if directory == "lwc" and not in_bundle("lwc", rest.partition("/")[2]):
+            continue
+        content = path.read_bytes()
+        if name == "package.xml":
+            package = PackageXml.parse(content)
+            package.remove_type("CustomIndex")
+            content = package.tobytes()
+        files[name] = content
+    return files
+
+
+def _element(element: ET.Element, unordered: bool = False) -> tuple:
+    children = [_element(child) for child in element]
+    return (
+        element.tag.rsplit("}", 1)[-1],
+        tuple(sorted(element.attrib.items())),
+        (element.text or "").strip(),
+        tuple(sorted(children) if unordered else children),
+    )
+
+
+def canonical(name: str, content: bytes):
+    """What has to match between two versions of a package file."""
+    if content.startswith(b"PK\x03\x04"):
+        with zipfile.ZipFile(io.BytesIO(content)) as zf:
+            return {entry: zf.read(entry) for entry in zf.namelist() if not entry.endswith("/")}
+    if name == "package.xml":
+        package = PackageXml.parse(content)
+        return package.version, sorted(package)
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return content
+    return _element(root, unordered=name.endswith(".object"))
+
+
+def compare(actual: dict, expected: dict, label: str, problems: list) -> int:
+    for name in sorted(expected.keys() - actual.keys()):
+        problems.append(f"{label}: {name} is missing")
+    for name in sorted(actual.keys() - expected.keys()):
+        problems.append(f"{label}: {name} isn't expected")
+    matched = 0
+    for name in sorted(actual.keys() & expected.keys()):
+        if canonical(name, actual[name]) == canonical(name, expected[name]):
+            matched += 1
+        else:
+            problems.append(f"{label}: {name} differs")
+    return matched
+
+
+def check_round_trip(root: Path, problems: list) -> int:
+    """Split each converted object again and compare it with its source files."""
+    plan, files = convert(root, REPO)
+    checked = 0
+    for batch in plan.batches:
+        for job in batch:
+            if job.kind != "object":
+                continue
+            sources = {}
+            for relpath in job.sources:
+                parts = relpath.split("/")
+                sources["/".join(parts[parts.index("objects") :])] = (root / relpath).read_bytes()
+            with_object = job.sources[0].endswith(".object-meta.xml")
+            split = dict(object_source_files(job.name, files[job.name], with_object))
+            checked += compare(split, sources, f"round trip of {job.name}", problems)
+    return checked
+
+
+def check_deploy(problems: list) -> None:
+    """Build the fixture project's package with the Deploy task."""
+    org_config = OrgConfig(
+        {"instance_url": "https://example.my.salesforce.com", "org_id": "00D000000000000001", "access_token": "T"},
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(
+        Deploy,
+        {"path": str(FIXTURE / "force-app"), "unmanaged": True, "source_convert": "python"},
+        org_config=org_config,
+    )
+    task.project_config.repo_info["root"] = str(FIXTURE)
+    package_zip = task._get_package_zip(str(FIXTURE / "force-app"))
+    if package_zip is None:
+        problems.append("deploy: the package is empty")
+        return
+    with zipfile.ZipFile(io.BytesIO(base64.b64decode(package_zip))) as zf:
+        names = set(zf.namelist())
+    expected = set(expected_files(FIXTURE / "expected"))
+    if names != expected:
+        problems.append(f"deploy: package files differ from the expected tree ({len(names ^ expected)} names)")
+
+
+def refresh() -> None:
+    sfdx = shutil.which("sfdx")
+    if sfdx is None:
+        sys.exit("--refresh needs sfdx on the PATH")
+    with tempfile.TemporaryDirectory() as out:
+        subprocess.run(
+            [sfdx, "force:source:convert", "-r", "force-app", "-d", out], cwd=FIXTURE, check=True
+        )
+        shutil.rmtree(FIXTURE / "expected")
+        shutil.copytree(out, FIXTURE / "expected")
+    print(f"Rewrote {FIXTURE / 'expected'} with sfdx.")
+
+
+def time_conversion(label: str, root: Path, ignore_root: Path, workers: int, problems: list) -> None:
+    timings = []
+    outputs = []
+    for count in sorted({1, workers}):
+        started = time.perf_counter()
+        plan, files = convert(root, ignore_root, count)
+        timings.append(f"{time.perf_counter() - started:>8.2f}s")
+        outputs.append(files)
+    if len(timings) == 1:
+        timings.append(f"{'-':>9}")
+    elif outputs[0] != outputs[1]:
+        problems.append(f"{label}: {workers} workers converted it differently from one")
+    print(f"{label:<22} {plan.files:>7} {len(plan.batches):>8} {timings[0]} {timings[1]}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=5000, help="Classes in the synthetic tree")
+    parser.add_argument("--objects", type=int, default=200, help="Objects (with 20 fields) in the synthetic tree")
+    parser.add_argument("--workers", type=int, default=os.cpu_count() or 1)
+    parser.add_argument("--refresh", action="store_true", help="Rewrite expected/ with sfdx")
+    args = parser.parse_args()
+    if args.refresh:
+        return refresh()
+    problems = []
+
+    _, actual = convert(FIXTURE / "force-app", FIXTURE)
+    matched = compare(actual, expected_files(FIXTURE / "expected"), "expected", problems)
+    print(f"expected files matched: {matched}")
+    print(f"objects round-tripped: {check_round_trip(REPO / 'force-app', problems)} files")
+    check_deploy(problems)
+
+    print(f"\n{'tree':<22} {'files':>7} {'batches':>8} {'1 worker':>9} {f'{args.workers} workers':>9}")
+    time_conversion("force-app", REPO / "force-app", REPO, args.workers, problems)
+    with tempfile.TemporaryDirectory() as work:
+        tree = generate(work, objects=args.objects, fields=20, classes=args.classes, resource_kb=512)
+        time_conversion("synthetic", Path(tree.root), Path(work), args.workers, problems)
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
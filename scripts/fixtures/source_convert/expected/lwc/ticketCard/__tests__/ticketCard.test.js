@@ -0,0 +1,9 @@
+import { createElement } from 'lwc';
+import TicketCard from 'c/ticketCard';
+
+describe('c-ticket-card', () => {
+    it('renders', () => {
+        const element = createElement('c-ticket-card', { is: TicketCard });
+        document.body.appendChild(element);
+    });
+});
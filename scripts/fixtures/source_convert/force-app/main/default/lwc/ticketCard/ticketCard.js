@@ -0,0 +1,5 @@
+import { LightningElement, api } from 'lwc';
+
+export default class TicketCard extends LightningElement {
+    @api ticket;
+}
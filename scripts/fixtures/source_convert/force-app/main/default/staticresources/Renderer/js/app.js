@@ -0,0 +1,3 @@
+window.render = function (doc) {
+    document.body.textContent = doc.title;
+};
@@ -0,0 +1,221 @@
+#!/usr/bin/env python3
+"""
+Generates a synthetic sfdx source tree shaped like force-app, at any scale.
+
+Objects get fields (some without help text, some external IDs with a matching
+CustomIndex), and the tree gets Apex classes, a JavaScript bundle and a zip static
+resource.  A share of the files carry the %%%CURRENT_USER%%% token, or the username it
+resolves to, so find/replace and token preservation have work to do.  Output is
+deterministic for a given seed.
+
+    python scripts/generate_synthetic_source.py OUT_DIR [--objects N] [--fields N]
+        [--classes N] [--resource-kb N] [--token-ratio R] [--seed N]
+"""
+
+import argparse
+import io
+import os
+import random
+import zipfile
+from typing import Dict, NamedTuple
+
+TOKEN = "%%%CURRENT_USER%%%"
+USERNAME = "benchmark@example.com"
+
+OBJECT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CustomObject xmlns="http://soap.sforce.com/2006/04/metadata">
+    <label>{label}</label>
+    <description>Synthetic object {label} for benchmarks.</description>
+    <pluralLabel>{label}s</pluralLabel>
+    <nameField>
+        <label>{label} Name</label>
+        <type>Text</type>
+    </nameField>
+    <deploymentStatus>Deployed</deploymentStatus>
+    <sharingModel>ReadWrite</sharingModel>
+</CustomObject>
+"""
+
+FIELD_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CustomField xmlns="http://soap.sforce.com/2006/04/metadata">
+    <fullName>{name}</fullName>
+{extra}    <label>{label}</label>
+    <externalId>{external_id}</externalId>
+    <length>255</length>
+    <required>false</required>
+    <type>Text</type>
+    <unique>false</unique>
+</CustomField>
+"""
+
+CUSTOM_INDEX_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CustomIndex xmlns="http://soap.sforce.com/2006/04/metadata">
+    <allowNullValues>false</allowNullValues>
+    <booleanIndexedValue>false</booleanIndexedValue>
+</CustomIndex>
+"""
+
+CLASS_META_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<ApexClass xmlns="http://soap.sforce.com/2006/04/metadata">
+    <apiVersion>62.0</apiVersion>
+    <status>Active</status>
+</ApexClass>
+"""
+
+RESOURCE_META_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<StaticResource xmlns="http://soap.sforce.com/2006/04/metadata">
+    <cacheControl>Public</cacheControl>
+    <contentType>{content_type}</contentType>
+</StaticResource>
+"""
+
+
+class GeneratedTree(NamedTuple):
+    root: str
+    files: int
+    bytes: int
+    # "Object__c/Field__c" -> tags to add, in update_field_metadata's FIELD_META format
+    field_meta: Dict[str, Dict[str, str]]
+
+
+def _write(path: str, content, counts: list) -> None:
+    os.makedirs(os.path.dirname(path), exist_ok=True)
+    data = content.encode("utf-8") if isinstance(content, str) else content
+    with open(path, "wb") as f:
+        f.write(data)
+    counts[0] += 1
+    counts[1] += len(data)
+
+
+def _apex_class(name: str, rng: random.Random, token: str) -> str:
+    methods = "\n".join(
+        f"    public static Integer method{i}(Integer value) {{\n"
+        f"        // {rng.choice(('TODO', 'NOTE', 'FIXME'))}: synthetic body {rng.random():.6f}\n"
+        f"        return value + {i};\n"
+        f"    }}\n"
+        for i in range(rng.randint(3, 30))
+    )
+    owner = f"    public static final String OWNER = '{token}';\n" if token else ""
+    return f"public with sharing class {name} {{\n{owner}{methods}}}\n"
+
+
+def _zip_resource(rng: random.Random, size: int) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("lib/random.bin", rng.randbytes(size // 2))
+        zf.writestr("lib/app.js", "var x = 1;\n" * (size // 22))
+    return buffer.getvalue()
+
+
+def generate(
+    out: str,
+    objects: int = 50,
+    fields: int = 10,
+    classes: int = 100,
+    resource_kb: int = 512,
+    token_ratio: float = 0.05,
+    seed: int = 0,
+    resolved: bool = False,
+) -> GeneratedTree:
+    """Write a synthetic tree to out/force-app/main/default.
+
+    ``fields`` is per object.  With ``resolved``, files carry the username
+    instead of the token, as they would come back from a retrieve.
+    """
+    rng = random.Random(seed)
+    token = USERNAME if resolved else TOKEN
+    base = os.path.join(out, "force-app", "main", "default")
+    counts = [0, 0]
+    field_meta = {}
+
+    for o in range(objects):
+        obj = f"Synthetic{o:05d}__c"
+        _write(
+            os.path.join(base, "objects", obj, f"{obj}.object-meta.xml"),
+            OBJECT_XML.format(label=f"Synthetic {o}"),
+            counts,
+        )
+        for f in range(fields):
+            field = f"Field{f:04d}__c"
+            external_id = rng.random() < 0.02
+            extra = ""
+            if rng.random() < 0.7:
+                extra += f"    <description>Synthetic field {f} on {obj}.</description>\n"
+            if rng.random() < 0.5:
+                extra += f"    <inlineHelpText>Help for field {f}.</inlineHelpText>\n"
+            else:
+                field_meta[f"{obj}/{field}"] = {"inlineHelpText": f"Generated help for {field}."}
+            _write(
+                os.path.join(base, "objects", obj, "fields", f"{field}.field-meta.xml"),
+                FIELD_XML.format(
+                    name=field,
+                    extra=extra,
+                    label=f"Field {f}",
+                    external_id="true" if external_id else "false",
+                ),
+                counts,
+            )
+            if external_id:
+                _write(
+                    os.path.join(base, "customindex", f"{obj}.{field}.indx-meta.xml"),
+                    CUSTOM_INDEX_XML,
+                    counts,
+                )
+
+    for c in range(classes):
+        name = f"SyntheticClass{c:05d}"
+        with_token = token if rng.random() < token_ratio else ""
+        _write(os.path.join(base, "classes", f"{name}.cls"), _apex_class(name, rng, with_token), counts)
+        _write(os.path.join(base, "classes", f"{name}.cls-meta.xml"), CLASS_META_XML, counts)
+
+    if resource_kb:
+        size = resource_kb * 1024
+        resources = os.path.join(base, "staticresources")
+        bundle = "".join(
+            f"function f{i}(a,b){{return a*{i}+b-{rng.randint(0, 999)}}};" for i in range(size // 40)
+        )
+        _write(os.path.join(resources, "SyntheticBundle.resource"), bundle, counts)
+        _write(
+            os.path.join(resources, "SyntheticBundle.resource-meta.xml"),
+            RESOURCE_META_XML.format(content_type="application/javascript"),
+            counts,
+        )
+        _write(os.path.join(resources, "SyntheticArchive.resource"), _zip_resource(rng, size), counts)
+        _write(
+            os.path.join(resources, "SyntheticArchive.resource-meta.xml"),
+            RESOURCE_META_XML.format(content_type="application/zip"),
+            counts,
+        )
+
+    return GeneratedTree(os.path.join(out, "force-app"), counts[0], counts[1], field_meta)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("out", help="Directory to create force-app/ in")
+    parser.add_argument("--objects", type=int, default=50)
+    parser.add_argument("--fields", type=int, default=10, help="Fields per object")
+    parser.add_argument("--classes", type=int, default=100)
+    parser.add_argument("--resource-kb", type=int, default=512, help="Size of each static resource")
+    parser.add_argument("--token-ratio", type=float, default=0.05, help="Share of classes with a token")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--resolved", action="store_true", help="Write the username instead of the token"
+    )
+    args = parser.parse_args()
+
+    tree = generate(
+        args.out,
+        objects=args.objects,
+        fields=args.fields,
+        classes=args.classes,
+        resource_kb=args.resource_kb,
+        token_ratio=args.token_ratio,
+        seed=args.seed,
+        resolved=args.resolved,
+    )
+    print(f"Wrote {tree.files} files ({tree.bytes / 1024 / 1024:.1f} MB) to {tree.root}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,244 @@
+#!/usr/bin/env python3
+"""
+An in-process stand-in for the Tooling API calls Apex test runs make, and a check
+of the sharded test runner (tasks/sharded_apex_tests.py) against it.
+
+MockApexTestApi answers runTestsAsynchronous and the ApexTestQueueItem,
+ApexTestResult, TestSuiteMembership and coverage queries.  Each enqueued run
+works through its classes one after another, each taking its recorded duration
+(times ``time_scale``).  Methods in ``flaky`` fail the first time they run with
+UNABLE_TO_LOCK_ROW and pass when retried; methods in ``broken`` always fail.
+
+Run as a script, it runs a synthetic suite unsharded and then sharded, twice so
+the second sharded run is balanced by the durations the first one recorded, and
+checks the merged results:
+
+    python scripts/mock_apex_test_api.py [--classes N] [--shards N] [--flaky N]
+
+Requires CumulusCI to be installed (the task imports it).
+"""
+
+import argparse
+import itertools
+import os
+import random
+import re
+import sys
+import tempfile
+import threading
+import time
+from typing import Dict, List, Set, Tuple
+
+SUITE = "DH"
+
+
+class _Response:
+    def __init__(self, body):
+        self.body = body
+        self.status_code = 200
+
+    def raise_for_status(self):
+        pass
+
+    def json(self):
+        return self.body
+
+
+class MockApexTestApi:
+    """Enough of simple_salesforce's tooling client for RunApexTests."""
+
+    base_url = "https://mock.my.salesforce.com/services/data/v61.0/tooling/"
+
+    def __init__(
+        self,
+        durations_ms: Dict[str, int],
+        methods_per_class: int = 3,
+        flaky: Set[Tuple[str, str]] = (),
+        broken: Set[Tuple[str, str]] = (),
+        coverage: int = 90,
+        time_scale: float = 0.001,
+    ):
+        self.durations_ms = durations_ms
+        self.methods_per_class = methods_per_class
+        self.flaky = set(flaky)
+        self.broken = set(broken)
+        self.coverage = coverage
+        self.time_scale = time_scale
+        self.ids = {name: f"01p{i:015d}" for i, name in enumerate(sorted(durations_ms))}
+        self.names = {class_id: name for name, class_id in self.ids.items()}
+        self.jobs: Dict[str, dict] = {}
+        self.runs: List[Tuple[str, str]] = []
+        self.max_running = 0
+        self._ids = itertools.count()
+        self._lock = threading.Lock()
+
+    def methods(self, class_name: str) -> List[str]:
+        return [f"test{i}" for i in range(self.methods_per_class)]
+
+    # runTestsAsynchronous
+
+    def _call_salesforce(self, method, url, json=None, **kwargs):
+        if json.get("classids"):
+            tests = [(class_id, self.methods(self.names[class_id])) for class_id in json["classids"].split(",")]
+        else:
+            tests = [(test["classId"], test["testMethods"]) for test in json["tests"]]
+        with self._lock:
+            job_id = f"707{next(self._ids):015d}"
+            now = time.monotonic()
+            finishes = []
+            for class_id, methods in tests:
+                name = self.names[class_id]
+                now += self.durations_ms[name] * len(methods) / self.methods_per_class * self.time_scale / 1000
+                finishes.append(now)
+            self.jobs[job_id] = {"tests": tests, "finishes": finishes, "results": None}
+            running = sum(1 for job in self.jobs.values() if job["finishes"][-1] > time.monotonic())
+            self.max_running = max(self.max_running, running)
+        return _Response(job_id)
+
+    # queries
+
+    def _job(self, soql: str) -> dict:
+        return self.jobs[re.search(r"(?:ParentJobId|AsyncApexJobId)\s*=\s*'([^']+)'", soql)[1]]
+
+    def _results(self, job: dict) -> List[dict]:
+        with self._lock:
+            if job["results"] is None:
+                job["results"] = []
+                for class_id, methods in job["tests"]:
+                    name = self.names[class_id]
+                    for method in methods:
+                        self.runs.append((name, method))
+                        first_run = self.runs.count((name, method)) == 1
+                        fails = (name, method) in self.broken or (
+                            (name, method) in self.flaky and first_run
+                        )
+                        job["results"].append(
+                            {
+                                "ApexClassId": class_id,
+                                "MethodName": method,
+                                "Outcome": "Fail" if fails else "Pass",
+                                "Message": "System.DmlException: UNABLE_TO_LOCK_ROW" if fails else None,
+                                "StackTrace": f"Class.{name}.{method}: line 1" if fails else None,
+                                "RunTime": self.durations_ms[name] // self.methods_per_class,
+                                "TestTimestamp": None,
+                                "ApexTestResults": None,
+                            }
+                        )
+            return job["results"]
+
+    def query_all(self, soql: str) -> dict:
+        if "FROM TestSuiteMembership" in soql:
+            records = [
+                {"ApexClassId": class_id, "ApexClass": {"Name": name}} for name, class_id in self.ids.items()
+            ]
+        elif "FROM ApexTestQueueItem" in soql:
+            job = self._job(soql)
+            now = time.monotonic()
+            records = [
+                {
+                    "Id": f"709{i:015d}",
+                    "ApexClassId": class_id,
+                    "Status": "Completed" if finish <= now else "Queued",
+                    "ExtendedStatus": None,
+                }
+                for i, ((class_id, _), finish) in enumerate(zip(job["tests"], job["finishes"]))
+            ]
+            if "Status = 'Failed'" in soql:
+                records = []
+        elif "FROM ApexTestResult" in soql:
+            records = self._results(self._job(soql))
+        elif "FROM ApexClass" in soql:
+            records = [{"Id": class_id, "Name": name} for name, class_id in self.ids.items()]
+        else:
+            raise ValueError(f"Unexpected query: {soql}")
+        return {"totalSize": len(records), "done": True, "records": records}
+
+    def query(self, soql: str) -> dict:
+        if "FROM ApexOrgWideCoverage" in soql:
+            return {"totalSize": 1, "records": [{"PercentCovered": self.coverage}]}
+        if "FROM ApexCodeCoverageAggregate" in soql:
+            return {"totalSize": 0, "records": []}
+        return self.query_all(soql)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--classes", type=int, default=60)
+    parser.add_argument("--shards", type=int, default=4)
+    parser.add_argument("--flaky", type=int, default=3, help="Methods that fail once with a row lock")
+    parser.add_argument("--time-scale", type=float, default=0.004)
+    args = parser.parse_args()
+
+    from cumulusci.core.exceptions import ApexTestException
+    from cumulusci.tasks.salesforce.tests.util import create_task
+
+    from tasks.sharded_apex_tests import ShardedApexTests
+
+    rng = random.Random(0)
+    # A few slow classes and many quick ones, as in most suites
+    durations = {
+        f"DeliveryTest{i:03d}": int(rng.paretovariate(1.2) * 2000) for i in range(args.classes)
+    }
+    flaky = {(name, "test0") for name in rng.sample(sorted(durations), args.flaky)}
+    problems = []
+
+    with tempfile.TemporaryDirectory() as work:
+        history = os.path.join(work, "durations.json")
+
+        def run(shards, **api_options):
+            api = MockApexTestApi(durations, flaky=flaky, time_scale=args.time_scale, **api_options)
+            task = create_task(
+                ShardedApexTests,
+                {
+                    "test_suite_names": SUITE,
+                    "shards": shards,
+                    "durations_path": history,
+                    "poll_interval": 0,
+                    "retry_failures": "UNABLE_TO_LOCK_ROW",
+                    "required_org_code_coverage_percent": 75,
+                    "junit_output": os.path.join(work, "results.xml"),
+                    "json_output": os.path.join(work, "results.json"),
+                },
+            )
+            task.tooling = api
+            # No managed packages installed; saves the org a query
+            task.org_config._installed_packages = {}
+            task._init_class()
+            started = time.monotonic()
+            error = None
+            try:
+                task._run_task()
+            except ApexTestException as e:
+                error = str(e)
+            return task, api, time.monotonic() - started, error
+
+        for label, shards, options in (
+            ("unsharded", 1, {}),
+            ("sharded, no history", args.shards, {}),
+            ("sharded, with history", args.shards, {}),
+            ("coverage below 75%", args.shards, {"coverage": 60}),
+        ):
+            task, api, elapsed, error = run(shards, **options)
+            total = args.classes * 3
+            print(
+                f"{label:<24} {elapsed:6.2f}s  pass {task.counts['Pass']:>4}  "
+                f"fail {task.counts['Fail']}  retried {task.counts['Retriable']}  "
+                f"runs at once {api.max_running}  {error or ''}"
+            )
+            if task.counts["Pass"] != total:
+                problems.append(f"{label}: {task.counts['Pass']} of {total} passed")
+            retried = len(api.runs) - total
+            if retried != len(flaky):
+                problems.append(f"{label}: {retried} methods retried, expected {len(flaky)}")
+            if bool(error) != ("coverage" in options):
+                problems.append(f"{label}: unexpected outcome {error!r}")
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+
+    main()
@@ -0,0 +1,689 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the Salesforce Bulk API (v1) and the REST calls data loads
+make, and an end-to-end check of the layered loader (tasks/layered_load.py)
+against it.
+
+MockBulkApi serves Bulk API jobs on http://127.0.0.1:<port>/services/async/<version>
+(create, batches, close, status, results) and answers describe and
+composite/sobjects calls in-process through ``sf``, a stand-in for
+simple_salesforce's client.  Each batch takes ``batch_seconds`` plus its rows
+at ``rows_per_second`` to process, and REST calls take ``rest_seconds``.
+Records are kept per object; a row whose lookup points at an id the mock
+hasn't created (or hasn't finished creating) fails, as in a real org.  Every
+write stamps SystemModstamp, deleted records stay visible to queryAll with
+IsDeleted set, and ``sf.query`` answers simple SOQL (a field list and an
+optional ``SystemModstamp > <datetime>`` filter) in pages of ``page_size``.
+
+Run as a script, it generates a dataset (accounts with parent accounts,
+campaigns, contacts, opportunities, cases and campaign members), loads it with
+the stock load_dataset task and then with the layered loader, and checks that
+every record arrived with its lookups pointing at the right parents:
+
+    python scripts/mock_bulk_api.py [--scale 1.0] [--skip-stock]
+
+Requires CumulusCI to be installed (the tasks import it).
+"""
+
+import argparse
+import csv
+import io
+import itertools
+import json
+import re
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter, defaultdict
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, List, NamedTuple
+
+NS = "http://www.force.com/2009/06/asyncapi/dataload"
+API_VERSION = "61.0"
+
+# Fields each object has: name -> (type, referenceTo)
+SCHEMA = {
+    "Account": {"Name": ("string", []), "Industry": ("picklist", []), "ParentId": ("reference", ["Account"])},
+    "Campaign": {"Name": ("string", []), "IsActive": ("boolean", [])},
+    "Contact": {
+        "LastName": ("string", []),
+        "Email": ("email", []),
+        "AccountId": ("reference", ["Account"]),
+    },
+    "Opportunity": {
+        "Name": ("string", []),
+        "StageName": ("picklist", []),
+        "CloseDate": ("date", []),
+        "AccountId": ("reference", ["Account"]),
+    },
+    "Case": {
+        "Subject": ("string", []),
+        "AccountId": ("reference", ["Account"]),
+        "ContactId": ("reference", ["Contact"]),
+    },
+    "CampaignMember": {
+        "Status": ("picklist", []),
+        "CampaignId": ("reference", ["Campaign"]),
+        "ContactId": ("reference", ["Contact"]),
+    },
+}
+# Fields a record can't be created without, as in a real org
+REQUIRED = {
+    "Account": {"Name"},
+    "Campaign": {"Name"},
+    "Contact": {"LastName"},
+    "Opportunity": {"Name", "StageName", "CloseDate"},
+    "Case": set(),
+    "CampaignMember": {"CampaignId"},
+}
+KEY_PREFIXES = {
+    "Account": "001",
+    "Campaign": "701",
+    "Contact": "003",
+    "Opportunity": "006",
+    "Case": "500",
+    "CampaignMember": "00v",
+}
+
+SOQL = re.compile(r"^SELECT (?P<fields>.+?) FROM (?P<object>\w+)(?: WHERE (?P<where>.+))?$", re.S)
+SINCE = re.compile(r"^\(?(?P<field>\w+) > (?P<value>[\dT:Z.-]+)\)?$")
+MODSTAMP_FORMAT = "%Y-%m-%dT%H:%M:%S.%f"
+
+JOB = re.compile(rf"^/services/async/[\d.]+/job(?:/(?P<job>[^/]+))?(?:/batch(?:/(?P<batch>[^/]+)/result)?)?$")
+TAG = re.compile(r"<(\w+)>([^<]*)</\1>")
+
+
+class Batch(NamedTuple):
+    id: str
+    job_id: str
+    rows: List[Dict[str, str]]
+    ready_at: float
+
+
+class MockBulkApi:
+    """Serves Bulk API jobs on a local port from a background thread, and
+    describe/REST calls through ``sf``."""
+
+    def __init__(
+        self,
+        batch_seconds: float = 0.5,
+        rows_per_second: float = 20000,
+        rest_seconds: float = 0.05,
+        page_size: int = 2000,
+    ):
+        self.batch_seconds = batch_seconds
+        self.rows_per_second = rows_per_second
+        self.rest_seconds = rest_seconds
+        self.page_size = page_size
+        self.sf = _MockSalesforce(self)
+        self._lock = threading.Lock()
+        self._ids = itertools.count(1)
+        self.reset()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    def reset(self):
+        """Forgets all records and jobs, as a fresh org."""
+        with getattr(self, "_lock", threading.Lock()):
+            self.records: Dict[str, Dict[str, dict]] = defaultdict(dict)
+            self.deleted: Dict[str, Dict[str, dict]] = defaultdict(dict)
+            self._cursors: Dict[str, list] = {}
+            self._clock = datetime.now(timezone.utc)
+            self.jobs: Dict[str, dict] = {}
+            self.batches: Dict[str, Batch] = {}
+            self.results: Dict[str, List[tuple]] = {}
+            self.calls = Counter()
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def peak_concurrent_jobs(self) -> int:
+        """Most Bulk API jobs that were being processed at the same time."""
+        events = []
+        for job in self.jobs.values():
+            ready = max((self.batches[b].ready_at for b in job["batches"]), default=job["created_at"])
+            events += [(job["created_at"], 1), (ready, -1)]
+        running = peak = 0
+        for _, change in sorted(events):
+            running += change
+            peak = max(peak, running)
+        return peak
+
+    def _new_id(self, sobject: str) -> str:
+        return f"{KEY_PREFIXES[sobject]}{next(self._ids):012d}AAA"
+
+    def _stamp(self) -> str:
+        """A SystemModstamp later than every earlier one."""
+        self._clock = max(datetime.now(timezone.utc), self._clock + timedelta(milliseconds=1))
+        return self._clock.strftime(MODSTAMP_FORMAT)[:-3] + "+0000"
+
+    # Direct changes, as users of the org would make them
+
+    def insert(self, sobject: str, values: Dict[str, str]) -> str:
+        with self._lock:
+            record_id, success, _, error = self._apply(sobject, "insert", values)
+        if not success:
+            raise ValueError(error)
+        return record_id
+
+    def update(self, sobject: str, record_id: str, values: Dict[str, str]) -> None:
+        with self._lock:
+            _, success, _, error = self._apply(sobject, "update", {**values, "Id": record_id})
+        if not success:
+            raise ValueError(error)
+
+    def age(self, seconds: float) -> None:
+        """Spreads the SystemModstamps of every record so far, in the order they
+        were saved, from ``seconds`` ago to half that, as if saved over time."""
+        with self._lock:
+            records = [record for by_id in (*self.records.values(), *self.deleted.values()) for record in by_id.values()]
+            records.sort(key=lambda record: record["SystemModstamp"])
+            start = datetime.now(timezone.utc) - timedelta(seconds=seconds)
+            step = timedelta(seconds=seconds / 2 / max(len(records), 1))
+            for i, record in enumerate(records):
+                record["SystemModstamp"] = (start + i * step).strftime(MODSTAMP_FORMAT)[:-3] + "+0000"
+
+    def delete(self, sobject: str, record_id: str) -> None:
+        with self._lock:
+            record = self.records[sobject].pop(record_id)
+            record["SystemModstamp"] = self._stamp()
+            self.deleted[sobject][record_id] = record
+
+    def _apply(self, sobject: str, operation: str, row: Dict[str, str]) -> tuple:
+        """Creates or updates one record; returns (id, success, created, error)."""
+        values = {field: value for field, value in row.items() if field != "Id" and value not in ("", None)}
+        for field, value in values.items():
+            kind, references = SCHEMA[sobject].get(field, (None, []))
+            if kind is None:
+                return "", False, False, f"INVALID_FIELD: No such column '{field}' on {sobject}"
+            if kind == "reference" and not any(value in self.records[ref] for ref in references):
+                return "", False, False, f"INVALID_CROSS_REFERENCE_KEY: invalid cross reference id {value}:--"
+        if operation == "insert":
+            record_id = self._new_id(sobject)
+            self.records[sobject][record_id] = {**values, "SystemModstamp": self._stamp()}
+            return record_id, True, True, ""
+        record_id = row.get("Id", "")
+        if record_id not in self.records[sobject]:
+            return record_id, False, False, "ENTITY_IS_DELETED: entity is deleted:--"
+        self.records[sobject][record_id].update(values, SystemModstamp=self._stamp())
+        return record_id, True, False, ""
+
+    def _settle(self):
+        """Processes the batches whose time has come."""
+        now = time.monotonic()
+        for batch in self.batches.values():
+            if batch.id not in self.results and batch.ready_at <= now:
+                job = self.jobs[batch.job_id]
+                self.results[batch.id] = [
+                    self._apply(job["object"], job["operation"], row) for row in batch.rows
+                ]
+
+    # Bulk API
+
+    def _job_info(self, job: dict) -> str:
+        done = [b for b in job["batches"] if b in self.results]
+        processed = sum(len(self.results[b]) for b in done)
+        failed = sum(1 for b in done for result in self.results[b] if not result[1])
+        return _element(
+            "jobInfo",
+            id=job["id"],
+            operation=job["operation"],
+            object=job["object"],
+            state=job["state"],
+            contentType="CSV",
+            numberBatchesQueued=len(job["batches"]) - len(done),
+            numberBatchesInProgress=0,
+            numberBatchesCompleted=len(done),
+            numberBatchesFailed=0,
+            numberBatchesTotal=len(job["batches"]),
+            numberRecordsProcessed=processed,
+            numberRecordsFailed=failed,
+        )
+
+    def _batch_info(self, batch: Batch) -> str:
+        results = self.results.get(batch.id)
+        return _element(
+            "batchInfo",
+            id=batch.id,
+            jobId=batch.job_id,
+            state="Completed" if results is not None else "Queued",
+            numberRecordsProcessed=len(results or ()),
+            numberRecordsFailed=sum(1 for result in results or () if not result[1]),
+        )
+
+    def _bulk(self, method: str, job_id: str, batch_id: str, listing: bool, body: bytes):
+        """Returns (content type, payload) for one Bulk API request."""
+        with self._lock:
+            self._settle()
+            self.calls[f"{method} {'result' if batch_id else 'batch' if listing else 'job'}"] += 1
+            if method == "POST" and not job_id:
+                values = dict(TAG.findall(body.decode("utf-8")))
+                job_id = f"750{len(self.jobs):015d}"
+                self.jobs[job_id] = {
+                    "id": job_id,
+                    "operation": values["operation"],
+                    "object": values["object"],
+                    "state": "Open",
+                    "batches": [],
+                    "created_at": time.monotonic(),
+                }
+                return "application/xml", self._job_info(self.jobs[job_id])
+            job = self.jobs[job_id]
+            if method == "POST" and listing:
+                rows = list(csv.DictReader(io.StringIO(body.decode("utf-8"))))
+                batch_id = f"751{len(self.batches):015d}"
+                seconds = self.batch_seconds + len(rows) / self.rows_per_second
+                self.batches[batch_id] = Batch(batch_id, job_id, rows, time.monotonic() + seconds)
+                job["batches"].append(batch_id)
+                return "application/xml", self._batch_info(self.batches[batch_id])
+            if method == "POST":
+                job["state"] = dict(TAG.findall(body.decode("utf-8")))["state"]
+                return "application/xml", self._job_info(job)
+            if batch_id:
+                out = io.StringIO()
+                writer = csv.writer(out, quoting=csv.QUOTE_ALL)
+                writer.writerow(["Id", "Success", "Created", "Error"])
+                for record_id, success, created, error in self.results[batch_id]:
+                    writer.writerow([record_id, str(success).lower(), str(created).lower(), error])
+                return "text/csv", out.getvalue()
+            if listing:
+                infos = "".join(self._batch_info(self.batches[b]) for b in job["batches"])
+                return "application/xml", f'<batchInfoList xmlns="{NS}">{infos}</batchInfoList>'
+            return "application/xml", self._job_info(job)
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def _body(self) -> bytes:
+                if self.headers.get("Transfer-Encoding", "").lower() != "chunked":
+                    return self.rfile.read(int(self.headers.get("Content-Length") or 0))
+                chunks = []
+                while True:
+                    size = int(self.rfile.readline().split(b";")[0], 16)
+                    if not size:
+                        self.rfile.readline()
+                        return b"".join(chunks)
+                    chunks.append(self.rfile.read(size))
+                    self.rfile.readline()
+
+            def _respond(self):
+                match = JOB.match(self.path)
+                body = self._body() if self.command == "POST" else b""
+                if not match or (match["job"] and match["job"] not in api.jobs):
+                    self.send_error(404)
+                    return
+                listing = self.path.rstrip("/").endswith("/batch")
+                content_type, payload = api._bulk(self.command, match["job"], match["batch"], listing, body)
+                if content_type == "application/xml":
+                    payload = '<?xml version="1.0" encoding="UTF-8"?>' + payload
+                payload = payload.encode("utf-8")
+                self.send_response(201 if self.command == "POST" else 200)
+                self.send_header("Content-Type", content_type)
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            do_GET = do_POST = _respond
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    # REST
+
+    def _composite(self, method: str, records: List[dict]) -> List[dict]:
+        time.sleep(self.rest_seconds)
+        with self._lock:
+            self._settle()
+            self.calls[f"{method} composite"] += 1
+            results = []
+            for record in records:
+                record = dict(record)
+                sobject = record.pop("attributes")["type"]
+                row = {field: "" if value is None else str(value) for field, value in record.items()}
+                record_id, success, _, error = self._apply(
+                    sobject, "insert" if method == "POST" else "update", row
+                )
+                errors = [] if success else [{"statusCode": error.split(":")[0], "message": error, "fields": []}]
+                results.append({"id": record_id or None, "success": success, "errors": errors})
+            return results
+
+    def _query(self, soql: str, include_deleted: bool) -> dict:
+        match = SOQL.match(soql)
+        if not match:
+            raise NotImplementedError(soql)
+        sobject = match["object"]
+        fields = [field.strip() for field in match["fields"].split(",")]
+        if sobject not in SCHEMA:
+            # RecordType, TabDefinition...: none in this org
+            return {"totalSize": 0, "done": True, "records": []}
+        since = None
+        if match["where"]:
+            condition = SINCE.match(match["where"])
+            if not condition or condition["field"] != "SystemModstamp":
+                raise NotImplementedError(soql)
+            # Modstamps compare as text
+            since = condition["value"].rstrip("Z") + ".999+0000"
+        with self._lock:
+            self.calls["query"] += 1
+            records = [(record_id, record, False) for record_id, record in self.records.get(sobject, {}).items()]
+            if include_deleted:
+                records += [(record_id, record, True) for record_id, record in self.deleted.get(sobject, {}).items()]
+            rows = []
+            for record_id, record, is_deleted in records:
+                if since and record["SystemModstamp"] <= since:
+                    continue
+                row = {"attributes": {"type": sobject}}
+                for field in fields:
+                    row[field] = record_id if field == "Id" else is_deleted if field == "IsDeleted" else record.get(field)
+                rows.append(row)
+            cursor = f"01g{len(self._cursors):015d}"
+            self._cursors[cursor] = rows
+        return self._page(cursor, 0)
+
+    def _page(self, cursor: str, offset: int) -> dict:
+        time.sleep(self.rest_seconds)
+        rows = self._cursors[cursor]
+        end = offset + self.page_size
+        page = {"totalSize": len(rows), "done": end >= len(rows), "records": rows[offset:end]}
+        if not page["done"]:
+            page["nextRecordsUrl"] = f"/services/data/v{API_VERSION}/query/{cursor}-{end}"
+        return page
+
+
+class _MockSObject:
+    def __init__(self, name: str):
+        self.name = name
+
+    def describe(self) -> dict:
+        fields = [
+            _describe_field(name, kind, [], system=True)
+            for name, kind in (("Id", "id"), ("IsDeleted", "boolean"), ("SystemModstamp", "datetime"))
+        ]
+        for field, (kind, references) in SCHEMA[self.name].items():
+            fields.append(_describe_field(field, kind, references, required=field in REQUIRED[self.name]))
+        return {"name": self.name, "fields": fields}
+
+
+def _describe_field(name: str, kind: str, references: List[str], system=False, required=False) -> dict:
+    """A field as sObject describe returns it, with the keys CumulusCI's
+    mapping validation reads."""
+    return {
+        "name": name,
+        "label": name,
+        "type": kind,
+        "createable": not system,
+        "updateable": not system,
+        "nillable": not (system or required),
+        "defaultValue": None,
+        "defaultedOnCreate": system,
+        "calculated": False,
+        "custom": name.endswith("__c"),
+        "externalId": False,
+        "idLookup": name == "Id",
+        "unique": False,
+        "referenceTo": references,
+        "relationshipName": name[: -len("Id")] if references else None,
+        "polymorphicForeignKey": len(references) > 1,
+    }
+
+
+class _MockSalesforce:
+    """Enough of simple_salesforce's client for LoadData."""
+
+    sf_version = API_VERSION
+
+    def __init__(self, api: MockBulkApi):
+        self._api = api
+
+    def describe(self) -> dict:
+        return {
+            "sobjects": [
+                {
+                    "name": name,
+                    "createable": True,
+                    "updateable": True,
+                    "deletable": True,
+                    "queryable": True,
+                    "retrieveable": True,
+                    "mruEnabled": False,
+                }
+                for name in SCHEMA
+            ]
+        }
+
+    def __getattr__(self, name):
+        if name in SCHEMA:
+            return _MockSObject(name)
+        raise AttributeError(name)
+
+    def query(self, soql, include_deleted=False, **kwargs):
+        return self._api._query(soql, include_deleted)
+
+    def query_more(self, next_records_identifier, identifier_is_url=False, include_deleted=False, **kwargs):
+        cursor, offset = next_records_identifier.rsplit("/", 1)[-1].split("-")
+        return self._api._page(cursor, int(offset))
+
+    def query_all(self, soql, include_deleted=False, **kwargs):
+        page = self.query(soql, include_deleted)
+        records = list(page["records"])
+        while not page["done"]:
+            page = self.query_more(page["nextRecordsUrl"], identifier_is_url=True)
+            records += page["records"]
+        return {"totalSize": len(records), "done": True, "records": records}
+
+    def restful(self, path, method="GET", json=None, **kwargs):
+        if path != "composite/sobjects" or method not in ("POST", "PATCH"):
+            raise NotImplementedError(f"{method} {path}")
+        return self._api._composite(method, json["records"])
+
+
+def _element(tag: str, **children) -> str:
+    inner = "".join(f"<{name}>{value}</{name}>" for name, value in children.items())
+    return f'<{tag} xmlns="{NS}">{inner}</{tag}>'
+
+
+# The dataset: table -> (object, label field, columns, lookups {field: table})
+TABLES = {
+    "Account": ("Account", "Name", ["Industry"], {"ParentId": "Account"}),
+    "Campaign": ("Campaign", "Name", ["IsActive"], {}),
+    "Contact": ("Contact", "LastName", ["Email"], {"AccountId": "Account"}),
+    "Opportunity": ("Opportunity", "Name", ["StageName", "CloseDate"], {"AccountId": "Account"}),
+    "Case": ("Case", "Subject", [], {"AccountId": "Account", "ContactId": "Contact"}),
+    "CampaignMember": ("CampaignMember", "Status", [], {"CampaignId": "Campaign", "ContactId": "Contact"}),
+}
+ROWS = {"Account": 6000, "Campaign": 400, "Contact": 15000, "Opportunity": 9000, "Case": 8000, "CampaignMember": 5000}
+
+
+def generate_dataset(root: Path, scale: float) -> Dict[str, Dict[str, dict]]:
+    """Writes dataset.sql and mapping.yml under root; returns the rows by
+    table and local id, lookups holding local ids."""
+    rows = {}
+    for table, (sobject, label, columns, lookups) in TABLES.items():
+        count = max(1, int(ROWS[table] * scale))
+        rows[table] = {}
+        for i in range(1, count + 1):
+            row = {label: f"{table}-{i}" if label != "Status" else "Sent"}
+            for column in columns:
+                row[column] = {
+                    "Industry": "Technology",
+                    "IsActive": "true",
+                    "Email": f"contact{i}@example.com",
+                    "StageName": "Prospecting",
+                    "CloseDate": "2026-12-31",
+                }[column]
+            for field, parent in lookups.items():
+                if table == "Account":
+                    # Every tenth account has a parent, which can come later in the table
+                    row[field] = str((i * 7) % count + 1) if i % 10 == 0 else None
+                elif table == "CampaignMember":
+                    # One membership per contact, so (campaign, contact) pairs are unique
+                    row[field] = str(i % len(rows[parent]) + 1) if field == "CampaignId" else str(i)
+                else:
+                    row[field] = str((i * 31) % len(rows[parent]) + 1)
+            rows[table][str(i)] = row
+
+    statements = []
+    for table, table_rows in rows.items():
+        columns = list(next(iter(table_rows.values())))
+        statements.append(
+            f'CREATE TABLE "{table}" (id VARCHAR(255) NOT NULL, '
+            + "".join(f'"{column}" VARCHAR(255), ' for column in columns)
+            + "PRIMARY KEY (id));"
+        )
+        for local_id, row in table_rows.items():
+            values = ", ".join(
+                "NULL" if row[column] is None else "'" + row[column].replace("'", "''") + "'" for column in columns
+            )
+            statements.append(f"INSERT INTO \"{table}\" VALUES('{local_id}', {values});")
+    (root / "dataset.sql").write_text("BEGIN TRANSACTION;\n" + "\n".join(statements) + "\nCOMMIT;\n", "utf-8")
+
+    mapping = {}
+    for table, (sobject, label, columns, lookups) in TABLES.items():
+        step = {"sf_object": sobject, "table": table, "fields": [label] + columns}
+        if lookups:
+            step["lookups"] = {
+                field: {"table": parent, **({"after": "Insert Account"} if parent == table else {})}
+                for field, parent in lookups.items()
+            }
+        mapping[f"Insert {table}"] = step
+    # JSON is valid YAML
+    (root / "mapping.yml").write_text(json.dumps(mapping, indent=2), "utf-8")
+    return rows
+
+
+def check_load(api: MockBulkApi, rows: Dict[str, Dict[str, dict]]) -> List[str]:
+    """Problems with what the mock holds, compared to the generated rows."""
+    problems = []
+    by_label = {}
+    for table, (sobject, label, _, _) in TABLES.items():
+        records = api.records[sobject]
+        if len(records) != len(rows[table]):
+            problems.append(f"{sobject}: {len(records)} records, expected {len(rows[table])}")
+        if label != "Status":
+            by_label[table] = {record[label]: record_id for record_id, record in records.items()}
+
+    def sf_id(table, local_id):
+        return by_label[table].get(f"{table}-{local_id}") if local_id else None
+
+    for table, (sobject, label, _, lookups) in TABLES.items():
+        if table == "CampaignMember":
+            expected = {
+                (sf_id("Campaign", row["CampaignId"]), sf_id("Contact", row["ContactId"]))
+                for row in rows[table].values()
+            }
+            actual = {(r.get("CampaignId"), r.get("ContactId")) for r in api.records[sobject].values()}
+            if expected != actual:
+                problems.append(f"{sobject}: {len(expected - actual)} memberships with the wrong lookups")
+            continue
+        wrong = 0
+        for local_id, row in rows[table].items():
+            record = api.records[sobject].get(sf_id(table, local_id), {})
+            for field, parent in lookups.items():
+                if record.get(field) != sf_id(parent, row[field]):
+                    wrong += 1
+        if wrong:
+            problems.append(f"{sobject}: {wrong} lookups point at the wrong record")
+    return problems
+
+
+def make_task(task_class, root: Path, api: MockBulkApi, **options):
+    from salesforce_bulk import SalesforceBulk
+
+    from cumulusci.core.config import OrgConfig
+    from cumulusci.tasks.salesforce.tests.util import create_task
+    from cumulusci.tests.util import DummyKeychain
+
+    org_config = OrgConfig(
+        {
+            "instance_url": api.url,
+            "org_id": "00D000000000000001",
+            "username": "load@example.com",
+            "access_token": "TOKEN",
+        },
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(
+        task_class,
+        {
+            "mapping": str(root / "mapping.yml"),
+            "sql_path": str(root / "dataset.sql"),
+            "set_recently_viewed": False,
+            **options,
+        },
+        org_config=org_config,
+    )
+    # What _init_task would connect, pointed at the mock
+    task.sf = api.sf
+    task.bulk = SalesforceBulk(host=api.url, sessionId="TOKEN", API_version=API_VERSION)
+    return task
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--scale", type=float, default=1.0, help="Multiplier for the dataset's row counts")
+    parser.add_argument("--workers", type=int, default=4, help="max_workers for the layered loader")
+    parser.add_argument(
+        "--skip-stock", action="store_true", help="Don't time the stock task (it polls every 10s)"
+    )
+    args = parser.parse_args()
+
+    import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+
+    from cumulusci.tasks.bulkdata import LoadData
+
+    from tasks.layered_load import LayeredLoadData
+
+    problems = []
+    with tempfile.TemporaryDirectory() as work, MockBulkApi() as api:
+        root = Path(work)
+        rows = generate_dataset(root, args.scale)
+        print(f"{sum(len(table_rows) for table_rows in rows.values())} rows in {len(rows)} tables")
+        runs = [
+            # One worker shows what the polling and batch sizing alone are worth
+            ("layered, 1 worker", LayeredLoadData, {"max_workers": 1, "poll_interval": 0.2}),
+            ("layered", LayeredLoadData, {"max_workers": args.workers, "poll_interval": 0.2}),
+        ]
+        if not args.skip_stock:
+            runs.insert(0, ("stock load_dataset", LoadData, {}))
+        print(f"{'run':<20} {'seconds':>8} {'rows/s':>8} {'peak jobs':>9}")
+        for label, task_class, options in runs:
+            api.reset()
+            task = make_task(task_class, root, api, **options)
+            started = time.monotonic()
+            task._run_task()
+            elapsed = time.monotonic() - started
+            loaded = sum(len(records) for records in api.records.values())
+            print(f"{label:<20} {elapsed:>8.1f} {loaded / elapsed:>8.0f} {api.peak_concurrent_jobs():>9}")
+            problems += [f"{label}: {problem}" for problem in check_load(api, rows)]
+
+        print()
+        print(f"{'step':<48} {'api':<4} {'rows':>6} {'batches':>7} {'seconds':>7} {'rows/s':>7}")
+        for stats in task.return_values["step_throughput"]:
+            print(
+                f"{stats['step']:<48} {stats['api']:<4} {stats['rows']:>6} {stats['batches']:>7} "
+                f"{stats['seconds']:>7.1f} {stats['rows_per_second']:>7.0f}"
+            )
+
+    for problem in problems:
+        print(f"  {problem}")
+    sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,125 @@
+"""
+An in-process stand-in for the REST composite calls the bulk permission mode of
+tasks/permsets.py makes, through ``restful`` and ``query_more`` as on
+simple_salesforce's client.
+
+Query subrequests are answered from per-object records: the SELECT list has to
+name fields the object has, as in a real org (licenses are named by
+DeveloperName or PermissionSetLicenseKey), and ``WHERE <field> IN (...)``
+clauses joined by OR filter them.  Users come back with their assignments as
+child relationships, which Salesforce returns as None when empty.  Inserts
+through composite/sobjects are recorded in ``inserted``.
+"""
+
+import json
+import re
+from typing import Dict, List
+from urllib.parse import parse_qs, urlparse
+
+# Fields each kind of permission has, besides Id.
+PERMISSION_FIELDS = {
+    "PermissionSet": ("Name",),
+    "PermissionSetLicense": ("DeveloperName", "PermissionSetLicenseKey"),
+    "PermissionSetGroup": ("DeveloperName",),
+}
+
+# Assignment object -> (lookup field, the users' child relationship).
+ASSIGNMENTS = {
+    "PermissionSetAssignment": ("PermissionSetId", "PermissionSetAssignments"),
+    "PermissionSetLicenseAssign": ("PermissionSetLicenseId", "PermissionSetLicenseAssignments"),
+}
+
+_QUERY = re.compile(r"SELECT (.+?) FROM (\w+)(?: WHERE (.*))?$", re.S)
+_IN = re.compile(r"(\w+) IN \(([^)]*)\)")
+_SUBQUERY = re.compile(r"\(SELECT ([\w,]+) FROM (\w+)\)")
+
+
+class MockCompositeApi:
+    """Permission sets, licenses, groups and users for the composite API.
+
+    ``permissions`` maps each kind of permission to its records (without Id,
+    which is assigned here); ``users`` is how many users there are, with
+    aliases u0, u1...
+    """
+
+    base_url = "https://test.salesforce.com/services/data/v61.0/"
+
+    def __init__(self, permissions: Dict[str, List[Dict]], users: int):
+        self.records: Dict[str, List[Dict]] = {
+            kind: [{"Id": f"0{kind[-3:]}{i:011d}", **record} for i, record in enumerate(records)]
+            for kind, records in permissions.items()
+        }
+        self.users = [{"Id": f"005{i:012d}", "Alias": f"u{i}"} for i in range(users)]
+        self.assignments: Dict[str, List[Dict]] = {name: [] for name in ASSIGNMENTS}
+        self.inserted: List[Dict] = []
+        self.calls = 0
+
+    def restful(self, path, method="GET", data=None):
+        assert path == "composite" and method == "POST", (path, method)
+        self.calls += 1
+        results = []
+        for request in json.loads(data)["compositeRequest"]:
+            if request["method"] == "GET":
+                status, body = self._query(parse_qs(urlparse(request["url"]).query)["q"][0])
+            else:
+                status, body = 200, [self._insert(record) for record in request["body"]["records"]]
+            results.append({"body": body, "httpStatusCode": status, "referenceId": request["referenceId"]})
+        return {"compositeResponse": results}
+
+    def query_more(self, url, identifier_is_url=False):
+        raise AssertionError("every result fits in one page")
+
+    def _query(self, soql: str):
+        match = _QUERY.match(soql)
+        if match is None:
+            return 400, [{"errorCode": "MALFORMED_QUERY", "message": soql}]
+        fields, sobject, where = match.groups()
+        if sobject == "User":
+            return self._query_users(fields, where or "")
+        known = ("Id",) + PERMISSION_FIELDS.get(sobject, ())
+        selected = fields.split(",")
+        unknown = [field for field in selected if field not in known]
+        if sobject not in self.records or unknown:
+            return 400, [{"errorCode": "INVALID_FIELD", "message": f"No such column {unknown} on {sobject}"}]
+        clauses = [(field, _values(values)) for field, values in _IN.findall(where or "")]
+        if any(field not in known for field, _ in clauses):
+            return 400, [{"errorCode": "INVALID_FIELD", "message": where}]
+        records = [
+            {"attributes": {"type": sobject}, **{field: record.get(field) for field in selected}}
+            for record in self.records[sobject]
+            if not clauses or any(record.get(field) in values for field, values in clauses)
+        ]
+        return 200, {"done": True, "totalSize": len(records), "records": records}
+
+    def _query_users(self, fields: str, where: str):
+        aliases = _IN.search(where)
+        users = [user for user in self.users if aliases is None or user["Alias"] in _values(aliases.group(2))]
+        records = []
+        for user in users:
+            record = {"attributes": {"type": "User"}, "Id": user["Id"]}
+            for lookups, relationship in _SUBQUERY.findall(fields):
+                assignment = next(name for name, (_, child) in ASSIGNMENTS.items() if child == relationship)
+                rows = [
+                    {field: row.get(field) for field in lookups.split(",")}
+                    for row in self.assignments[assignment]
+                    if row["AssigneeId"] == user["Id"]
+                ]
+                record[relationship] = {"done": True, "totalSize": len(rows), "records": rows} if rows else None
+            records.append(record)
+        return 200, {"done": True, "totalSize": len(records), "records": records}
+
+    def _insert(self, record: Dict) -> Dict:
+        sobject = record["attributes"]["type"]
+        lookup, _ = ASSIGNMENTS[sobject]
+        row = {key: value for key, value in record.items() if key != "attributes"}
+        if sobject == "PermissionSetAssignment" and "PermissionSetGroupId" in row:
+            lookup = "PermissionSetGroupId"
+        if not row.get(lookup) or any(existing == row for existing in self.assignments[sobject]):
+            return {"success": False, "errors": [{"statusCode": "DUPLICATE_VALUE", "message": str(row)}]}
+        self.assignments[sobject].append(row)
+        self.inserted.append(record)
+        return {"success": True, "id": f"0Pa{len(self.inserted):012d}", "errors": []}
+
+
+def _values(values: str) -> List[str]:
+    return [value.strip().strip("'").replace("\\'", "'") for value in values.split(",")]
@@ -0,0 +1,349 @@
+#!/usr/bin/env python3
+"""
+A local stand-in for the Salesforce Metadata API's deploy and retrieve calls, and
+a check of the deploy_orgs task (tasks/multi_org_deploy.py) against it.
+
+MockMetadataApi serves deploy and checkDeployStatus on
+http://127.0.0.1:<port>/services/Soap/m/<version>/<org id>, so an OrgConfig whose
+instance_url points at it can be deployed to.  Each deploy reports Succeeded
+after a few status checks, or fails if its org id is in ``fail_org_ids``; every
+uploaded package is kept in ``deploys`` for inspection.  Given a
+queue/component/test timeline, status responses also report progress as the
+real API does (numberComponentsDeployed, numberTestsCompleted...), and a deploy
+is only done once its timeline has run out.  retrieve/checkStatus/
+checkRetrieveStatus answer with the components of ``org_source`` that the
+request's package.xml lists, and record what each retrieve asked for in
+``retrieves``.
+
+Run as a script, it generates a synthetic source tree, deploys it to --orgs fake
+orgs at once and checks that each org received the package with its own username
+injected for %%%CURRENT_USER%%%:
+
+    python scripts/mock_metadata_api.py [--orgs N] [--fail N] [--classes N]
+
+Requires CumulusCI to be installed (the tasks import it).
+"""
+
+import argparse
+import base64
+import io
+import os
+import re
+import sys
+import tempfile
+import threading
+import time
+import zipfile
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Dict, List, NamedTuple, Optional, Set, Tuple
+
+RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns="http://soap.sforce.com/2006/04/metadata">
+<soapenv:Body><{action}Response><result>{result}</result></{action}Response></soapenv:Body>
+</soapenv:Envelope>
+"""
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types><members>*</members><name>ApexClass</name></types>
+    <version>62.0</version>
+</Package>
+"""
+
+ENDPOINT = re.compile(r"^/services/Soap/m/[\d.]+/(?P<org_id>[^/]+)$")
+ZIP_FILE = re.compile(r"<ZipFile>(.*?)</ZipFile>", re.S)
+PROCESS_ID = re.compile(r"<asyncProcessId>(.*?)</asyncProcessId>")
+TEST_LEVEL = re.compile(r"<testLevel>(.*?)</testLevel>")
+TYPES = re.compile(r"<types>(.*?)</types>", re.S)
+MEMBERS = re.compile(r"<members>(.*?)</members>")
+TYPE_NAME = re.compile(r"<name>(.*?)</name>")
+
+OBJECT_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<CustomObject xmlns="http://soap.sforce.com/2006/04/metadata">
+{elements}</CustomObject>
+"""
+
+
+class ReceivedDeploy(NamedTuple):
+    org_id: str
+    id: str
+    members: Dict[str, bytes]
+    started_at: float
+    # The deploy's testLevel, None if it was left to the org's default
+    test_level: Optional[str] = None
+
+
+class MockMetadataApi:
+    """Serves deploy and retrieve calls on a local port from a background thread.
+
+    ``org_source`` maps each (type, member) component in the org to the files
+    a retrieve returns for it.  Objects and their fields, list views... are
+    given as ("objects/<Object>.object", elements) pieces, joined into one
+    .object file for whichever of them a retrieve asks for.
+    """
+
+    def __init__(
+        self,
+        checks_until_done: int = 2,
+        fail_org_ids: Set[str] = (),
+        queue_seconds: float = 0.0,
+        component_seconds: float = 0.0,
+        test_seconds: float = 0.0,
+        components: int = 100,
+        tests: int = 0,
+    ):
+        self.checks_until_done = checks_until_done
+        self.fail_org_ids = set(fail_org_ids)
+        self.queue_seconds = queue_seconds
+        self.component_seconds = component_seconds
+        self.test_seconds = test_seconds
+        self.components = components
+        self.tests = tests
+        self.deploys: List[ReceivedDeploy] = []
+        self.org_source: Dict[Tuple[str, str], List[Tuple[str, bytes]]] = {}
+        self.retrieves: List[Set[Tuple[str, str]]] = []
+        self._retrieved: Dict[str, bytes] = {}
+        self.calls = Counter()
+        self._checks = Counter()
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+
+    @property
+    def url(self) -> str:
+        return f"http://127.0.0.1:{self._server.server_address[1]}"
+
+    def __enter__(self):
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+    def _handler(self):
+        api = self
+
+        class Handler(BaseHTTPRequestHandler):
+            def do_POST(self):
+                match = ENDPOINT.match(self.path)
+                body = self.rfile.read(int(self.headers["Content-Length"])).decode("utf-8")
+                action = self.headers.get("SOAPAction", "")
+                if not match or action not in (
+                    "deploy",
+                    "checkDeployStatus",
+                    "retrieve",
+                    "checkStatus",
+                    "checkRetrieveStatus",
+                ):
+                    self.send_error(404)
+                    return
+                result = api._handle(action, match["org_id"], body)
+                payload = RESPONSE.format(action=action, result=result).encode("utf-8")
+                self.send_response(200)
+                self.send_header("Content-Type", "text/xml; charset=UTF-8")
+                self.send_header("Content-Length", str(len(payload)))
+                self.end_headers()
+                self.wfile.write(payload)
+
+            def log_message(self, *args):
+                pass
+
+        return Handler
+
+    def _handle(self, action: str, org_id: str, body: str) -> str:
+        with self._lock:
+            self.calls[action] += 1
+            if action == "retrieve":
+                retrieve_id = f"09S{len(self.retrieves):015d}"
+                self._retrieved[retrieve_id] = self._retrieve_zip(body)
+                return f"<done>false</done><id>{retrieve_id}</id><state>Queued</state>"
+            if action == "checkStatus":
+                return f"<done>true</done><id>{PROCESS_ID.search(body)[1]}</id><state>Completed</state>"
+            if action == "checkRetrieveStatus":
+                retrieve_id = PROCESS_ID.search(body)[1]
+                zip_file = base64.b64encode(self._retrieved.pop(retrieve_id)).decode("ascii")
+                return (
+                    f"<done>true</done><id>{retrieve_id}</id><status>Succeeded</status>"
+                    f"<success>true</success><zipFile>{zip_file}</zipFile>"
+                )
+            if action == "deploy":
+                zf = zipfile.ZipFile(io.BytesIO(base64.b64decode(ZIP_FILE.search(body)[1])))
+                deploy_id = f"0Af{len(self.deploys):015d}"
+                test_level = TEST_LEVEL.search(body)
+                self.deploys.append(
+                    ReceivedDeploy(
+                        org_id,
+                        deploy_id,
+                        {name: zf.read(name) for name in zf.namelist()},
+                        time.monotonic(),
+                        test_level[1] if test_level else None,
+                    )
+                )
+                return f"<done>false</done><id>{deploy_id}</id><state>Queued</state>"
+
+            deploy_id = PROCESS_ID.search(body)[1]
+            self._checks[deploy_id] += 1
+            deploy = next(deploy for deploy in self.deploys if deploy.id == deploy_id)
+            progress = self._progress(time.monotonic() - deploy.started_at)
+            if progress or self._checks[deploy_id] < self.checks_until_done:
+                return f"<done>false</done><id>{deploy_id}</id>{progress or '<stateDetail>Deploying</stateDetail>'}"
+            if org_id in self.fail_org_ids:
+                return (
+                    f"<done>true</done><id>{deploy_id}</id><status>Failed</status>"
+                    "<errorMessage>Mock deploy failure</errorMessage>"
+                )
+            return (
+                f"<done>true</done><id>{deploy_id}</id><status>Succeeded</status><success>true</success>"
+                f"<numberComponentsDeployed>{self.components}</numberComponentsDeployed>"
+                f"<numberComponentsTotal>{self.components}</numberComponentsTotal>"
+                f"<numberTestsCompleted>{self.tests}</numberTestsCompleted>"
+                f"<numberTestsTotal>{self.tests}</numberTestsTotal>"
+            )
+
+    def _retrieve_zip(self, body: str) -> bytes:
+        """The zip a retrieve of the package.xml in ``body`` returns."""
+        requested = set()
+        for types in TYPES.findall(body):
+            mdtype = TYPE_NAME.search(types)[1]
+            requested.update((mdtype, member) for member in MEMBERS.findall(types))
+        self.retrieves.append(requested)
+
+        files = {}
+        objects: Dict[str, List[bytes]] = {}
+        for component, pieces in self.org_source.items():
+            if component not in requested:
+                continue
+            for path, content in pieces:
+                if path.startswith("objects/") and path.endswith(".object"):
+                    objects.setdefault(path, []).append(content)
+                else:
+                    files[path] = content
+        for path, elements in objects.items():
+            files[path] = OBJECT_XML.format(elements=b"".join(elements).decode("utf-8")).encode("utf-8")
+
+        buffer = io.BytesIO()
+        with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+            for path, content in sorted(files.items()):
+                zf.writestr(f"unpackaged/{path}", content)
+            zf.writestr("unpackaged/package.xml", PACKAGE_XML)
+        return buffer.getvalue()
+
+    def done_at(self, deploy: ReceivedDeploy) -> float:
+        """When (time.monotonic()) a deploy's timeline runs out."""
+        return deploy.started_at + self.queue_seconds + self.component_seconds + self.test_seconds
+
+    def _progress(self, elapsed: float) -> str:
+        """Status elements for a deploy still running after elapsed seconds, or ""."""
+        if elapsed < self.queue_seconds:
+            return "<status>Queued</status>"
+        elapsed -= self.queue_seconds
+        if elapsed < self.component_seconds:
+            deployed, completed = int(self.components * elapsed / self.component_seconds), 0
+        elif elapsed - self.component_seconds < self.test_seconds:
+            deployed = self.components
+            completed = int(self.tests * (elapsed - self.component_seconds) / self.test_seconds)
+        else:
+            return ""
+        return (
+            "<status>InProgress</status>"
+            f"<numberComponentsDeployed>{deployed}</numberComponentsDeployed>"
+            f"<numberComponentsTotal>{self.components}</numberComponentsTotal>"
+            "<numberComponentErrors>0</numberComponentErrors>"
+            f"<numberTestsCompleted>{completed}</numberTestsCompleted>"
+            f"<numberTestsTotal>{self.tests}</numberTestsTotal>"
+            "<numberTestErrors>0</numberTestErrors>"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--orgs", type=int, default=4, help="Number of fake orgs (default: 4)")
+    parser.add_argument("--fail", type=int, default=0, help="How many of them fail (default: 0)")
+    parser.add_argument("--classes", type=int, default=200, help="Apex classes to generate")
+    args = parser.parse_args()
+
+    from generate_synthetic_source import TOKEN, generate
+
+    from cumulusci.core.config import OrgConfig
+    from cumulusci.core.exceptions import CumulusCIException
+    from cumulusci.tasks.salesforce.tests.util import create_task
+    from cumulusci.tests.util import DummyKeychain
+
+    from tasks.multi_org_deploy import MultiOrgDeploy, OrgDeployApi
+
+    OrgDeployApi.check_interval = 0.05
+    names = [f"org{i}" for i in range(args.orgs)]
+    failing = {f"00D{i:015d}" for i in range(args.fail)}
+
+    with tempfile.TemporaryDirectory() as work, MockMetadataApi(fail_org_ids=failing) as api:
+        tree = generate(work, objects=20, classes=args.classes, resource_kb=256, token_ratio=0.5)
+        # A package.xml makes the tree pass for MDAPI format, so no sfdx conversion is needed
+        path = os.path.join(tree.root, "main", "default")
+        with open(os.path.join(path, "package.xml"), "w") as f:
+            f.write(PACKAGE_XML)
+        task = create_task(
+            MultiOrgDeploy,
+            {
+                "path": path,
+                "orgs": ",".join(names),
+                "report_path": os.path.join(work, "report.json"),
+                "transforms": [
+                    {
+                        "transform": "find_replace",
+                        "options": {"patterns": [{"find": TOKEN, "inject_username": True}]},
+                    }
+                ],
+            },
+        )
+        task.org_configs = {
+            name: OrgConfig(
+                {
+                    "instance_url": api.url,
+                    "org_id": f"00D{i:015d}",
+                    "username": f"{name}@example.com",
+                    "access_token": "TOKEN",
+                },
+                name,
+                keychain=DummyKeychain(),
+            )
+            for i, name in enumerate(names)
+        }
+
+        start = time.perf_counter()
+        try:
+            task._run_task()
+        except CumulusCIException as e:
+            print(e)
+        elapsed = time.perf_counter() - start
+
+        problems = []
+        usernames = {f"00D{i:015d}": f"{name}@example.com" for i, name in enumerate(names)}
+        for deploy in api.deploys:
+            text = b"".join(deploy.members.values())
+            if TOKEN.encode() in text:
+                problems.append(f"{deploy.org_id}: token left in the package")
+            for org_id, username in usernames.items():
+                if (username.encode() in text) != (org_id == deploy.org_id):
+                    problems.append(f"{deploy.org_id}: wrong username injected ({username})")
+        if len(api.deploys) != len(names):
+            problems.append(f"expected {len(names)} deploys, got {len(api.deploys)}")
+        for org, result in task.return_values["orgs"].items() if task.return_values else ():
+            expected = "Failed" if task.org_configs[org].org_id in failing else "Success"
+            if result["status"] != expected:
+                problems.append(f"{org}: expected {expected}, got {result['status']}")
+
+        print(
+            f"{len(api.deploys)} deploys, {api.calls['checkDeployStatus']} status checks "
+            f"in {elapsed:.2f}s"
+        )
+        for problem in problems:
+            print(f"  {problem}")
+        sys.exit(1 if problems else 0)
+
+
+if __name__ == "__main__":
+    import benchmark_deploy_transforms  # noqa: F401  (puts tasks/ on the tasks package path)
+
+    main()
@@ -0,0 +1,65 @@
+#!/usr/bin/env python3
+"""
+Queries the metadata index of force-app (.cci/metadata_index.sqlite), refreshing it first.
+
+The index is rebuilt incrementally: only files whose mtime or size changed since the
+last run are read, so queries take milliseconds once it exists.
+
+    python scripts/query_metadata_index.py missing-help-text
+    python scripts/query_metadata_index.py missing-description
+    python scripts/query_metadata_index.py external-ids
+    python scripts/query_metadata_index.py where "type = 'ApexClass' AND path LIKE '%Test%'"
+"""
+
+import argparse
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
+
+from tasks.metadata_index import MetadataIndex  # noqa: E402
+
+SOURCE_ROOT = "force-app"
+INDEX_PATH = ".cci/metadata_index.sqlite"
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "query",
+        choices=("missing-help-text", "missing-description", "external-ids", "where"),
+    )
+    parser.add_argument("condition", nargs="?", help="SQL condition for the 'where' query")
+    args = parser.parse_args()
+    if args.query == "where" and not args.condition:
+        parser.error("the 'where' query needs a condition")
+
+    with MetadataIndex(INDEX_PATH, SOURCE_ROOT) as index:
+        start = time.perf_counter()
+        refreshed = index.refresh()
+        refresh_ms = (time.perf_counter() - start) * 1000
+
+        start = time.perf_counter()
+        if args.query == "missing-help-text":
+            results = index.fields_missing("inline_help_text")
+        elif args.query == "missing-description":
+            results = index.fields_missing("description")
+        elif args.query == "external-ids":
+            results = index.external_id_fields()
+        else:
+            results = index.query(args.condition)
+        query_ms = (time.perf_counter() - start) * 1000
+
+    for component in results:
+        print(f"  {component.type}: {component.name}  ({component.path})")
+    print(
+        f"\n{len(results)} results. Refreshed {refreshed.scanned} files "
+        f"({len(refreshed.changed)} changed, {len(refreshed.removed)} removed) "
+        f"in {refresh_ms:.0f} ms, query took {query_ms:.1f} ms."
+    )
+
+
+if __name__ == "__main__":
+    os.chdir(os.path.join(os.path.dirname(__file__), ".."))
+    main()
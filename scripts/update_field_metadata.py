@@ -2,15 +2,35 @@
 """
 Populates missing <description> and <inlineHelpText> tags in Salesforce field metadata XML files.
 Inserts them in the canonical order: fullName -> description -> inlineHelpText -> label -> ...
+
+Candidate files come from the metadata index (.cci/metadata_index.sqlite), so only field
+files with an entry in FIELD_META that are missing one of its tags are opened.  Files are
+patched in parallel, each with a single splice, and --dry-run prints the changes as a diff
+without writing them.
+
+    python scripts/update_field_metadata.py [--dry-run] [--workers N]
 """
 
+import argparse
+import difflib
 import os
 import re
+import sys
+from concurrent.futures import ThreadPoolExecutor
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+sys.path.insert(0, os.path.join(os.path.dirname(os.path.abspath(__file__)), ".."))
 
+from tasks.metadata_index import MetadataIndex  # noqa: E402
+
+SOURCE_ROOT = "force-app"
 BASE = "force-app/main/default/objects"
+INDEX_PATH = ".cci/metadata_index.sqlite"
+
+# Tags managed by this script, in the order Salesforce writes them.  A missing
+# tag is inserted after the closest tag before it in this list that is present.
+TAG_ORDER = ("fullName", "description", "inlineHelpText")
 
-# Dictionary: "Object/FieldName" -> {"description": "...", "inlineHelpText": "..."}
-# Only entries for fields that are missing one or both tags.
 FIELD_META = {
     # ── CloudNimbusGlobalSettings__mdt ──────────────────────────────────────
     "CloudNimbusGlobalSettings__mdt/EndpointUrlTxt__c": {
@@ -254,102 +274,158 @@ FIELD_META = {
 }
 
 
-def insert_after_tag(xml: str, after_tag: str, new_content: str) -> str:
-    """Insert new_content immediately after the closing of after_tag's line."""
-    pattern = re.compile(r'([ \t]*<' + re.escape(after_tag) + r'>[^\n]*\n)')
-    match = pattern.search(xml)
-    if match:
-        pos = match.end()
-        return xml[:pos] + new_content + xml[pos:]
-    return xml
+def _compile_tag_patterns(tag: str) -> Tuple["re.Pattern", "re.Pattern"]:
+    escaped = re.escape(tag)
+    return (
+        # The whole line the tag opens on, including its newline
+        re.compile(r"[ \t]*<" + escaped + r">[^\n]*\n"),
+        # The indentation in front of the tag
+        re.compile(r"^([ \t]*)<" + escaped + r">", re.MULTILINE),
+    )
 
 
-def insert_before_tag(xml: str, before_tag: str, new_content: str) -> str:
-    """Insert new_content immediately before the line containing before_tag."""
-    pattern = re.compile(r'([ \t]*<' + re.escape(before_tag) + r'>)')
-    match = pattern.search(xml)
-    if match:
-        pos = match.start()
-        return xml[:pos] + new_content + xml[pos:]
-    return xml
+TAG_PATTERNS = {tag: _compile_tag_patterns(tag) for tag in TAG_ORDER}
 
 
 def get_indent(xml: str, tag: str) -> str:
     """Get the indentation used for a given tag in the XML."""
-    pattern = re.compile(r'^([ \t]*)<' + re.escape(tag) + r'>', re.MULTILINE)
-    match = pattern.search(xml)
+    match = TAG_PATTERNS[tag][1].search(xml)
     return match.group(1) if match else "    "
 
 
-def process_field_file(filepath: str, obj_name: str, field_name: str) -> bool:
+def patch_xml(xml: str, values: Dict[str, str]) -> str:
+    """Insert each tag in values that xml is missing, in TAG_ORDER, in one splice.
+
+    Tags already present are left alone.  Returns xml unchanged if there is
+    nothing to add or no tag to anchor the new lines to.
+    """
+    indent = get_indent(xml, TAG_ORDER[0])
+    present = {tag for tag in TAG_ORDER if f"<{tag}>" in xml}
+
+    # Group the new lines by the existing tag they follow
+    insertions: Dict[str, List[str]] = {}
+    anchor = None
+    for tag in TAG_ORDER:
+        if tag in present:
+            anchor = tag
+        elif tag in values and anchor is not None:
+            insertions.setdefault(anchor, []).append(
+                f"{indent}<{tag}>{values[tag]}</{tag}>\n"
+            )
+
+    splices = []
+    for anchor, lines in insertions.items():
+        match = TAG_PATTERNS[anchor][0].search(xml)
+        if match:
+            splices.append((match.end(), "".join(lines)))
+    if not splices:
+        return xml
+
+    splices.sort()
+    pieces = []
+    position = 0
+    for offset, text in splices:
+        pieces.append(xml[position:offset])
+        pieces.append(text)
+        position = offset
+    pieces.append(xml[position:])
+    return "".join(pieces)
+
+
+class FieldResult(NamedTuple):
+    key: str
+    updated: bool
+    diff: Optional[str] = None
+    error: Optional[str] = None
+
+
+def process_field_file(filepath: str, key: str, dry_run: bool = False) -> FieldResult:
     with open(filepath, "r", encoding="utf-8") as f:
         original = f.read()
 
-    key = f"{obj_name}/{field_name}"
-    meta = FIELD_META.get(key)
-    if not meta:
-        return False  # Nothing to add
-
-    xml = original
-    changed = False
-    indent = get_indent(xml, "fullName")
-
-    has_description = "<description>" in xml
-    has_inline = "<inlineHelpText>" in xml
-
-    # Add description if missing
-    if not has_description and "description" in meta:
-        desc_line = f'{indent}<description>{meta["description"]}</description>\n'
-        # Insert after <fullName>
-        xml = insert_after_tag(xml, "fullName", desc_line)
-        changed = True
-
-    # Add inlineHelpText if missing
-    if not has_inline and "inlineHelpText" in meta:
-        help_line = f'{indent}<inlineHelpText>{meta["inlineHelpText"]}</inlineHelpText>\n'
-        if "<description>" in xml:
-            # Insert after <description>
-            xml = insert_after_tag(xml, "description", help_line)
-        else:
-            # Insert after <fullName>
-            xml = insert_after_tag(xml, "fullName", help_line)
-        changed = True
-
-    if changed and xml != original:
+    xml = patch_xml(original, FIELD_META[key])
+    if xml == original:
+        return FieldResult(key, False)
+
+    diff = None
+    if dry_run:
+        diff = "".join(
+            difflib.unified_diff(
+                original.splitlines(keepends=True),
+                xml.splitlines(keepends=True),
+                fromfile=filepath,
+                tofile=filepath,
+            )
+        )
+    else:
         with open(filepath, "w", encoding="utf-8", newline="\n") as f:
             f.write(xml)
-        return True
+    return FieldResult(key, True, diff)
 
-    return False
 
+def find_field_files() -> Tuple[List[Tuple[str, str]], int]:
+    """List (path, FIELD_META key) for field files with metadata to add.
 
-def main():
-    updated = 0
-    skipped = 0
-    errors = 0
+    Also returns how many field files were skipped without being opened:
+    those with no FIELD_META entry, and those the index shows already have
+    every tag their entry would add.
+    """
+    with MetadataIndex(INDEX_PATH, SOURCE_ROOT) as index:
+        index.refresh()
+        fields = index.components("CustomField")
 
-    for obj_dir in sorted(os.listdir(BASE)):
-        fields_dir = os.path.join(BASE, obj_dir, "fields")
-        if not os.path.isdir(fields_dir):
+    jobs = []
+    skipped = 0
+    for field in fields:
+        if not field.path.startswith(BASE + "/"):
             continue
+        key = field.name.replace(".", "/", 1)
+        meta = FIELD_META.get(key)
+        if meta is not None and (
+            ("description" in meta and field.description is None)
+            or ("inlineHelpText" in meta and field.inline_help_text is None)
+        ):
+            jobs.append((field.path, key))
+        else:
+            skipped += 1
+    return jobs, skipped
+
+
+def _run_job(job: Tuple[str, str], dry_run: bool) -> FieldResult:
+    filepath, key = job
+    try:
+        return process_field_file(filepath, key, dry_run)
+    except Exception as e:
+        return FieldResult(key, False, error=str(e))
+
 
-        for filename in sorted(os.listdir(fields_dir)):
-            if not filename.endswith(".field-meta.xml"):
-                continue
-
-            field_name = filename.replace(".field-meta.xml", "")
-            filepath = os.path.join(fields_dir, filename)
-
-            try:
-                result = process_field_file(filepath, obj_dir, field_name)
-                if result:
-                    print(f"  UPDATED: {obj_dir}/{field_name}")
-                    updated += 1
-                else:
-                    skipped += 1
-            except Exception as e:
-                print(f"  ERROR:   {obj_dir}/{field_name}: {e}")
-                errors += 1
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument(
+        "--dry-run", action="store_true", help="Print the changes as a diff without writing them"
+    )
+    parser.add_argument(
+        "--workers", type=int, default=min(32, (os.cpu_count() or 1) + 4), help="Files to patch in parallel"
+    )
+    args = parser.parse_args()
+
+    jobs, skipped = find_field_files()
+    with ThreadPoolExecutor(max_workers=max(1, args.workers)) as pool:
+        results = list(pool.map(lambda job: _run_job(job, args.dry_run), jobs))
+
+    updated = 0
+    errors = 0
+    for result in results:
+        if result.error:
+            print(f"  ERROR:   {result.key}: {result.error}")
+            errors += 1
+        elif result.updated:
+            print(f"  {'WOULD UPDATE' if args.dry_run else 'UPDATED'}: {result.key}")
+            if result.diff:
+                print(result.diff)
+            updated += 1
+        else:
+            skipped += 1
 
     print(f"\nDone. Updated: {updated}, Skipped (already complete): {skipped}, Errors: {errors}")
 
@@ -1,51 +1,504 @@
+import abc
+import base64
+import cProfile
+import copy
+import http.client
 import io
+import json
+import os
 import re
+import struct
+import tempfile
+import time
 import zipfile
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, Optional, Tuple
 
-from cumulusci.core.source_transforms.transforms import FindReplaceTransform
+from cumulusci.core.exceptions import CumulusCIException, TaskOptionsError
+from cumulusci.core.sfdx import SourceFormat, convert_sfdx_source, get_source_format_for_path
+from defusedxml.minidom import parseString
+from lxml import etree
+from cumulusci.core.source_transforms.transforms import (
+    FindReplaceTransform,
+    SourceTransform,
+)
+from cumulusci.core.utils import process_bool_arg
+from cumulusci.salesforce_api.metadata import ApiDeploy
+from cumulusci.salesforce_api.package_zip import MetadataPackageZipBuilder
 from cumulusci.tasks.salesforce.Deploy import Deploy as BaseDeployTask
 from cumulusci.core.dependencies.utils import TaskContext
 
+from tasks.deploy_chunks import (
+    DEFAULT_CHUNK_MAX_BYTES,
+    DEFAULT_CHUNK_MAX_FILES,
+    DeployChunk,
+    plan_chunks,
+)
+from tasks.deploy_polling import AdaptivePoller, DeployProgress, ProgressListener
+from tasks.deploy_profile import DeployProfiler, profile_span
+from tasks.deploy_manifest import (
+    DeployFingerprint,
+    DeployManifest,
+    component_hashes,
+    filter_package,
+    package_fingerprint,
+    unknown_directories,
+)
+from tasks.find_replace import CompiledReplacements
+from tasks.member_content import ARCHIVE_DATE_TIME, ARCHIVE_FILE_ATTR, is_binary, member_info
+from tasks.package_xml import PackageXml
+from tasks.source_convert import UnsupportedSource, convert_source, plan_conversion
+from tasks.source_format import read_forceignore
+from tasks.task_logging import PrefixedTask
+from tasks.transform_cache import TransformCache
 
-class FindReplaceWithFilename(FindReplaceTransform):
-    """Extends the standard find_replace transform to also handle filenames."""
+# Flag bit 3 of a local file header: CRC and sizes follow the data in a descriptor.
+_ZIP_DATA_DESCRIPTOR_FLAG = 0x08
+_ZIP_ENCRYPTED_FLAG = 0x01
+
+# Archives built by our transforms stay in memory up to this size, then
+# move to a temporary file.
+DEFAULT_SPOOL_THRESHOLD = 16 * 1024 * 1024
+
+
+class ArchiveBuffer(tempfile.SpooledTemporaryFile):
+    """A buffer for a package zip that spills to a temp file past ``max_size``.
+
+    Provides getvalue() like io.BytesIO, which MetadataPackageZipBuilder
+    uses to read the finished package.  The temp file is deleted when the
+    buffer is closed or garbage collected.
+    """
+
+    def __init__(self, max_size: int = DEFAULT_SPOOL_THRESHOLD):
+        super().__init__(max_size=max_size, mode="w+b")
+
+    def getvalue(self) -> bytes:
+        position = self.tell()
+        self.seek(0)
+        try:
+            return self.read()
+        finally:
+            self.seek(position)
+
+
+def _release_archive(zf: zipfile.ZipFile) -> None:
+    """Close a zip that the next stage has fully consumed, freeing its buffer.
+
+    In-memory and spooled buffers are closed first, and the zip is marked
+    unmodified so that neither close() nor garbage collection tries to write
+    a central directory into the closed buffer.
+    """
+    if isinstance(zf.fp, (io.BytesIO, ArchiveBuffer)):
+        try:
+            zf.fp.close()
+        except BufferError:
+            pass
+        zf._didModify = False
+    zf.close()
+
+
+class MemberTransform(SourceTransform):
+    """A transform that rewrites the package one member at a time.
+
+    Member transforms never build an archive themselves; they are run by a
+    StreamingTransformPipeline, which reads every member once, feeds it
+    through each transform in order and writes the result once.  Used on its
+    own, a member transform behaves like any other SourceTransform.
+
+    ``stats`` is a Counter the pipeline resets before each run; transforms
+    count what they did in it (members rewritten, replacements made...) for
+    the deploy profile.
+    """
+
+    options_model = None
+    stats: Counter
+
+    def begin(self, context: TaskContext) -> None:
+        """Prepare per-deploy state before the first member is seen."""
+
+    def cache_key(self) -> Optional[str]:
+        """Describe this transform's (resolved) behavior for the transform cache.
+
+        Called after begin().  Two runs with the same key must transform any
+        given member identically.  Transforms that return None are not cached.
+        """
+        return None
+
+    @abc.abstractmethod
+    def transform_member(
+        self, name: str, content: bytes
+    ) -> Optional[Tuple[str, bytes]]:
+        """Return the (possibly renamed and rewritten) member, or None to drop it.
+
+        Implementations must return the original ``content`` object when they
+        do not change it, so the pipeline can copy the member without
+        recompressing it.
+        """
 
     def process(self, zf: zipfile.ZipFile, context: TaskContext) -> zipfile.ZipFile:
-        # First do the normal find_replace on file contents
-        zf = super().process(zf, context)
+        return StreamingTransformPipeline([self]).process(zf, context)
 
-        # Then handle filenames
-        zip_dest = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
-        for name in zf.namelist():
-            content = zf.read(name)
-            new_name = name
 
-            # Apply each pattern to the filename
-            for pattern in self.options.patterns:
-                find = pattern.find
-                if find and find in new_name:
-                    replace = pattern.get_replace_string(context)
-                    new_name = new_name.replace(find, replace)
+def _supports_raw_copy() -> bool:
+    """Whether this zipfile has the internals _copy_member_raw() writes through."""
+    if not (hasattr(zipfile, "sizeFileHeader") and hasattr(zipfile.ZipInfo, "FileHeader")):
+        return False
+    with zipfile.ZipFile(io.BytesIO(), "w") as zf:
+        return all(
+            hasattr(zf, attribute) for attribute in ("_lock", "_writecheck", "_didModify", "start_dir", "_seekable")
+        )
+
+
+_RAW_COPY = _supports_raw_copy()
+
+
+def _copy_member_raw(
+    src: zipfile.ZipFile,
+    dest: zipfile.ZipFile,
+    info: zipfile.ZipInfo,
+    name: Optional[str] = None,
+) -> bool:
+    """Copy a member's compressed bytes from src to dest without recompressing them.
+
+    zipfile has no public API for this, so the local header is rebuilt from the
+    ZipInfo and written the same way ZipFile.mkdir() writes its entries.  Pass
+    ``name`` to store the member under a new name.
+    Returns False when the member cannot be copied verbatim, or when this
+    zipfile lacks those internals; callers then write it with writestr().
+    """
+    if not _RAW_COPY or info.flag_bits & _ZIP_ENCRYPTED_FLAG or not dest._seekable:
+        return False
+
+    src.fp.seek(info.header_offset)
+    header = src.fp.read(zipfile.sizeFileHeader)
+    name_length, extra_length = struct.unpack("<HH", header[26:30])
+    src.fp.seek(info.header_offset + zipfile.sizeFileHeader + name_length + extra_length)
+    raw = src.fp.read(info.compress_size)
+
+    copied = copy.copy(info)
+    copied.flag_bits &= ~_ZIP_DATA_DESCRIPTOR_FLAG
+    if name is not None:
+        copied.filename = copied.orig_filename = name
+    with dest._lock:
+        dest.fp.seek(dest.start_dir)
+        copied.header_offset = dest.fp.tell()
+        dest._writecheck(copied)
+        dest._didModify = True
+        dest.fp.write(copied.FileHeader())
+        dest.fp.write(raw)
+        dest.filelist.append(copied)
+        dest.NameToInfo[copied.filename] = copied
+        dest.start_dir = dest.fp.tell()
+    return True
+
+
+class StreamingTransformPipeline(SourceTransform):
+    """Applies several MemberTransforms to the package zip in a single pass.
+
+    Each member is read and decompressed once, passed through every stage,
+    and written once.  Members whose content no stage changes are copied
+    across with their original compressed bytes, and rewritten members that
+    are already compressed (see member_content.is_incompressible) are stored
+    rather than deflated.  If nothing changes at all, the input zip is
+    returned as-is.
+
+    With a TransformCache, members the same stages have already seen are
+    taken from the cache instead of being transformed again.
+
+    The output is built in an ArchiveBuffer that spills to disk beyond
+    ``spool_threshold`` bytes, and once it is complete the input zip's
+    buffer is released, so at most one full in-memory copy of the package
+    is alive per stage.
+    """
+
+    options_model = None
+    identifier = "streaming_pipeline"
+
+    def __init__(
+        self,
+        stages: List[MemberTransform],
+        cache: Optional[TransformCache] = None,
+        spool_threshold: int = DEFAULT_SPOOL_THRESHOLD,
+    ):
+        self.stages = list(stages)
+        self.cache = cache
+        self.spool_threshold = spool_threshold
+        self.profiler: Optional[DeployProfiler] = None
+        self._stage_seconds: Optional[List[float]] = None
+
+    def _cache_signature(self) -> Optional[str]:
+        keys = [stage.cache_key() for stage in self.stages]
+        if None in keys:
+            return None
+        return json.dumps(keys)
+
+    def _transform_member(self, name: str, content: bytes):
+        member = (name, content)
+        timings = self._stage_seconds
+        for i, stage in enumerate(self.stages):
+            if timings is None:
+                member = stage.transform_member(*member)
+            else:
+                start = time.perf_counter()
+                member = stage.transform_member(*member)
+                timings[i] += time.perf_counter() - start
+            if member is None:
+                break
+        return member
+
+    def process(self, zf: zipfile.ZipFile, context: TaskContext) -> zipfile.ZipFile:
+        with profile_span(self.profiler, self.identifier) as attributes:
+            started = time.perf_counter()
+            result = self._process(zf, context, attributes)
+            if self.profiler is not None:
+                self._record_stages(started, attributes)
+            return result
+
+    def _record_stages(self, started: float, attributes: dict) -> None:
+        """Record each stage's time, summed over all members, as a child span.
+
+        Stages run member by member, interleaved, so their spans are laid end
+        to end from the start of the pipeline rather than placed in time.
+        """
+        start = started
+        for stage, seconds in zip(self.stages, self._stage_seconds):
+            self.profiler.add_span(
+                type(stage).__name__,
+                start,
+                seconds,
+                parent=self.identifier,
+                cumulative=True,
+                **stage.stats,
+            )
+            start += seconds
+        self._stage_seconds = None
+
+    def _process(
+        self, zf: zipfile.ZipFile, context: TaskContext, attributes: dict
+    ) -> zipfile.ZipFile:
+        for stage in self.stages:
+            stage.stats = Counter()
+            stage.begin(context)
+        signature = self._cache_signature() if self.cache else None
+        if self.profiler is not None:
+            self._stage_seconds = [0.0] * len(self.stages)
+        counts = Counter()
+
+        buffer = ArchiveBuffer(self.spool_threshold)
+        zip_dest = zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED)
+        changed = False
+        for info in zf.infolist():
+            content = zf.read(info)
+            counts["members_in"] += 1
+            counts["bytes_in"] += info.file_size
+            if signature is None:
+                member = self._transform_member(info.filename, content)
+            else:
+                key = self.cache.key(signature, info.filename, content)
+                entry = self.cache.get(key)
+                if entry is None:
+                    member = self._transform_member(info.filename, content)
+                    self.cache.put(key, info.filename, content, member)
+                elif entry.unchanged:
+                    member = (info.filename, content)
+                else:
+                    member = entry.member
 
-            zip_dest.writestr(new_name, content)
+            if member is None:
+                changed = True
+                counts["members_dropped"] += 1
+                continue
 
+            name, new_content = member
+            counts["members_out"] += 1
+            counts["bytes_out"] += len(new_content)
+            if name != info.filename:
+                changed = True
+            if new_content is content or new_content == content:
+                # Unchanged content keeps its compressed bytes, even if renamed
+                if _copy_member_raw(zf, zip_dest, info, name):
+                    counts["members_copied_raw"] += 1
+                    continue
+            else:
+                changed = True
+                counts["members_rewritten"] += 1
+            zip_dest.writestr(member_info(name, new_content), new_content)
+
+        if signature is not None:
+            self.cache.save()
+            context.logger.info(self.cache.report())
+            counts["cache_hits"] = self.cache.hits
+            counts["cache_misses"] = self.cache.misses
+        attributes.update(counts)
+
+        if not changed:
+            zip_dest.close()
+            buffer.close()
+            return zf
+        _release_archive(zf)
         return zip_dest
 
 
-def _strip_custom_index_from_package_xml(content: bytes) -> bytes:
-    """Remove any <types>…<name>CustomIndex</name>…</types> block from package.xml."""
-    text = content.decode("utf-8")
-    # Remove the entire <types> block that contains <name>CustomIndex</name>
-    text = re.sub(
-        r"<types>\s*(?:<members>[^<]*</members>\s*)*<name>CustomIndex</name>\s*</types>\s*",
-        "",
-        text,
-        flags=re.DOTALL,
-    )
-    return text.encode("utf-8")
+def _fuse_member_transforms(transforms: List[SourceTransform]) -> List[SourceTransform]:
+    """Collapse each run of adjacent MemberTransforms into one pipeline.
+
+    Other transforms keep their position, so the overall order of operations
+    is unchanged.
+    """
+    fused = []
+    run = []
+    for transform in transforms:
+        if isinstance(transform, MemberTransform):
+            run.append(transform)
+            continue
+        if run:
+            fused.append(StreamingTransformPipeline(run))
+            run = []
+        fused.append(transform)
+    if run:
+        fused.append(StreamingTransformPipeline(run))
+    return fused
+
+
+# Leading bytes of a member that may parse as XML: whitespace, a UTF-8 BOM.
+_XML_LEADING = b" \t\r\n\xef\xbb\xbf"
+_XPATH_PREDICATE = re.compile(r"\[.*?\]")
+
 
+def _local_name_xpath(expression: str) -> str:
+    """An xpath that matches each step by local name, so it selects elements
+    in the metadata namespace as the stock find_replace transform does."""
+    steps = []
+    for part in expression.split("/"):
+        if part:
+            tag = _XPATH_PREDICATE.sub("", part)
+            steps.append(f'/*[local-name()="{tag}"]' + "".join(_XPATH_PREDICATE.findall(part)))
+    return "".join(steps)
 
-class StripCustomIndexTransform:
+
+class FindReplaceWithFilename(MemberTransform, FindReplaceTransform):
+    """Extends the standard find_replace transform to also handle filenames.
+
+    Members no pattern can change are passed through untouched.  XML members
+    a pattern can change (and any XML an xpath pattern applies to) go through
+    the stock transform, which replaces element text only; other text
+    members get the compiled byte replacement, which is what the stock
+    transform does to text that isn't XML.
+    """
+
+    def begin(self, context: TaskContext) -> None:
+        # Resolve every replacement once per deploy (some specs run a query or
+        # read the environment) rather than once per pattern per file.
+        patterns = self.options.patterns
+        self._replacements = [spec.get_replace_string(context) for spec in patterns]
+        self._has_paths = any(spec.paths for spec in patterns)
+        # Content matchers are keyed by which patterns apply to a member's path
+        self._content_matchers = {}
+        self._name_matcher = CompiledReplacements(
+            [(spec.find, replace) for spec, replace in zip(patterns, self._replacements) if spec.find]
+        )
+
+    def cache_key(self) -> str:
+        return json.dumps(
+            [
+                [spec.find, spec.xpath, replace, [str(path) for path in spec.paths or []]]
+                for spec, replace in zip(self.options.patterns, self._replacements)
+            ]
+        )
+
+    def _content_matcher(self, name: str) -> Tuple[CompiledReplacements, bool]:
+        """The matcher for the find patterns that apply to a member, and
+        whether any xpath pattern does."""
+        patterns = self.options.patterns
+        if self._has_paths:
+            parents = Path(name).parents
+            key = tuple(
+                index
+                for index, spec in enumerate(patterns)
+                if not spec.paths or any(parent in parents for parent in spec.paths)
+            )
+        else:
+            key = tuple(range(len(patterns)))
+        matcher = self._content_matchers.get(key)
+        if matcher is None:
+            matcher = self._content_matchers[key] = (
+                CompiledReplacements(
+                    [(patterns[i].find, self._replacements[i]) for i in key if patterns[i].find]
+                ),
+                any(patterns[i].xpath and not patterns[i].find for i in key),
+            )
+        return matcher
+
+    def _replace_in_xml(self, name: str, content: bytes) -> Tuple[bytes, int]:
+        """The stock transform's output for one member, and how many
+        replacements it made.
+
+        As the stock transform does, each pattern that applies to the member
+        replaces element text only (an xpath pattern, the text of the elements
+        it selects) and the tree is serialized again; content that doesn't
+        parse gets a plain text replacement.
+        """
+        text = content.decode("utf-8")
+        parents = Path(name).parents
+        count = 0
+        for spec, replace in zip(self.options.patterns, self._replacements):
+            if spec.paths and not any(parent in parents for parent in spec.paths):
+                continue
+            try:
+                root = etree.fromstring(text.encode("utf-8"))
+            except etree.XMLSyntaxError:
+                if spec.find:
+                    count += text.count(spec.find)
+                    text = text.replace(spec.find, replace)
+                continue
+            has_xml_declaration = text.strip().startswith("<?xml")
+            if spec.find:
+                for element in root.iter():
+                    if element.text and spec.find in element.text:
+                        count += element.text.count(spec.find)
+                        element.text = element.text.replace(spec.find, replace)
+            elif spec.xpath:
+                try:
+                    elements = root.xpath(_local_name_xpath(spec.xpath))
+                except etree.XPathError as e:
+                    raise etree.XPathError(
+                        f"An exception of type {type(e).__name__} occurred: {e} \nKindly check the xpath given"
+                    )
+                for element in elements:
+                    element.text = replace
+                count += len(elements)
+            text = etree.tostring(root, encoding="utf-8", xml_declaration=has_xml_declaration).decode("utf-8")
+        return text.encode("utf-8"), count
+
+    def transform_member(self, name: str, content: bytes) -> Tuple[str, bytes]:
+        # First do the normal find_replace on file contents (text files only)
+        matcher, xpath = self._content_matcher(name)
+        if (xpath or matcher.matches_bytes(content)) and not is_binary(name, content):
+            try:
+                content.decode("utf-8")
+            except UnicodeDecodeError:
+                # Probably a binary file; don't change it
+                pass
+            else:
+                if content.lstrip(_XML_LEADING).startswith(b"<"):
+                    new_content, replacements = self._replace_in_xml(name, content)
+                else:
+                    new_content, replacements = matcher.replace_bytes(content), matcher.count_bytes(content)
+                if new_content != content:
+                    self.stats["members_rewritten"] += 1
+                    self.stats["replacements"] += replacements
+                    content = new_content
+
+        # Then handle filenames
+        new_name = self._name_matcher.replace_text(name)
+        if new_name is not name:
+            self.stats["members_renamed"] += 1
+        return new_name, content
+
+
+class StripCustomIndexTransform(MemberTransform):
     """Strips auto-generated CustomIndex entries from the MDAPI package ZIP.
 
     sfdx force:source:convert (v7.x) generates CustomIndex components from
@@ -53,37 +506,712 @@ class StripCustomIndexTransform:
     API-name rename (e.g. Request__c → WorkRequest__c).  CustomIndex records
     are managed automatically by Salesforce and do not need to be explicitly
     deployed, so stripping them is safe and avoids spurious deploy errors.
+
+    Our own converter (tasks/source_convert.py) never emits them; this is
+    for trees converted by sfdx and MDAPI-format trees.
     """
 
-    def process(self, zf: zipfile.ZipFile, context) -> zipfile.ZipFile:
-        names = zf.namelist()
-        has_custom_index = any("customindex" in n.lower() for n in names)
-        if not has_custom_index:
-            return zf
+    identifier = "strip_custom_index"
+
+    def cache_key(self) -> str:
+        return self.identifier
+
+    def transform_member(
+        self, name: str, content: bytes
+    ) -> Optional[Tuple[str, bytes]]:
+        if "customindex" in name.lower():
+            self.stats["members_dropped"] += 1
+            return None  # drop the CustomIndex file
+        if name.lower().endswith("package.xml") and b"CustomIndex" in content:
+            package = PackageXml.parse(content)
+            if "CustomIndex" in package:
+                self.stats["custom_index_entries_removed"] += len(package.members("CustomIndex"))
+                package.remove_type("CustomIndex")
+                content = package.tobytes()
+        return name, content
 
-        zip_dest = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
-        for name in names:
-            if "customindex" in name.lower():
-                continue  # drop the CustomIndex file
-            content = zf.read(name)
-            if name.lower().endswith("package.xml"):
-                content = _strip_custom_index_from_package_xml(content)
-            zip_dest.writestr(name, content)
-        return zip_dest
+
+def _normal_info(info: zipfile.ZipInfo) -> bool:
+    return (
+        info.date_time == ARCHIVE_DATE_TIME
+        and info.create_system == 3
+        and (info.is_dir() or info.external_attr == ARCHIVE_FILE_ATTR)
+    )
+
+
+def _deterministic_archive(zf: zipfile.ZipFile) -> zipfile.ZipFile:
+    """An archive being written, with its members sorted by name and given the
+    fixed timestamp and permissions of member_content.member_info().
+
+    Members are copied with their compressed bytes, so the same content gives
+    the same archive as long as it was compressed the same way, which our
+    writers and the package builder always do.  An archive that is already in
+    order is returned as is.
+    """
+    infos = zf.infolist()
+    names = [info.filename for info in infos]
+    if names == sorted(names) and all(_normal_info(info) for info in infos):
+        return zf
+    dest = zipfile.ZipFile(ArchiveBuffer(), "w", zipfile.ZIP_DEFLATED)
+    for info in sorted(infos, key=lambda info: info.filename):
+        normal = copy.copy(info)
+        normal.date_time = ARCHIVE_DATE_TIME
+        normal.create_system = 3
+        if not info.is_dir():
+            normal.external_attr = ARCHIVE_FILE_ATTR
+        if not _copy_member_raw(zf, dest, normal):
+            dest.writestr(normal, zf.read(info))
+    _release_archive(zf)
+    return dest
+
+
+def _archive_base64(zf: zipfile.ZipFile) -> str:
+    """Finish an archive being written and return it base64-encoded for the
+    Metadata API, made deterministic (see _deterministic_archive)."""
+    zf = _deterministic_archive(zf)
+    fp = zf.fp
+    zf.close()
+    return base64.b64encode(fp.getvalue()).decode("utf-8")
+
+
+def _archive_counts(zf: zipfile.ZipFile, suffix: str) -> dict:
+    infos = zf.infolist()
+    return {
+        f"members_{suffix}": len(infos),
+        f"bytes_{suffix}": sum(info.file_size for info in infos),
+    }
+
+
+class ProfiledTransform(SourceTransform):
+    """Wraps a transform to record a profile span, with member counts and sizes, for it."""
+
+    options_model = None
+
+    def __init__(self, transform: SourceTransform, profiler: DeployProfiler):
+        self.transform = transform
+        self.profiler = profiler
+
+    def process(self, zf: zipfile.ZipFile, context: TaskContext) -> zipfile.ZipFile:
+        with self.profiler.span(type(self.transform).__name__) as attributes:
+            attributes.update(_archive_counts(zf, "in"))
+            result = self.transform.process(zf, context)
+            attributes.update(_archive_counts(result, "out"))
+            return result
+
+
+class DeployApi(ApiDeploy):
+    """ApiDeploy that polls adaptively and reports its progress.
+
+    Instead of the stock fixed schedule, the wait between status checks
+    comes from an AdaptivePoller (see tasks/deploy_polling.py), set up with
+    the task's ``poll_intervals``.  Each status check that shows progress is
+    logged and passed to the task's ``progress_listeners``.  The upload and
+    each status check are also reported to the task's profiler.
+    """
+
+    def __init__(self, task, *args, **kwargs):
+        super().__init__(task, *args, **kwargs)
+        self.poller = AdaptivePoller(*getattr(task, "poll_intervals", ()))
+        self.progress: Optional[DeployProgress] = None
+        self._next_check = self.poller.min_interval
+
+    def __call__(self):
+        with profile_span(
+            getattr(self.task, "profiler", None), "deploy", payload_bytes=len(self.package_zip)
+        ):
+            return super().__call__()
+
+    def _call_mdapi(self, headers, envelope, refresh=None):
+        name = "upload" if headers.get("SOAPAction") == self.soap_action_start else "check_status"
+        with profile_span(
+            getattr(self.task, "profiler", None), name, request_bytes=len(envelope)
+        ):
+            return super()._call_mdapi(headers, envelope, refresh)
+
+    def _get_check_interval(self):
+        return self._next_check
+
+    def _process_response_status(self, response):
+        if response.status_code == http.client.OK:
+            progress = DeployProgress.from_response(
+                parseString(response.content), getattr(self.task.org_config, "name", None)
+            )
+            # Decide the next wait before the stock handling logs it
+            self._next_check = self.poller.next_interval(progress)
+            if self.progress is None or progress.counts() != self.progress.counts():
+                if progress.components_total:
+                    self.task.logger.info(f"Deploy progress: {progress.describe()}")
+                for listener in getattr(self.task, "progress_listeners", ()):
+                    listener(progress)
+            self.progress = progress
+        return super()._process_response_status(response)
 
 
 class Deploy(BaseDeployTask):
     """Deploy task that extends find_replace to handle filenames and strips
-    auto-generated CustomIndex entries with stale object names."""
+    auto-generated CustomIndex entries with stale object names.
+
+    Source-format trees are converted to Metadata API format by sfdx, as
+    in the base task.  With source_convert: python they are converted in
+    process instead, batches of files at a time across worker processes,
+    straight into the package zip (see tasks/source_convert.py); trees with
+    metadata it doesn't convert still go through sfdx.
+
+    Our own transforms run together in one streaming pass over the package
+    rather than each rebuilding the whole zip, optionally backed by an
+    on-disk cache of already-transformed members.
+
+    Package archives are deterministic: members sorted by name, with fixed
+    timestamps, so the same content always gives the same bytes.  With
+    skip_unchanged: True, a package whose fingerprint (its bytes, the org and
+    the test settings) matches the last successful deploy to the org isn't
+    deployed again.
+
+    With incremental: True, only components that changed since the last
+    successful deploy to the org are sent (see tasks/deploy_manifest.py).
+
+    Deploy status is polled adaptively: quickly around state changes and
+    as the deploy nears completion, backing off while it shows no progress
+    (see tasks/deploy_polling.py).  Callers can follow progress with
+    add_progress_listener().
+
+    With chunked: True, the package is split into dependency-ordered chunks
+    (schema, then Apex, then components, UI and access), each with its own
+    package.xml, see tasks/deploy_chunks.py.  Chunks in the same tier deploy
+    in parallel and a failed chunk is retried on its own.  Tests run once,
+    with the last chunk, which is deployed on its own after all the others;
+    the other chunks deploy with the org's default test level (in
+    production, that still runs local tests for chunks with Apex).
+
+    With profile: True, a timing span for each stage (packaging, each
+    transform, the upload, status checks) and what it processed is written
+    to a JSON profile that doubles as a Chrome trace (see
+    tasks/deploy_profile.py)."""
+
+    api_class = DeployApi
+
+    task_options = {
+        **BaseDeployTask.task_options,
+        "transform_cache": {
+            "description": "If True, cache transformed package members on disk (under .cci/) "
+            "so repeat deploys of a mostly unchanged tree skip the transform work.  "
+            "Defaults to False."
+        },
+        "transform_cache_size": {
+            "description": "Maximum size of the transform cache in MB.  Least recently "
+            "used entries are evicted beyond this.  Defaults to 256."
+        },
+        "incremental": {
+            "description": "If True, deploy only the components whose transformed content changed "
+            "since the last successful deploy to this org, using a manifest kept under "
+            ".cci/deploy_manifests.  Delete the org's manifest to force a full deploy.  "
+            "Defaults to False."
+        },
+        "skip_unchanged": {
+            "description": "If True, skip the deploy when the package, org and test settings are "
+            "exactly those of the last successful deploy to this org, as fingerprinted under "
+            ".cci/deploy_fingerprints.  Delete the org's fingerprint to force a deploy.  "
+            "Defaults to False."
+        },
+        "archive_spool_size": {
+            "description": "Size in MB beyond which the package zips built by our transforms "
+            "are moved from memory to a temporary file.  Defaults to 16."
+        },
+        "profile": {
+            "description": "If True, write a JSON profile of the deploy's stages (timings, member "
+            "counts, bytes in and out, replacements made) to .cci/deploy_profiles/.  "
+            "Defaults to False."
+        },
+        "profile_path": {
+            "description": "Where to write the profile instead of .cci/deploy_profiles/."
+        },
+        "profile_cprofile": {
+            "description": "If True, also dump cProfile stats for the whole task next to the "
+            "profile (same name, .prof extension).  Implies profile.  Defaults to False."
+        },
+        "chunked": {
+            "description": "If True, split the package into dependency-ordered chunks and deploy "
+            "them separately, in parallel where safe, retrying only chunks that fail.  "
+            "test_level applies to the last chunk only.  Defaults to False."
+        },
+        "chunk_max_files": {
+            "description": "Most files in one chunk of a type that can be split (static resources, "
+            f"custom metadata records, email templates).  Defaults to {DEFAULT_CHUNK_MAX_FILES}."
+        },
+        "chunk_max_size": {
+            "description": "Most zipped MB in one chunk of a type that can be split.  "
+            f"Defaults to {DEFAULT_CHUNK_MAX_BYTES // 1024 // 1024}."
+        },
+        "chunk_retries": {
+            "description": "How many times to retry a chunk that fails.  Defaults to 1."
+        },
+        "chunk_workers": {
+            "description": "Most chunks to deploy at the same time.  Defaults to 4."
+        },
+        "poll_min_interval": {
+            "description": "Shortest wait in seconds between deploy status checks, used around "
+            "state changes and as the deploy nears completion.  Defaults to 1."
+        },
+        "poll_max_interval": {
+            "description": "Longest wait in seconds between deploy status checks while a deploy "
+            "(e.g. a long test run) shows no progress.  Defaults to 30."
+        },
+        "source_convert": {
+            "description": "How to convert a source-format tree to Metadata API format: python "
+            "(in process, falling back to sfdx for metadata it doesn't convert) or sfdx.  "
+            "Defaults to sfdx."
+        },
+        "convert_workers": {
+            "description": "Most processes converting source at the same time.  Defaults to the "
+            "number of CPUs."
+        },
+    }
 
     def _init_options(self, kwargs):
         super()._init_options(kwargs)
 
         # Replace any find_replace transforms with our filename-aware version
-        for i, transform in enumerate(self.transforms):
-            if isinstance(transform, FindReplaceTransform):
-                self.transforms[i] = FindReplaceWithFilename(transform.options)
+        transforms = [
+            FindReplaceWithFilename(transform.options)
+            if isinstance(transform, FindReplaceTransform)
+            else transform
+            for transform in self.transforms
+        ]
 
         # Append CustomIndex stripping as the final transform so it runs after
         # all find_replace processing is complete
-        self.transforms.append(StripCustomIndexTransform())
+        transforms.append(StripCustomIndexTransform())
+
+        self.transforms = _fuse_member_transforms(transforms)
+
+        cache = self._init_transform_cache()
+        self.spool_threshold = self._init_spool_threshold()
+        for transform in self.transforms:
+            if isinstance(transform, StreamingTransformPipeline):
+                transform.cache = cache
+                transform.spool_threshold = self.spool_threshold
+
+        self._init_source_convert()
+
+        self.incremental = process_bool_arg(self.options.get("incremental", False))
+        self._deployed_hashes = None
+
+        self.skip_unchanged = process_bool_arg(self.options.get("skip_unchanged", False))
+        self._package_fingerprint = None
+
+        self.chunked = process_bool_arg(self.options.get("chunked", False))
+        self._init_chunking()
+
+        self.poll_intervals = self._init_poll_intervals()
+        self.progress_listeners: List[ProgressListener] = []
+
+        self.cprofile = process_bool_arg(self.options.get("profile_cprofile", False))
+        self.profiler = None
+        if self.cprofile or process_bool_arg(self.options.get("profile", False)):
+            self.profiler = DeployProfiler()
+            self.transforms = [
+                transform
+                if isinstance(transform, StreamingTransformPipeline)
+                else ProfiledTransform(transform, self.profiler)
+                for transform in self.transforms
+            ]
+            for transform in self.transforms:
+                if isinstance(transform, StreamingTransformPipeline):
+                    transform.profiler = self.profiler
+
+    def _init_transform_cache(self) -> Optional[TransformCache]:
+        if not process_bool_arg(self.options.get("transform_cache", False)):
+            return None
+        try:
+            size_mb = float(self.options.get("transform_cache_size", 256))
+        except ValueError:
+            raise TaskOptionsError("The transform_cache_size option must be a number of MB.")
+        return TransformCache(
+            Path(self.project_config.cache_dir, "deploy_transform_cache"),
+            int(size_mb * 1024 * 1024),
+        )
+
+    def _init_spool_threshold(self) -> int:
+        try:
+            size_mb = float(self.options.get("archive_spool_size", 16))
+        except ValueError:
+            raise TaskOptionsError("The archive_spool_size option must be a number of MB.")
+        return int(size_mb * 1024 * 1024)
+
+    def _init_source_convert(self) -> None:
+        self.source_convert = str(self.options.get("source_convert", "sfdx")).lower()
+        if self.source_convert not in ("python", "sfdx"):
+            raise TaskOptionsError("The source_convert option must be python or sfdx.")
+        try:
+            self.convert_workers = int(self.options.get("convert_workers", os.cpu_count() or 1))
+        except ValueError:
+            raise TaskOptionsError("The convert_workers option must be a number.")
+        if self.convert_workers < 1:
+            raise TaskOptionsError("The convert_workers option must be positive.")
+
+    def _init_chunking(self) -> None:
+        try:
+            self.chunk_max_files = int(self.options.get("chunk_max_files", DEFAULT_CHUNK_MAX_FILES))
+            self.chunk_max_bytes = int(
+                float(self.options.get("chunk_max_size", DEFAULT_CHUNK_MAX_BYTES / 1024 / 1024))
+                * 1024
+                * 1024
+            )
+            self.chunk_retries = int(self.options.get("chunk_retries", 1))
+            self.chunk_workers = int(self.options.get("chunk_workers", 4))
+        except ValueError:
+            raise TaskOptionsError(
+                "The chunk_max_files, chunk_max_size, chunk_retries and chunk_workers options must be numbers."
+            )
+        if min(self.chunk_max_files, self.chunk_max_bytes, self.chunk_workers) < 1 or self.chunk_retries < 0:
+            raise TaskOptionsError("The chunk options must be positive.")
+
+    def _init_poll_intervals(self) -> Tuple[float, float]:
+        try:
+            min_interval = float(self.options.get("poll_min_interval", 1))
+            max_interval = float(self.options.get("poll_max_interval", 30))
+        except ValueError:
+            raise TaskOptionsError("The poll_min_interval and poll_max_interval options must be numbers of seconds.")
+        if not 0 < min_interval <= max_interval:
+            raise TaskOptionsError("poll_min_interval must be positive and at most poll_max_interval.")
+        return min_interval, max_interval
+
+    def add_progress_listener(self, listener: ProgressListener) -> None:
+        """Call listener with a DeployProgress whenever a status check shows progress."""
+        self.progress_listeners.append(listener)
+
+    def _get_manifest(self) -> DeployManifest:
+        org_key = self.org_config.org_id or self.org_config.username
+        return DeployManifest(
+            Path(self.project_config.cache_dir, "deploy_manifests", f"{org_key}.json")
+        )
+
+    def _get_fingerprint(self, org_config=None) -> DeployFingerprint:
+        org_config = org_config or self.org_config
+        org_key = org_config.org_id or org_config.username
+        return DeployFingerprint(
+            Path(self.project_config.cache_dir, "deploy_fingerprints", f"{org_key}.json")
+        )
+
+    def _fingerprint(self, package_zip: str, org_config=None) -> str:
+        org_config = org_config or self.org_config
+        return package_fingerprint(
+            package_zip,
+            {
+                "org": org_config.org_id or org_config.username,
+                "api_version": self.project_config.project__package__api_version,
+                "test_level": self.test_level,
+                "run_tests": self.specified_tests,
+            },
+        )
+
+    def _start_deploy(self, package_zip: str) -> bool:
+        """Check a package against the org's fingerprint before deploying it.
+
+        Returns False when skip_unchanged is set and the org already has this
+        package.  Otherwise the fingerprint is cleared, since the org may be
+        left in between, and the package's is kept in _package_fingerprint to
+        record once the deploy succeeds.  Validations leave it alone.
+        """
+        self._package_fingerprint = None
+        if self.check_only:
+            return True
+        fingerprint = self._fingerprint(package_zip)
+        record = self._get_fingerprint()
+        if self.skip_unchanged and record.fingerprint == fingerprint:
+            self.logger.info(
+                "The org already has this package from its last successful deploy; skipping deployment."
+            )
+            return False
+        record.clear()
+        self._package_fingerprint = fingerprint
+        return True
+
+    def _package_options(self) -> dict:
+        """Package builder options, as the base task's _get_package_zip sets them."""
+        namespace = self.options["namespace_inject"]
+        return {
+            **self.options,
+            "clean_meta_xml": process_bool_arg(self.options.get("clean_meta_xml", True)),
+            "namespace_inject": namespace,
+            "unmanaged": not self._has_namespaced_package(namespace),
+            "namespaced_org": self._is_namespaced_org(namespace),
+        }
+
+    def _source_api_version(self) -> str:
+        """The package.xml version sfdx would convert with: sfdx-project.json's
+        sourceApiVersion, else the project's API version."""
+        try:
+            with open(Path(self.project_config.repo_root or ".", "sfdx-project.json"), encoding="utf-8") as f:
+                version = json.load(f).get("sourceApiVersion")
+        except (OSError, ValueError):
+            version = None
+        return version or self.project_config.project__package__api_version
+
+    def _build_package_zip(self, path) -> Optional[str]:
+        """The base task's package build, as a deterministic archive, converting
+        source format in process where it can (see _convert_source)."""
+        assert path, f"Path should be specified for {self.__class__.__name__}"
+        if not Path(path).exists():
+            self.logger.warning(f"{path} not found.")
+            return None
+        context = TaskContext(self.org_config, self.project_config, self.logger)
+        zf = self._convert_source(Path(path))
+        if zf is not None:
+            package_zip = MetadataPackageZipBuilder.from_zipfile(
+                zf, context, options=self._package_options(), transforms=self.transforms
+            )
+        else:
+            with convert_sfdx_source(path, None, self.logger) as src_path:
+                package_zip = MetadataPackageZipBuilder(
+                    path=src_path, context=context, options=self._package_options(), transforms=self.transforms
+                )
+        if not package_zip.zf.namelist():
+            return None
+        return _archive_base64(package_zip.zf)
+
+    def _convert_source(self, source: Path) -> Optional[zipfile.ZipFile]:
+        """A source-format tree converted in process, as a zip for the package
+        builder; None for trees that are left to the base task and sfdx.
+
+        The converted files are merged into one zip as the workers finish
+        them, without recompressing, rather than written out for the package
+        builder to read.
+        """
+        if (
+            self.source_convert == "sfdx"
+            or not source.is_dir()
+            or not os.listdir(source)
+            or get_source_format_for_path(source) is not SourceFormat.SFDX
+        ):
+            return None
+        ignore = read_forceignore(Path(self.project_config.repo_root or ".", ".forceignore"))
+        try:
+            with profile_span(self.profiler, "plan_conversion") as attributes:
+                plan = plan_conversion(source, self._source_api_version(), ignore)
+                attributes["files"] = plan.files
+        except UnsupportedSource as e:
+            self.logger.info(f"Converting from SFDX to MDAPI format with sfdx: {e}.")
+            return None
+        for name in plan.duplicates:
+            self.logger.warning(f"More than one source file converts to {name}; using the last by path.")
+
+        self.logger.info(f"Converting from SFDX to MDAPI format ({plan.files} files).")
+        zf = zipfile.ZipFile(ArchiveBuffer(self.spool_threshold), "w", zipfile.ZIP_DEFLATED)
+        with profile_span(self.profiler, "convert_source") as attributes:
+            for fragment in convert_source(plan, self.convert_workers):
+                with zipfile.ZipFile(io.BytesIO(fragment)) as part:
+                    for info in part.infolist():
+                        if not _copy_member_raw(part, zf, info):
+                            zf.writestr(info, part.read(info))
+            package = plan.package.tobytes()
+            zf.writestr(member_info("package.xml", package), package)
+            attributes["batches"] = len(plan.batches)
+            attributes["workers"] = min(self.convert_workers, len(plan.batches))
+        return zf
+
+    def _get_package_zip(self, path) -> Optional[str]:
+        with profile_span(self.profiler, "build_package") as attributes:
+            package_zip = self._build_package_zip(path)
+            attributes["payload_bytes"] = len(package_zip or "")
+        if package_zip is None or not self.incremental:
+            return package_zip
+
+        with profile_span(self.profiler, "incremental_filter") as attributes:
+            package_zip = self._filter_incremental(package_zip, attributes)
+            attributes["payload_bytes"] = len(package_zip or "")
+        return package_zip
+
+    def _get_api(self, path=None):
+        """The base task's deploy call, or None if the package is empty or
+        the org already has it (see _start_deploy)."""
+        package_zip = self._get_package_zip(path or self.options.get("path"))
+        if package_zip is None:
+            self.logger.warning("Deployment package is empty; skipping deployment.")
+            return None
+        if not self._start_deploy(package_zip):
+            return None
+        self.logger.info(f"Payload size: {len(package_zip)} bytes")
+        return self.api_class(
+            self,
+            package_zip,
+            purge_on_delete=False,
+            check_only=self.check_only,
+            test_level=self.test_level,
+            run_tests=self.specified_tests,
+        )
+
+    def _filter_incremental(self, package_zip: str, attributes: dict) -> Optional[str]:
+        zf = zipfile.ZipFile(io.BytesIO(base64.b64decode(package_zip)))
+        hashes = component_hashes(zf)
+        self._deployed_hashes = hashes
+
+        unknown = unknown_directories(zf)
+        if unknown:
+            self.logger.warning(
+                "Deploying the full package because it contains metadata directories "
+                f"that incremental deploys don't know about: {', '.join(sorted(unknown))}"
+            )
+            return package_zip
+
+        changed = self._get_manifest().changed(hashes)
+        attributes["components"] = len(hashes)
+        attributes["components_changed"] = len(changed)
+        if not changed:
+            self.logger.info("No components changed since the last deploy to this org.")
+            return None
+        if len(changed) == len(hashes):
+            return package_zip
+
+        self.logger.info(
+            f"Incremental deploy: {len(changed)} of {len(hashes)} components changed."
+        )
+        return _archive_base64(filter_package(zf, changed))
+
+    def _run_task(self):
+        if self.profiler is None:
+            return self._deploy()
+
+        profile = cProfile.Profile() if self.cprofile else None
+        try:
+            with self.profiler.span("deploy_task"):
+                if profile is not None:
+                    profile.enable()
+                try:
+                    return self._deploy()
+                finally:
+                    if profile is not None:
+                        profile.disable()
+        finally:
+            self._write_profile(profile)
+
+    def _deploy(self):
+        if self.chunked:
+            return self._deploy_chunked()
+        result = super()._run_task()
+        # A failed deploy raises, so reaching here means the org has this package
+        if self._deployed_hashes and not self.check_only:
+            self._get_manifest().record(self._deployed_hashes)
+        if self._package_fingerprint:
+            self._get_fingerprint().record(self._package_fingerprint)
+        return result
+
+    def _deploy_chunked(self):
+        package_zip = self._get_package_zip(self.options.get("path"))
+        if package_zip is None:
+            self.logger.warning("Deployment package is empty; skipping deployment.")
+            return
+        if not self._start_deploy(package_zip):
+            return
+        zf = zipfile.ZipFile(io.BytesIO(base64.b64decode(package_zip)))
+        del package_zip
+        tiers = plan_chunks(zf, self.chunk_max_files, self.chunk_max_bytes)
+        if self.test_level and len(tiers[-1]) > 1:
+            # Tests run with the last chunk, so everything else has to be in the org by then
+            tiers[-1:] = [tiers[-1][:-1], tiers[-1][-1:]]
+        last = tiers[-1][-1]
+        self.logger.info(
+            f"Deploying in {sum(len(tier) for tier in tiers)} chunks: "
+            + " -> ".join(
+                ", ".join(f"{chunk.name} ({chunk.files} files)" for chunk in tier) for tier in tiers
+            )
+        )
+
+        results = {}
+        undeployed = {key for tier in tiers for chunk in tier for key in chunk.keys}
+        try:
+            for number, tier in enumerate(tiers, 1):
+                # Chunk zips are built here, one tier at a time, and deployed on the pool
+                payloads = [
+                    (chunk, _archive_base64(filter_package(zf, chunk.keys))) for chunk in tier
+                ]
+                errors = []
+                with ThreadPoolExecutor(
+                    max_workers=min(self.chunk_workers, len(tier)), thread_name_prefix="chunk"
+                ) as pool:
+                    futures = [
+                        pool.submit(self._deploy_chunk, chunk, payload, chunk is last)
+                        for chunk, payload in payloads
+                    ]
+                    for (chunk, _), future in zip(payloads, futures):
+                        try:
+                            results[chunk.name] = future.result()
+                            undeployed -= chunk.keys
+                        except Exception as e:
+                            results[chunk.name] = "Failed"
+                            errors.append((chunk, e))
+                if errors:
+                    skipped = [chunk.name for later in tiers[number:] for chunk in later]
+                    if skipped:
+                        self.logger.error(f"Not deploying chunks that depend on failed ones: {', '.join(skipped)}")
+                    if len(errors) == 1:
+                        raise errors[0][1]
+                    raise CumulusCIException(
+                        "Deploy failed in chunks "
+                        + "; ".join(f"{chunk.name}: {e}" for chunk, e in errors)
+                    )
+        finally:
+            self.org_config.reset_installed_packages()
+            # Components in chunks that did deploy are in the org even if others failed
+            deployed_any = any(status != "Failed" for status in results.values())
+            if self._deployed_hashes and not self.check_only and deployed_any:
+                self._get_manifest().record(
+                    {key: value for key, value in self._deployed_hashes.items() if key not in undeployed}
+                )
+        if self._package_fingerprint:
+            self._get_fingerprint().record(self._package_fingerprint)
+        self.return_values = results
+        return results
+
+    def _deploy_chunk(self, chunk: DeployChunk, package_zip: str, run_tests: bool):
+        task = PrefixedTask(self, chunk.name)
+        for attempt in range(1, self.chunk_retries + 2):
+            with profile_span(
+                self.profiler, "chunk", chunk=chunk.name, tier=chunk.tier, files=chunk.files, attempt=attempt
+            ):
+                try:
+                    return self.api_class(
+                        task,
+                        package_zip,
+                        purge_on_delete=False,
+                        check_only=self.check_only,
+                        test_level=self.test_level if run_tests else None,
+                        run_tests=self.specified_tests if run_tests else None,
+                    )()
+                except Exception as e:
+                    if attempt > self.chunk_retries:
+                        raise
+                    task.logger.warning(f"Chunk failed, retrying ({attempt} of {self.chunk_retries}): {e}")
+
+    def _write_profile(self, profile: Optional[cProfile.Profile]) -> None:
+        path = self.options.get("profile_path")
+        if path:
+            path = Path(path)
+        else:
+            org_key = self.org_config.org_id or self.org_config.username
+            stamp = self.profiler.started_at.strftime("%Y%m%dT%H%M%SZ")
+            path = Path(self.project_config.cache_dir, "deploy_profiles", f"{stamp}-{org_key}.json")
+
+        # Time not covered by a child span: source conversion and zipping,
+        # and waiting between status checks.
+        totals = self.profiler.totals()
+        transforms = sum(
+            span["duration"] or 0.0
+            for span in self.profiler.spans
+            if span["parent"] == "build_package"
+        )
+        self.profiler.write(
+            path,
+            task=self.name,
+            org=self.org_config.name,
+            summary={
+                "source_conversion_and_packaging": totals.get("build_package", 0.0) - transforms,
+                "waiting_for_deploy": totals.get("deploy", 0.0)
+                - totals.get("upload", 0.0)
+                - totals.get("check_status", 0.0),
+            },
+        )
+        self.logger.info(f"Deploy profile written to {path}")
+        if profile is not None:
+            profile.dump_stats(str(path.with_suffix(".prof")))
+            self.logger.info(f"cProfile stats written to {path.with_suffix('.prof')}")
@@ -0,0 +1,157 @@
+import zipfile
+from collections import defaultdict
+from typing import Dict, FrozenSet, List, NamedTuple, Tuple
+
+from tasks.deploy_manifest import component_for_path
+
+# Metadata API limits are 10,000 files and 39 MB (zipped) per deploy; chunks
+# stay well inside them by default.
+DEFAULT_CHUNK_MAX_FILES = 5000
+DEFAULT_CHUNK_MAX_BYTES = 20 * 1024 * 1024
+
+
+class ChunkGroup(NamedTuple):
+    """Metadata types that are deployed together.
+
+    Components of a ``splittable`` group don't refer to each other, so an
+    oversized group can be cut into several chunks.
+    """
+
+    name: str
+    types: Tuple[str, ...]
+    splittable: bool = False
+
+
+# Deploy order.  Each tier only depends on earlier tiers, so the groups
+# within a tier deploy in parallel.  Types that reference each other (Apex
+# classes, LWC bundles, layouts and their quick actions...) share a group.
+DEPLOY_TIERS: Tuple[Tuple[ChunkGroup, ...], ...] = (
+    (
+        ChunkGroup(
+            "schema",
+            (
+                "CustomObject",
+                "GlobalValueSet",
+                "CustomLabels",
+                "CustomPermission",
+                "CustomNotificationType",
+                "RemoteSiteSetting",
+                "Settings",
+            ),
+        ),
+        ChunkGroup("static_resources", ("StaticResource",), splittable=True),
+    ),
+    (
+        ChunkGroup("apex", ("ApexClass", "ApexTrigger", "ApexPage", "ApexComponent")),
+        ChunkGroup("custom_metadata", ("CustomMetadata",), splittable=True),
+    ),
+    (
+        ChunkGroup("components", ("LightningComponentBundle", "AuraDefinitionBundle")),
+        ChunkGroup("email", ("EmailTemplate",), splittable=True),
+    ),
+    (
+        ChunkGroup(
+            "ui",
+            (
+                "FlexiPage",
+                "Layout",
+                "QuickAction",
+                "CustomTab",
+                "CustomApplication",
+                "PathAssistant",
+                "Flow",
+                "Workflow",
+                "SharingRules",
+                "ReportType",
+                "CustomObjectTranslation",
+                "ApexTestSuite",
+            ),
+        ),
+    ),
+    (
+        ChunkGroup("permission_sets", ("PermissionSet",)),
+        ChunkGroup("reports", ("Report", "Dashboard")),
+    ),
+    (ChunkGroup("permission_set_groups", ("PermissionSetGroup",)),),
+)
+
+# Types not listed above are deployed last, together.
+OTHER_GROUP = ChunkGroup("other", ())
+
+_GROUPS_BY_TYPE: Dict[str, Tuple[int, ChunkGroup]] = {
+    mdtype: (tier, group)
+    for tier, groups in enumerate(DEPLOY_TIERS)
+    for group in groups
+    for mdtype in group.types
+}
+
+
+class DeployChunk(NamedTuple):
+    name: str
+    tier: int
+    # "Type:member" component keys, as used by deploy_manifest.filter_package
+    keys: FrozenSet[str]
+    files: int
+    bytes: int
+
+
+def plan_chunks(
+    zf: zipfile.ZipFile,
+    max_files: int = DEFAULT_CHUNK_MAX_FILES,
+    max_bytes: int = DEFAULT_CHUNK_MAX_BYTES,
+) -> List[List[DeployChunk]]:
+    """Split a package's components into chunks, as a list of tiers.
+
+    Tiers must be deployed in order; the chunks within a tier can be
+    deployed at the same time.  Only splittable groups are cut to respect
+    ``max_files`` and ``max_bytes`` (compressed); other groups stay whole
+    however large they are.
+    """
+    sizes: Dict[str, List[int]] = defaultdict(lambda: [0, 0])
+    for info in zf.infolist():
+        component = component_for_path(info.filename)
+        if component is not None:
+            size = sizes[":".join(component)]
+            size[0] += 1
+            size[1] += info.compress_size
+
+    other_tier = len(DEPLOY_TIERS)
+    grouped: Dict[Tuple[int, ChunkGroup], List[str]] = defaultdict(list)
+    for key in sorted(sizes):
+        mdtype = key.split(":", 1)[0]
+        grouped[_GROUPS_BY_TYPE.get(mdtype, (other_tier, OTHER_GROUP))].append(key)
+
+    tiers = []
+    for tier, groups in enumerate(DEPLOY_TIERS + ((OTHER_GROUP,),)):
+        chunks = []
+        for group in groups:
+            keys = grouped.get((tier, group))
+            if not keys:
+                continue
+            batches = [[]]
+            files = size = 0
+            for key in keys:
+                key_files, key_bytes = sizes[key]
+                if (
+                    group.splittable
+                    and batches[-1]
+                    and (files + key_files > max_files or size + key_bytes > max_bytes)
+                ):
+                    batches.append([])
+                    files = size = 0
+                batches[-1].append(key)
+                files += key_files
+                size += key_bytes
+            for i, batch in enumerate(batches):
+                chunks.append(
+                    DeployChunk(
+                        f"{group.name}-{i + 1}" if len(batches) > 1 else group.name,
+                        tier,
+                        frozenset(batch),
+                        sum(sizes[key][0] for key in batch),
+                        sum(sizes[key][1] for key in batch),
+                    )
+                )
+        if chunks:
+            tiers.append(chunks)
+    return tiers
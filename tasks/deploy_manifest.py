@@ -0,0 +1,228 @@
+import hashlib
+import io
+import json
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from tasks.package_xml import PackageXml
+from tasks.file_utils import write_atomic
+
+# Metadata API directory -> metadata type, for the types this project deploys.
+METADATA_DIRECTORIES = {
+    "applications": "CustomApplication",
+    "aura": "AuraDefinitionBundle",
+    "classes": "ApexClass",
+    "components": "ApexComponent",
+    "customMetadata": "CustomMetadata",
+    "customPermissions": "CustomPermission",
+    "customindex": "CustomIndex",
+    "dashboards": "Dashboard",
+    "email": "EmailTemplate",
+    "flexipages": "FlexiPage",
+    "flows": "Flow",
+    "globalValueSets": "GlobalValueSet",
+    "labels": "CustomLabels",
+    "layouts": "Layout",
+    "lwc": "LightningComponentBundle",
+    "notificationtypes": "CustomNotificationType",
+    "objectTranslations": "CustomObjectTranslation",
+    "objects": "CustomObject",
+    "pages": "ApexPage",
+    "pathAssistants": "PathAssistant",
+    "permissionsetgroups": "PermissionSetGroup",
+    "permissionsets": "PermissionSet",
+    "quickActions": "QuickAction",
+    "remoteSiteSettings": "RemoteSiteSetting",
+    "reportTypes": "ReportType",
+    "reports": "Report",
+    "settings": "Settings",
+    "sharingRules": "SharingRules",
+    "staticresources": "StaticResource",
+    "tabs": "CustomTab",
+    "testSuites": "ApexTestSuite",
+    "triggers": "ApexTrigger",
+    "workflows": "Workflow",
+}
+
+# Directories where each component is a folder of files rather than one file.
+BUNDLE_DIRECTORIES = {"aura", "lwc"}
+
+# Types listed in package.xml whose members live inside another component's
+# file (e.g. fields inside objects/Foo__c.object) -> the type of that file.
+CHILD_TYPES = {
+    "BusinessProcess": "CustomObject",
+    "CompactLayout": "CustomObject",
+    "CustomField": "CustomObject",
+    "FieldSet": "CustomObject",
+    "Index": "CustomObject",
+    "ListView": "CustomObject",
+    "RecordType": "CustomObject",
+    "SharingReason": "CustomObject",
+    "ValidationRule": "CustomObject",
+    "WebLink": "CustomObject",
+    "CustomLabel": "CustomLabels",
+    "SharingCriteriaRule": "SharingRules",
+    "SharingOwnerRule": "SharingRules",
+    "WorkflowAlert": "Workflow",
+    "WorkflowFieldUpdate": "Workflow",
+    "WorkflowRule": "Workflow",
+}
+
+Component = Tuple[str, str]
+
+
+def component_for_path(name: str) -> Optional[Component]:
+    """Map a path in an MDAPI package to its (metadata type, member name).
+
+    Returns None for package.xml and other top-level files.  Directories that
+    aren't in METADATA_DIRECTORIES map to their directory name as the type.
+    """
+    directory, _, rest = name.partition("/")
+    if not rest:
+        return None
+    mdtype = METADATA_DIRECTORIES.get(directory, directory)
+    if rest.endswith("-meta.xml"):
+        rest = rest[: -len("-meta.xml")]
+    if directory in BUNDLE_DIRECTORIES:
+        return mdtype, rest.split("/", 1)[0]
+    folder, _, filename = rest.rpartition("/")
+    member = filename.rsplit(".", 1)[0] if "." in filename else filename
+    return mdtype, f"{folder}/{member}" if folder else member
+
+
+def _parent_component(mdtype: str, member: str) -> Optional[Component]:
+    parent_type = CHILD_TYPES.get(mdtype)
+    if parent_type is None:
+        return None
+    if parent_type == "CustomLabels":
+        return parent_type, "CustomLabels"
+    return parent_type, member.split(".", 1)[0]
+
+
+def _component_key(component: Component) -> str:
+    return ":".join(component)
+
+
+def component_hash(files: Iterable[Tuple[str, bytes]]) -> str:
+    """Hash one component's (name, content) files, given in name order."""
+    h = hashlib.blake2b(digest_size=20)
+    for name, content in files:
+        h.update(name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(content)
+    return h.hexdigest()
+
+
+def component_hashes(zf: zipfile.ZipFile) -> Dict[str, str]:
+    """Hash the files of each component in the package, keyed by "Type:member"."""
+    files = defaultdict(list)
+    for name in zf.namelist():
+        component = component_for_path(name)
+        if component is not None:
+            files[_component_key(component)].append(name)
+
+    return {
+        key: component_hash((name, zf.read(name)) for name in sorted(names))
+        for key, names in files.items()
+    }
+
+
+def unknown_directories(zf: zipfile.ZipFile) -> Set[str]:
+    """Top-level directories in the package with no known metadata type."""
+    return {
+        name.split("/", 1)[0]
+        for name in zf.namelist()
+        if "/" in name and name.split("/", 1)[0] not in METADATA_DIRECTORIES
+    }
+
+
+def filter_package(zf: zipfile.ZipFile, keys: Iterable[str]) -> zipfile.ZipFile:
+    """Build a package with only the given components and a matching package.xml.
+
+    Child-type entries in package.xml (fields, list views, labels...) are kept
+    when the component file that contains them is kept, and wildcard ("*")
+    entries are kept for the types that still have files.
+    """
+    keys = set(keys)
+    kept_types = set()
+    zip_dest = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+    for info in zf.infolist():
+        component = component_for_path(info.filename)
+        if component is not None and _component_key(component) in keys:
+            zip_dest.writestr(info, zf.read(info))
+            kept_types.add(component[0])
+
+    def keep(mdtype: str, member: str) -> bool:
+        if _component_key((mdtype, member)) in keys:
+            return True
+        if member == "*":
+            return mdtype in kept_types or CHILD_TYPES.get(mdtype) in kept_types
+        parent = _parent_component(mdtype, member)
+        return parent is not None and _component_key(parent) in keys
+
+    package = PackageXml.parse(zf.read("package.xml"))
+    package.filter(keep)
+    zip_dest.writestr("package.xml", package.tobytes())
+    return zip_dest
+
+
+class DeployManifest:
+    """The component hashes last deployed successfully to one org.
+
+    Stored as JSON ({"Type:member": hash}) so it can be inspected or deleted
+    by hand; deleting it forces the next deploy to be a full one.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.hashes: Dict[str, str] = json.loads(self.path.read_text("utf-8"))
+        except (OSError, ValueError):
+            self.hashes = {}
+
+    def changed(self, hashes: Dict[str, str]) -> Set[str]:
+        """Components that are new or differ from what was last deployed."""
+        return {key for key, value in hashes.items() if self.hashes.get(key) != value}
+
+    def record(self, hashes: Dict[str, str]) -> None:
+        self.hashes.update(hashes)
+        write_atomic(self.path, json.dumps(self.hashes, indent=1, sort_keys=True).encode("utf-8"))
+
+
+def package_fingerprint(package_zip: str, settings: dict) -> str:
+    """Hash a deployable package (a deterministic archive, base64-encoded, see
+    tasks/deploy.py) together with the org and deploy settings it goes with."""
+    h = hashlib.blake2b(digest_size=20)
+    h.update(json.dumps(settings, sort_keys=True).encode("utf-8"))
+    h.update(b"\0")
+    h.update(package_zip.encode("ascii"))
+    return h.hexdigest()
+
+
+class DeployFingerprint:
+    """The fingerprint of the package last deployed successfully to one org.
+
+    Stored as JSON so it can be inspected or deleted by hand.  It is cleared
+    before each deploy to the org and set again once one succeeds, so a
+    fingerprint on disk always means the org has that package.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.fingerprint: Optional[str] = json.loads(self.path.read_text("utf-8"))["fingerprint"]
+        except (OSError, ValueError, KeyError, TypeError):
+            self.fingerprint = None
+
+    def record(self, fingerprint: str) -> None:
+        self.fingerprint = fingerprint
+        write_atomic(self.path, json.dumps({"fingerprint": fingerprint}).encode("utf-8"))
+
+    def clear(self) -> None:
+        self.fingerprint = None
+        try:
+            self.path.unlink()
+        except FileNotFoundError:
+            pass
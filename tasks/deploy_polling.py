@@ -0,0 +1,174 @@
+import random
+import time
+from typing import Callable, NamedTuple, Optional
+from xml.dom.minidom import Document, Element
+
+# Deploy states after which nothing changes any more.
+DONE_STATES = {"Succeeded", "SucceededPartial", "Failed", "Canceled"}
+
+
+def _result(dom: Document) -> Element:
+    """The response's top-level <result>, whose own children describe the
+    deploy; component and test details nested under it have ids and
+    statuses of their own."""
+    results = dom.getElementsByTagName("result")
+    return results[0] if results else dom.documentElement
+
+
+def _text(result: Element, tag: str) -> Optional[str]:
+    for node in result.childNodes:
+        if node.nodeType == node.ELEMENT_NODE and node.localName == tag:
+            return node.firstChild.nodeValue if node.firstChild else None
+    return None
+
+
+def _int(result: Element, tag: str) -> int:
+    try:
+        return int(_text(result, tag) or 0)
+    except ValueError:
+        return 0
+
+
+class DeployProgress(NamedTuple):
+    """Where a deploy stands, from one checkDeployStatus response."""
+
+    org: Optional[str]
+    deploy_id: Optional[str]
+    state: Optional[str]
+    state_detail: Optional[str]
+    done: bool
+    components_deployed: int
+    components_total: int
+    component_errors: int
+    tests_completed: int
+    tests_total: int
+    test_errors: int
+    # time.monotonic() when the response was processed
+    checked_at: float
+
+    @classmethod
+    def from_response(cls, dom: Document, org: Optional[str] = None) -> "DeployProgress":
+        result = _result(dom)
+        state = _text(result, "status") or _text(result, "state")
+        return cls(
+            org=org,
+            deploy_id=_text(result, "id"),
+            state=state,
+            state_detail=_text(result, "stateDetail"),
+            done=_text(result, "done") == "true" or state in DONE_STATES,
+            components_deployed=_int(result, "numberComponentsDeployed"),
+            components_total=_int(result, "numberComponentsTotal"),
+            component_errors=_int(result, "numberComponentErrors"),
+            tests_completed=_int(result, "numberTestsCompleted"),
+            tests_total=_int(result, "numberTestsTotal"),
+            test_errors=_int(result, "numberTestErrors"),
+            checked_at=time.monotonic(),
+        )
+
+    @property
+    def phase(self) -> str:
+        """queued, components, tests or finishing."""
+        if self.state in (None, "Queued", "Pending"):
+            return "queued"
+        if self.components_total and self.components_deployed + self.component_errors < self.components_total:
+            return "components"
+        if self.tests_total and self.tests_completed < self.tests_total:
+            return "tests"
+        return "finishing"
+
+    def remaining(self) -> Optional[int]:
+        """Components or tests left in the current phase, if it is counted."""
+        if self.phase == "components":
+            return self.components_total - self.components_deployed - self.component_errors
+        if self.phase == "tests":
+            return self.tests_total - self.tests_completed
+        return None
+
+    def completed(self) -> int:
+        if self.phase == "tests":
+            return self.tests_completed
+        return self.components_deployed + self.component_errors
+
+    def counts(self) -> tuple:
+        return (
+            self.state,
+            self.components_deployed,
+            self.component_errors,
+            self.tests_completed,
+            self.test_errors,
+        )
+
+    def describe(self) -> str:
+        parts = [f"{self.components_deployed}/{self.components_total} components"]
+        if self.component_errors:
+            parts.append(f"{self.component_errors} component errors")
+        if self.tests_total:
+            parts.append(f"{self.tests_completed}/{self.tests_total} tests")
+        if self.test_errors:
+            parts.append(f"{self.test_errors} test errors")
+        return ", ".join(parts)
+
+
+ProgressListener = Callable[[DeployProgress], None]
+
+
+class AdaptivePoller:
+    """Chooses how long to wait before the next deploy status check.
+
+    Polls at ``min_interval`` right after the deploy changes phase (queued,
+    components, tests, finishing), since the next change often follows
+    quickly.  While components or tests are being counted off, it waits
+    half the estimated time left in the phase, so checks get closer
+    together as the phase nears its end.  When a check shows no progress
+    at all (a long queue or one slow test), the wait grows by ``backoff``
+    up to ``max_interval``.  Every wait is spread by +/- ``jitter`` so
+    concurrent deploys don't poll in lockstep.
+    """
+
+    def __init__(
+        self,
+        min_interval: float = 1.0,
+        max_interval: float = 30.0,
+        backoff: float = 1.5,
+        jitter: float = 0.2,
+        rng: Optional[random.Random] = None,
+    ):
+        self.min_interval = min_interval
+        self.max_interval = max_interval
+        self.backoff = backoff
+        self.jitter = jitter
+        self.rng = rng or random.Random()
+        self.interval = min_interval
+        self._previous: Optional[DeployProgress] = None
+        # (checked_at, completed) when the current phase was first seen
+        self._phase_start: Optional[tuple] = None
+
+    def _eta(self, progress: DeployProgress) -> Optional[float]:
+        remaining = progress.remaining()
+        if remaining is None or self._phase_start is None:
+            return None
+        started_at, completed_then = self._phase_start
+        elapsed = progress.checked_at - started_at
+        done = progress.completed() - completed_then
+        if elapsed <= 0 or done <= 0:
+            return None
+        return remaining / (done / elapsed)
+
+    def next_interval(self, progress: DeployProgress) -> float:
+        previous = self._previous
+        self._previous = progress
+        if progress.done:
+            return 0.0
+
+        if previous is None or progress.phase != previous.phase:
+            self._phase_start = (progress.checked_at, progress.completed())
+            interval = self.min_interval
+        elif progress.counts() != previous.counts():
+            eta = self._eta(progress)
+            interval = eta / 2 if eta is not None else self.interval
+        else:
+            interval = self.interval * self.backoff
+
+        self.interval = min(self.max_interval, max(self.min_interval, interval))
+        spread = 1 + self.rng.uniform(-self.jitter, self.jitter)
+        return min(self.max_interval, max(self.min_interval, self.interval * spread))
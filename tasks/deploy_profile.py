@@ -0,0 +1,117 @@
+import contextlib
+import json
+import threading
+import time
+from datetime import datetime, timezone
+from typing import Any, Dict, Iterator, List, Optional
+
+from tasks.file_utils import write_atomic
+
+PROFILE_VERSION = 1
+
+
+class DeployProfiler:
+    """Records timing spans, with counts attached, for one run of a task.
+
+    Spans nest: a span opened inside another records it as its parent.  The
+    profile is written as one JSON document that is both a summary for
+    dashboards ("spans", with start offsets and durations in seconds) and a
+    Chrome trace ("traceEvents"), so it can be opened in chrome://tracing or
+    Perfetto as is:
+
+        profiler = DeployProfiler()
+        with profiler.span("build_package") as attributes:
+            ...
+            attributes["members"] = len(zf.infolist())
+        profiler.write(".cci/deploy_profiles/run.json", task="deploy")
+    """
+
+    def __init__(self):
+        self.started_at = datetime.now(timezone.utc)
+        self.spans: List[Dict[str, Any]] = []
+        self._origin = time.perf_counter()
+        self._local = threading.local()
+
+    def _stack(self) -> List[Dict[str, Any]]:
+        if not hasattr(self._local, "stack"):
+            self._local.stack = []
+        return self._local.stack
+
+    @contextlib.contextmanager
+    def span(self, name: str, **attributes) -> Iterator[Dict[str, Any]]:
+        """Time a block; the yielded dict can be filled in with counts."""
+        stack = self._stack()
+        record = {
+            "name": name,
+            "parent": stack[-1]["name"] if stack else None,
+            "thread": threading.current_thread().name,
+            "start": time.perf_counter() - self._origin,
+            "duration": None,
+            "attributes": attributes,
+        }
+        self.spans.append(record)
+        stack.append(record)
+        try:
+            yield attributes
+        except BaseException as e:
+            attributes["error"] = f"{type(e).__name__}: {e}"
+            raise
+        finally:
+            stack.pop()
+            record["duration"] = time.perf_counter() - self._origin - record["start"]
+
+    def add_span(
+        self, name: str, start: float, duration: float, parent: Optional[str] = None, **attributes
+    ) -> None:
+        """Record a span measured elsewhere, e.g. time accumulated across calls."""
+        self.spans.append(
+            {
+                "name": name,
+                "parent": parent,
+                "thread": threading.current_thread().name,
+                "start": start - self._origin,
+                "duration": duration,
+                "attributes": attributes,
+            }
+        )
+
+    def totals(self) -> Dict[str, float]:
+        """Total seconds per span name, for spans that repeat (e.g. status checks)."""
+        totals: Dict[str, float] = {}
+        for span in self.spans:
+            totals[span["name"]] = totals.get(span["name"], 0.0) + (span["duration"] or 0.0)
+        return totals
+
+    def to_dict(self, **metadata) -> Dict[str, Any]:
+        threads = {name: i for i, name in enumerate(dict.fromkeys(s["thread"] for s in self.spans))}
+        return {
+            "version": PROFILE_VERSION,
+            "started_at": self.started_at.isoformat(),
+            **metadata,
+            "totals": self.totals(),
+            "spans": self.spans,
+            "traceEvents": [
+                {
+                    "name": span["name"],
+                    "ph": "X",
+                    "pid": 1,
+                    "tid": threads[span["thread"]],
+                    "ts": round(span["start"] * 1_000_000),
+                    "dur": round((span["duration"] or 0.0) * 1_000_000),
+                    "args": span["attributes"],
+                }
+                for span in self.spans
+            ],
+        }
+
+    def write(self, path, **metadata) -> None:
+        write_atomic(
+            path, json.dumps(self.to_dict(**metadata), indent=1, default=str).encode("utf-8")
+        )
+
+
+def profile_span(profiler: Optional[DeployProfiler], name: str, **attributes):
+    """profiler.span(), or a context that just yields the attributes if profiling is off."""
+    if profiler is None:
+        return contextlib.nullcontext(attributes)
+    return profiler.span(name, **attributes)
@@ -0,0 +1,333 @@
+import base64
+import io
+import os
+import threading
+import time
+import zipfile
+from collections import defaultdict
+from pathlib import Path
+from typing import Dict, Iterable, Optional, Set, Tuple
+
+from cumulusci.core.dependencies.utils import TaskContext
+from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.core.sfdx import SourceFormat, get_source_format_for_path
+from cumulusci.core.utils import process_bool_arg
+from cumulusci.salesforce_api.package_zip import MetadataPackageZipBuilder
+
+from tasks.deploy import Deploy, _archive_base64
+from tasks.deploy_manifest import (
+    BUNDLE_DIRECTORIES,
+    METADATA_DIRECTORIES,
+    component_for_path,
+    component_hash,
+    filter_package,
+)
+from tasks.source_format import in_bundle, is_ignored, read_forceignore
+
+# Source-format directories whose files are the same in Metadata API format.
+SAME_NAME_DIRECTORIES = {"aura", "classes", "components", "lwc", "pages", "triggers"}
+
+# Source-format directories of single-file components, whose "Name.suffix-meta.xml"
+# is "Name.suffix" in Metadata API format.  Other types (objects, static
+# resources, folders of reports and email templates...) are reshaped by
+# conversion, so changes to them rebuild the whole package.
+META_SUFFIX_DIRECTORIES = {
+    "applications",
+    "customMetadata",
+    "customPermissions",
+    "flexipages",
+    "flows",
+    "globalValueSets",
+    "labels",
+    "layouts",
+    "notificationtypes",
+    "pathAssistants",
+    "permissionsetgroups",
+    "permissionsets",
+    "quickActions",
+    "remoteSiteSettings",
+    "reportTypes",
+    "settings",
+    "tabs",
+    "testSuites",
+}
+
+Snapshot = Dict[str, Tuple[int, int]]
+
+
+def scan_tree(root: Path) -> Snapshot:
+    """(mtime_ns, size) of every file under root, by posix path relative to root."""
+    snapshot = {}
+    for dirpath, dirnames, filenames in os.walk(root):
+        dirnames[:] = [name for name in dirnames if not name.startswith(".")]
+        base = Path(dirpath).relative_to(root).as_posix()
+        for filename in filenames:
+            try:
+                stat = os.stat(os.path.join(dirpath, filename))
+            except OSError:
+                continue
+            relpath = filename if base == "." else f"{base}/{filename}"
+            snapshot[relpath] = (stat.st_mtime_ns, stat.st_size)
+    return snapshot
+
+
+def changed_paths(before: Snapshot, after: Snapshot) -> Set[str]:
+    return {
+        path for path in before.keys() | after.keys() if before.get(path) != after.get(path)
+    }
+
+
+class WarmPackage:
+    """A built, transformed package kept in memory, by component.
+
+    Components are keyed "Type:member" as in deploy_manifest, each with its
+    files' content and a hash comparable to the deploy manifest's.
+    """
+
+    def __init__(self, zf: zipfile.ZipFile):
+        self.package_xml = zf.read("package.xml")
+        self.components: Dict[str, Dict[str, bytes]] = defaultdict(dict)
+        for info in zf.infolist():
+            component = component_for_path(info.filename)
+            if component is not None:
+                self.components[":".join(component)][info.filename] = zf.read(info)
+        self.hashes = {key: self._hash(files) for key, files in self.components.items()}
+
+    @staticmethod
+    def _hash(files: Dict[str, bytes]) -> str:
+        return component_hash((name, files[name]) for name in sorted(files))
+
+    def replace(self, key: str, files: Dict[str, bytes]) -> bool:
+        """Replace a component's files; returns whether its content changed."""
+        self.components[key] = files
+        new_hash = self._hash(files)
+        changed = self.hashes.get(key) != new_hash
+        self.hashes[key] = new_hash
+        return changed
+
+    def delta(self, keys: Iterable[str]) -> zipfile.ZipFile:
+        """A package with only the given components, and a package.xml to match."""
+        keys = set(keys)
+        zf = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+        zf.writestr("package.xml", self.package_xml)
+        for key in sorted(keys):
+            for name, content in sorted(self.components[key].items()):
+                zf.writestr(name, content)
+        return filter_package(zf, keys)
+
+
+class DeployWatch(Deploy):
+    """Watches the source tree and deploys each change as soon as it's saved.
+
+    The package is built and transformed once and kept in memory.  When
+    files change (after ``debounce`` seconds without further saves), only
+    the components they belong to are converted, run through the deploy
+    transforms and patched into the package, and only components whose
+    transformed content differs from what the org last received are
+    deployed.  Types that conversion reshapes (objects, static resources,
+    foldered types) and new or deleted components rebuild the whole package
+    instead, still deploying just the difference.
+
+    What was deployed is recorded in the same per-org manifest as
+    incremental deploys, so the first push after starting only sends what
+    changed since the last deploy of any kind.  A failed deploy is logged
+    and its components are sent again with the next change.  Deletions are
+    not deployed.
+
+        cci task run deploy_watch --org dev
+    """
+
+    task_options = {
+        **Deploy.task_options,
+        "watch_interval": {
+            "description": "Seconds between checks of the source tree for changes.  Defaults to 0.5."
+        },
+        "debounce": {
+            "description": "Seconds to wait after the last change in a burst of saves before "
+            "deploying.  Defaults to 1."
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        if self.chunked or process_bool_arg(self.options.get("profile", False)):
+            raise TaskOptionsError("The chunked and profile options can't be used with deploy_watch.")
+        self.incremental = False
+        try:
+            self.watch_interval = float(self.options.get("watch_interval", 0.5))
+            self.debounce = float(self.options.get("debounce", 1))
+        except ValueError:
+            raise TaskOptionsError("The watch_interval and debounce options must be numbers of seconds.")
+        if self.watch_interval <= 0 or self.debounce < 0:
+            raise TaskOptionsError("The watch_interval option must be positive and debounce not negative.")
+        self.stop_event = threading.Event()
+        self.warm: Optional[WarmPackage] = None
+
+    def stop(self) -> None:
+        """Stop watching after the change being handled, if any."""
+        self.stop_event.set()
+
+    def _run_task(self):
+        self.root = Path(self.options["path"])
+        self.sfdx_format = get_source_format_for_path(self.root) is SourceFormat.SFDX
+        self.ignore_patterns = read_forceignore(Path(self.project_config.repo_root or ".", ".forceignore"))
+        self.manifest = self._get_manifest()
+
+        snapshot = scan_tree(self.root)
+        self._rebuild()
+        self._push()
+        self.logger.info(f"Watching {self.root} for changes (Ctrl+C to stop).")
+        try:
+            while not self.stop_event.is_set():
+                changes, snapshot = self._wait_for_changes(snapshot)
+                if not changes:
+                    continue
+                started = time.monotonic()
+                self._apply(changes)
+                self._push()
+                self.logger.info(f"Handled {len(changes)} changed files in {time.monotonic() - started:.1f}s.")
+        except KeyboardInterrupt:
+            self.logger.info("Stopped watching.")
+
+    def _wait_for_changes(self, snapshot: Snapshot) -> Tuple[Set[str], Snapshot]:
+        """Wait for changes, then until none for ``debounce`` seconds; returns them
+        with the new snapshot.  Returns no changes if stopped while waiting."""
+        changes: Set[str] = set()
+        quiet_since = None
+        while not self.stop_event.wait(self.watch_interval):
+            current = scan_tree(self.root)
+            new = changed_paths(snapshot, current)
+            snapshot = current
+            if new:
+                changes |= new
+                quiet_since = time.monotonic()
+            elif changes and time.monotonic() - quiet_since >= self.debounce:
+                break
+        return {path for path in changes if not self._ignored(path)}, snapshot
+
+    def _ignored(self, relpath: str) -> bool:
+        return is_ignored(relpath, self.ignore_patterns)
+
+    def _rebuild(self) -> None:
+        started = time.monotonic()
+        package_zip = self._get_package_zip(str(self.root))
+        if package_zip is None:
+            raise TaskOptionsError(f"Nothing to deploy in {self.root}.")
+        self.warm = WarmPackage(zipfile.ZipFile(io.BytesIO(base64.b64decode(package_zip))))
+        self.logger.info(
+            f"Built the package: {len(self.warm.components)} components in "
+            f"{time.monotonic() - started:.1f}s."
+        )
+
+    def _apply(self, changes: Set[str]) -> None:
+        """Patch the changed components into the warm package, or rebuild it."""
+        members = self._convert(changes)
+        if members is None:
+            self.logger.info("Rebuilding the package for changes that need a full conversion.")
+            self._rebuild()
+            return
+
+        context = TaskContext(self.org_config, self.project_config, self.logger)
+        source = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+        for name, content in members.items():
+            source.writestr(name, content)
+        built = MetadataPackageZipBuilder.from_zipfile(
+            source, context, options=self._package_options(), transforms=self.transforms
+        ).zf
+
+        components: Dict[str, Dict[str, bytes]] = defaultdict(dict)
+        for info in built.infolist():
+            component = component_for_path(info.filename)
+            if component is not None:
+                components[":".join(component)][info.filename] = built.read(info)
+        if not components.keys() <= self.warm.components.keys():
+            self.logger.info("Rebuilding the package for new components.")
+            self._rebuild()
+            return
+        patched = sum(self.warm.replace(key, files) for key, files in components.items())
+        self.logger.info(f"Patched {patched} changed components into the package.")
+
+    def _convert(self, changes: Set[str]) -> Optional[Dict[str, bytes]]:
+        """Metadata API format files of the components with changed source files,
+        or None when the changes need a full conversion."""
+        members = {}
+        for relpath in changes:
+            located = self._locate(relpath)
+            if located is None:
+                return None
+            source_dir, directory, rest = located
+            if directory in BUNDLE_DIRECTORIES:
+                bundle = rest.split("/", 1)[0]
+                bundle_dir = self.root / source_dir / directory / bundle
+                if not bundle_dir.is_dir():
+                    return None
+                for path in bundle_dir.rglob("*"):
+                    inner = path.relative_to(bundle_dir).as_posix()
+                    if path.is_file() and in_bundle(directory, inner):
+                        members[f"{directory}/{bundle}/{inner}"] = path.read_bytes()
+                continue
+            if self.sfdx_format and directory in META_SUFFIX_DIRECTORIES:
+                path = self.root / relpath
+                if not path.is_file() or not rest.endswith("-meta.xml"):
+                    return None
+                members[f"{directory}/{rest[: -len('-meta.xml')]}"] = path.read_bytes()
+                continue
+            # A file and its -meta.xml (Foo.cls and Foo.cls-meta.xml) are one component
+            base = rest[: -len("-meta.xml")] if rest.endswith("-meta.xml") else rest
+            found = False
+            for name in (base, f"{base}-meta.xml"):
+                path = self.root / source_dir / directory / name
+                if path.is_file():
+                    members[f"{directory}/{name}"] = path.read_bytes()
+                    found = True
+            if not found:
+                return None
+        return members
+
+    def _locate(self, relpath: str) -> Optional[Tuple[str, str, str]]:
+        """Split a changed file's path into (source dir, metadata directory, rest),
+        if its component can be patched in directly."""
+        parts = relpath.split("/")
+        if not self.sfdx_format:
+            if len(parts) < 2 or parts[0] not in METADATA_DIRECTORIES:
+                return None
+            return "", parts[0], "/".join(parts[1:])
+        directories = SAME_NAME_DIRECTORIES | META_SUFFIX_DIRECTORIES
+        for i, part in enumerate(parts[:-1]):
+            if part in directories:
+                return "/".join(parts[:i]), part, "/".join(parts[i + 1 :])
+            if part in METADATA_DIRECTORIES:
+                return None
+        return None
+
+    def _push(self) -> None:
+        """Deploy the components that differ from what the org last received."""
+        changed = self.manifest.changed(self.warm.hashes)
+        if not changed:
+            self.logger.info("The org is up to date.")
+            return
+        hashes = {key: self.warm.hashes[key] for key in changed}
+        listed = sorted(changed)
+        self.logger.info(
+            f"Deploying {len(changed)} changed components: {', '.join(listed[:10])}"
+            + (", ..." if len(listed) > 10 else "")
+        )
+        started = time.monotonic()
+        if not self.check_only:
+            # The org no longer matches the last full package deployed to it
+            self._get_fingerprint().clear()
+        try:
+            self.api_class(
+                self,
+                _archive_base64(self.warm.delta(changed)),
+                purge_on_delete=False,
+                check_only=self.check_only,
+                test_level=self.test_level,
+                run_tests=self.specified_tests,
+            )()
+        except Exception as e:
+            self.logger.error(f"Deploy failed; will retry with the next change: {e}")
+            return
+        if not self.check_only:
+            self.manifest.record(hashes)
+        self.logger.info(f"Deployed in {time.monotonic() - started:.1f}s.")
@@ -0,0 +1,44 @@
+import os
+import secrets
+from contextlib import contextmanager
+from pathlib import Path
+from typing import BinaryIO, Iterator, Optional
+
+
+@contextmanager
+def atomic_writer(path, mode: Optional[int] = None) -> Iterator[BinaryIO]:
+    """Open a file to be written in full before it replaces ``path``, so a
+    concurrent or interrupted run never reads half of it.
+
+    The file keeps its permissions if it already exists, or gets ``mode``,
+    or else those open() would give a new file under the process umask.
+    Nothing is replaced if the block raises.
+    """
+    path = Path(path)
+    path.parent.mkdir(parents=True, exist_ok=True)
+    if mode is None:
+        try:
+            mode = os.stat(path).st_mode & 0o7777
+        except OSError:
+            pass
+    tmp = path.parent / f".tmp-{secrets.token_hex(8)}"
+    # Created as open() would create the file, so the umask applies
+    fd = os.open(tmp, os.O_WRONLY | os.O_CREAT | os.O_EXCL | getattr(os, "O_BINARY", 0), 0o666)
+    try:
+        with os.fdopen(fd, "wb") as f:
+            yield f
+        if mode is not None:
+            os.chmod(tmp, mode)
+        os.replace(tmp, path)
+    except BaseException:
+        try:
+            os.unlink(tmp)
+        except OSError:
+            pass
+        raise
+
+
+def write_atomic(path, data: bytes, mode: Optional[int] = None) -> None:
+    """Write a file with atomic_writer()."""
+    with atomic_writer(path, mode) as f:
+        f.write(data)
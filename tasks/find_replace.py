@@ -0,0 +1,133 @@
+import re
+from typing import AnyStr, Dict, List, Optional, Pattern, Sequence, Tuple
+
+
+def _overlaps(a: str, b: str) -> bool:
+    """True if a and b can share characters when they occur next to each other."""
+    if a in b or b in a:
+        return True
+    return any(
+        a.endswith(b[:k]) or b.endswith(a[:k]) for k in range(1, min(len(a), len(b)))
+    )
+
+
+def can_replace_in_one_pass(pairs: Sequence[Tuple[str, str]]) -> bool:
+    """Whether one scan for all finds can stand in for replacing them in order.
+
+    Applying ``str.replace`` once per pair lets a later find match text that an
+    earlier replacement produced (or joined together), and lets overlapping
+    finds shadow each other.  Provided that no find contains another and no
+    find can overlap a replacement made before it, every match is already
+    present in the original text, so a single scan is equivalent as long as the
+    occurrences it finds don't overlap each other.  Finds that only share their
+    edges (``%%%A%%%`` and ``%%%B%%%``) are fine; CompiledReplacements checks
+    the occurrences in each input.
+    """
+    for i, (find, replace) in enumerate(pairs):
+        if not find:
+            return False
+        for j, (other_find, _) in enumerate(pairs):
+            if i == j:
+                continue
+            if find in other_find:
+                return False
+            # Later finds must not be able to see this replacement.
+            if j > i and (not replace or _overlaps(replace, other_find)):
+                return False
+    return True
+
+
+class CompiledReplacements:
+    """An ordered list of find/replace pairs compiled into a single matcher.
+
+    ``replace_text`` and ``replace_bytes`` return exactly what applying
+    ``str.replace`` for each pair in order would, but scan the input once when
+    the pairs allow it (see can_replace_in_one_pass).  Both return the input
+    object itself when nothing was replaced.
+
+    ``replace_bytes`` works on UTF-8 encoded text without decoding it; since
+    UTF-8 is self-synchronizing, an encoded find can only match on a character
+    boundary.  Callers are responsible for checking that the bytes are text.
+    """
+
+    def __init__(self, pairs: Sequence[Tuple[str, str]]):
+        self.pairs: List[Tuple[str, str]] = list(pairs)
+        self.one_pass = can_replace_in_one_pass(self.pairs)
+        self._encoded = [
+            (find.encode("utf-8"), replace.encode("utf-8")) for find, replace in self.pairs
+        ]
+        self._text_scan: Optional[Pattern[str]] = None
+        self._bytes_scan: Optional[Pattern[bytes]] = None
+        if self.one_pass and len(self.pairs) > 1:
+            self._text_lookup: Dict[str, str] = dict(self.pairs)
+            self._bytes_lookup: Dict[bytes, bytes] = dict(self._encoded)
+            # A lookahead reports every occurrence, including overlapping ones.
+            # No find is a prefix of another, so at most one matches per position.
+            self._text_scan = re.compile(
+                "(?=(" + "|".join(re.escape(f) for f in self._text_lookup) + "))"
+            )
+            self._bytes_scan = re.compile(
+                b"(?=(" + b"|".join(re.escape(f) for f in self._bytes_lookup) + b"))"
+            )
+
+    def __bool__(self) -> bool:
+        return bool(self.pairs)
+
+    def matches_bytes(self, data: bytes) -> bool:
+        """Cheap check for whether replace_bytes could change data."""
+        if not self.pairs:
+            return False
+        if not self.one_pass:
+            return bool(self.pairs)
+        if self._bytes_scan is None:
+            return self._encoded[0][0] in data
+        return self._bytes_scan.search(data) is not None
+
+    def count_bytes(self, data: bytes) -> int:
+        """How many times the finds occur in data, before any replacement."""
+        return sum(data.count(find) for find, _ in self._encoded if find)
+
+    def replace_text(self, text: str) -> str:
+        new_text = None
+        if self._text_scan is not None:
+            new_text = self._scan(self._text_scan, self._text_lookup, text, "")
+        if new_text is None:
+            new_text = text
+            for find, replace in self.pairs:
+                new_text = new_text.replace(find, replace)
+        return new_text if new_text != text else text
+
+    def replace_bytes(self, data: bytes) -> bytes:
+        if not self.pairs:
+            return data
+        new_data = None
+        if self._bytes_scan is not None:
+            new_data = self._scan(self._bytes_scan, self._bytes_lookup, data, b"")
+        elif self.one_pass:
+            find, replace = self._encoded[0]
+            new_data = data.replace(find, replace)
+        if new_data is None:
+            # Empty or overlapping finds depend on character, not byte,
+            # positions, so fall back to text replacement in order.
+            new_data = self.replace_text(data.decode("utf-8")).encode("utf-8")
+        return new_data if new_data != data else data
+
+    @staticmethod
+    def _scan(
+        scan: Pattern[AnyStr], lookup: Dict[AnyStr, AnyStr], data: AnyStr, empty: AnyStr
+    ) -> Optional[AnyStr]:
+        """Replace every occurrence in one pass, or return None if two overlap."""
+        pieces = []
+        position = 0
+        for match in scan.finditer(data):
+            start = match.start()
+            if start < position:
+                return None
+            find = match.group(1)
+            pieces.append(data[position:start])
+            pieces.append(lookup[find])
+            position = start + len(find)
+        if not pieces:
+            return data
+        pieces.append(data[position:])
+        return empty.join(pieces)
@@ -0,0 +1,419 @@
+import hashlib
+import re
+import sqlite3
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import List, NamedTuple, Optional
+
+from sqlalchemy import Column, MetaData, Table, Unicode, create_engine, inspect
+
+from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.core.utils import process_bool_arg
+from cumulusci.tasks.bulkdata.dates import adjust_relative_dates
+from cumulusci.tasks.bulkdata.extract import ExtractData
+from cumulusci.tasks.bulkdata.mapping_parser import MappingStep
+from cumulusci.tasks.bulkdata.step import DataOperationType
+from cumulusci.tasks.bulkdata.utils import create_table
+
+from tasks.file_utils import atomic_writer
+
+# Fields that can serve as a step's watermark, in order of preference.
+WATERMARK_FIELDS = ("SystemModstamp", "LastModifiedDate")
+
+STATE_SCHEMA = """
+CREATE TABLE IF NOT EXISTS state.meta (key TEXT PRIMARY KEY, value TEXT);
+CREATE TABLE IF NOT EXISTS state.watermarks (step TEXT PRIMARY KEY, field TEXT, value TEXT);
+CREATE TABLE IF NOT EXISTS state.ids (
+    tbl TEXT NOT NULL, sf_id TEXT NOT NULL, local_id INTEGER NOT NULL, PRIMARY KEY (tbl, sf_id)
+);
+CREATE INDEX IF NOT EXISTS state.ids_by_local_id ON ids (tbl, local_id);
+"""
+
+
+class StepExtract(NamedTuple):
+    step: str
+    sobject: str
+    full: bool
+    upserted: int
+    deleted: int
+    pages: int
+    seconds: float
+    watermark: Optional[str]
+
+
+def _quote(name: str) -> str:
+    return '"' + name.replace('"', '""') + '"'
+
+
+def _file_digest(path: Path) -> str:
+    digest = hashlib.sha256()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(1 << 20), b""):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+def _soql_datetime(value: str, overlap: timedelta) -> str:
+    """A SOQL datetime literal for ``overlap`` before a value as the REST API
+    returns it (2024-05-01T12:00:00.000+0000)."""
+    parsed = datetime.strptime(value, "%Y-%m-%dT%H:%M:%S.%f%z") - overlap
+    return parsed.strftime("%Y-%m-%dT%H:%M:%SZ")
+
+
+@contextmanager
+def _transaction(conn: sqlite3.Connection):
+    conn.execute("BEGIN")
+    try:
+        yield
+    except BaseException:
+        conn.execute("ROLLBACK")
+        raise
+    conn.execute("COMMIT")
+
+
+class IncrementalExtract(ExtractData):
+    """Refreshes a SQL dataset with only the records changed since the last extract.
+
+    Records are queried with the REST API a page at a time and written
+    straight into a SQLite copy of the dataset, so memory use doesn't grow
+    with the size of the org; the SQL file is then written from that copy.
+    For each mapping step the highest SystemModstamp (or LastModifiedDate)
+    seen is kept as a watermark, and later runs only query records modified
+    after it, through queryAll so deleted records are removed from the
+    dataset too.  Changed rows keep
+    their local ids; new rows get the next free id, and lookups are written
+    as local ids, as extract_dataset writes them.
+
+    The SQLite copy, the watermarks and the Salesforce id behind every local
+    id are kept next to the project's other caches (``state_dir``), so a
+    refresh doesn't have to read the SQL file back in.  Everything is
+    extracted again when that state doesn't match: on the first run, with
+    ``full``, when the mapping file or the org changes, or when the SQL file
+    isn't the one the last extract wrote.  Records that stop matching a
+    step's soql_filter or record type aren't removed by a refresh.
+    """
+
+    task_options = {
+        **ExtractData.task_options,
+        "full": {"description": "If True, extract every record even if a watermark is stored."},
+        "state_dir": {
+            "description": "Directory for the SQLite copy of the dataset, the watermarks and "
+            "the id map.  Defaults to .cci/dataset_extracts/<sql file name>."
+        },
+        "overlap_seconds": {
+            "description": "How far before the watermark to start each refresh, to pick up "
+            "records saved by transactions still open during the last one.  Defaults to 60."
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        if not self.options.get("sql_path"):
+            raise TaskOptionsError("IncrementalExtract writes a SQL file; set sql_path.")
+        self.options["full"] = process_bool_arg(self.options.get("full") or False)
+        try:
+            self.overlap = timedelta(seconds=float(self.options.get("overlap_seconds", 60)))
+        except ValueError:
+            raise TaskOptionsError("overlap_seconds must be a number")
+
+    def _state_dir(self) -> Path:
+        if self.options.get("state_dir"):
+            return Path(self.options["state_dir"])
+        return Path(self.project_config.cache_dir, "dataset_extracts", Path(self.options["sql_path"]).name)
+
+    def _connect(self, db_path: Path, state_path: Path) -> sqlite3.Connection:
+        conn = sqlite3.connect(db_path, isolation_level=None)
+        conn.execute("ATTACH DATABASE ? AS state", (str(state_path),))
+        conn.executescript(STATE_SCHEMA)
+        return conn
+
+    def _run_task(self):
+        self._init_mapping()
+        sql_path = Path(self.options["sql_path"])
+        state_dir = self._state_dir()
+        state_dir.mkdir(parents=True, exist_ok=True)
+        db_path, state_path = state_dir / "dataset.db", state_dir / "state.db"
+        mapping_digest = _file_digest(Path(self.options["mapping"]))
+        started = time.monotonic()
+
+        had_copy = db_path.exists()
+        conn = self._connect(db_path, state_path)
+        try:
+            reason = self._full_extract_reason(conn, sql_path, mapping_digest)
+            full = reason is not None
+            with _transaction(conn):
+                # Until the new SQL file is written the copy, id map and
+                # watermarks may be ahead of it; a run that fails here starts over
+                conn.execute("INSERT OR REPLACE INTO state.meta VALUES ('dataset_digest', '')")
+                if full:
+                    conn.execute("DELETE FROM state.ids")
+                    conn.execute("DELETE FROM state.watermarks")
+            if full:
+                self.logger.info(f"Extracting every record: {reason}")
+                conn.close()
+                db_path.unlink(missing_ok=True)
+                conn = self._connect(db_path, state_path)
+            else:
+                self.logger.info(f"Refreshing {sql_path} with the records changed since the last extract")
+                if not had_copy:
+                    self._load_sql(conn, sql_path)
+            self._ensure_tables(db_path)
+
+            steps = [self._extract_step(conn, name, mapping, full) for name, mapping in self.mapping.items()]
+            self._resolve_lookups(conn)
+            self._refresh_record_types(conn)
+
+            self._dump(conn, sql_path)
+            with _transaction(conn):
+                conn.executemany(
+                    "INSERT OR REPLACE INTO state.meta VALUES (?, ?)",
+                    [
+                        ("org_id", self.org_config.org_id),
+                        ("mapping_digest", mapping_digest),
+                        ("dataset_digest", _file_digest(sql_path)),
+                    ],
+                )
+        finally:
+            conn.close()
+
+        elapsed = time.monotonic() - started
+        for step in steps:
+            self.logger.info(
+                f"{step.step}: {step.upserted} changed and {step.deleted} deleted rows "
+                f"in {step.pages} pages, {step.seconds:.1f}s"
+            )
+        self.logger.info(f"Wrote {sql_path} in {elapsed:.1f}s")
+        self.return_values = {"full": full, "steps": [step._asdict() for step in steps]}
+
+    def _full_extract_reason(self, conn: sqlite3.Connection, sql_path: Path, mapping_digest: str) -> Optional[str]:
+        meta = dict(conn.execute("SELECT key, value FROM state.meta"))
+        if self.options["full"]:
+            return "full is set"
+        if not sql_path.exists():
+            return f"{sql_path} doesn't exist yet"
+        if meta.get("org_id") != self.org_config.org_id:
+            return "no earlier extract from this org"
+        if meta.get("mapping_digest") != mapping_digest:
+            return "the mapping changed"
+        if meta.get("dataset_digest") != _file_digest(sql_path):
+            return f"{sql_path} isn't the file the last extract wrote"
+        return None
+
+    def _load_sql(self, conn: sqlite3.Connection, sql_path: Path) -> None:
+        """Runs the SQL file one statement at a time, so it's never all in memory."""
+        statement = ""
+        with open(sql_path, encoding="utf-8") as f:
+            for line in f:
+                statement += line
+                if sqlite3.complete_statement(statement):
+                    conn.execute(statement)
+                    statement = ""
+
+    def _ensure_tables(self, db_path: Path) -> None:
+        """Creates the mapping's tables that the dataset doesn't have yet, as extract_dataset creates them."""
+        engine = create_engine(f"sqlite:///{db_path}")
+        with engine.connect() as connection:
+            metadata = MetaData(bind=connection)
+            existing = set(inspect(connection).get_table_names())
+            for mapping in self.mapping.values():
+                if mapping.table not in existing:
+                    create_table(mapping, metadata)
+                    existing.add(mapping.table)
+                if "RecordTypeId" in mapping.fields:
+                    Table(
+                        mapping.get_source_record_type_table(),
+                        metadata,
+                        Column("record_type_id", Unicode(18), primary_key=True),
+                        Column("developer_name", Unicode(255)),
+                    ).create(checkfirst=True)
+        engine.dispose()
+
+    def _soql(self, mapping: MappingStep, fields: List[str], since: Optional[str]) -> str:
+        conditions = []
+        if mapping.record_type:
+            conditions.append(f"RecordType.DeveloperName = '{mapping.record_type}'")
+        if mapping.soql_filter:
+            conditions.append(re.sub(r"^WHERE\s+", "", mapping.soql_filter.strip(), flags=re.IGNORECASE))
+        if since:
+            conditions.append(since)
+        soql = f"SELECT {', '.join(fields)} FROM {mapping.sf_object}"
+        if conditions:
+            soql += " WHERE " + " AND ".join(f"({condition})" for condition in conditions)
+        return soql
+
+    def _extract_step(self, conn: sqlite3.Connection, name: str, mapping: MappingStep, full: bool) -> StepExtract:
+        started = time.monotonic()
+        field_map = mapping.get_complete_field_map(include_id=True)
+        fields = list(field_map)
+        describe = mapping.describe_data(self.sf)
+        watermark_field = next((field for field in WATERMARK_FIELDS if field in describe), None)
+        stored = conn.execute("SELECT field, value FROM state.watermarks WHERE step = ?", (name,)).fetchone()
+        incremental = not full and stored is not None and stored[0] == watermark_field
+        since = f"{watermark_field} > {_soql_datetime(stored[1], self.overlap)}" if incremental else None
+        watermark = stored[1] if incremental else None
+
+        extra = [field for field in (watermark_field,) if field and field not in field_map]
+        if incremental:
+            extra.append("IsDeleted")
+        soql = self._soql(mapping, fields + extra, since)
+        self.logger.info(f"Extracting {'changed ' if incremental else ''}{mapping.sf_object} records for {name}")
+
+        columns = [field_map[field] for field in fields[1:]]
+        if mapping.record_type:
+            columns.append("record_type")
+        lookups = {
+            columns.index(lookup.get_lookup_key_field()): lookup.table for lookup in mapping.lookups.values()
+        }
+        conn.execute("DROP TABLE IF EXISTS temp.stage")
+        conn.execute(
+            "CREATE TEMP TABLE stage (sf_id TEXT, deleted INTEGER"
+            + "".join(f", c{i}" for i in range(len(columns)))
+            + ")"
+        )
+        merge = self._merge_statements(mapping, columns, lookups)
+
+        date_context = None
+        if mapping.anchor_date:
+            date_context = mapping.get_relative_date_context(fields, self.sf)
+            if not (date_context[0] or date_context[1]):
+                date_context = None
+
+        upserted = deleted = pages = 0
+        response = self.sf.query(soql, include_deleted=incremental)
+        while True:
+            rows = []
+            for record in response["records"]:
+                row = [str(record[field]) if record[field] is not None else "" for field in fields]
+                if date_context:
+                    row = adjust_relative_dates(mapping, date_context, row, DataOperationType.QUERY)
+                if mapping.record_type:
+                    row.append(mapping.record_type)
+                is_deleted = bool(record.get("IsDeleted"))
+                rows.append([row[0], is_deleted] + row[1:])
+                deleted += is_deleted
+                if watermark_field and record.get(watermark_field) and (
+                    watermark is None or record[watermark_field] > watermark
+                ):
+                    watermark = record[watermark_field]
+            with _transaction(conn):
+                conn.executemany(f"INSERT INTO temp.stage VALUES ({', '.join('?' * (len(columns) + 2))})", rows)
+                for statement, parameters in merge:
+                    conn.execute(statement, parameters)
+                conn.execute("DELETE FROM temp.stage")
+            upserted += len(rows)
+            pages += 1
+            if response["done"]:
+                break
+            response = self.sf.query_more(
+                response["nextRecordsUrl"], identifier_is_url=True, include_deleted=incremental
+            )
+        conn.execute("DROP TABLE temp.stage")
+
+        if watermark_field and watermark:
+            with _transaction(conn):
+                conn.execute(
+                    "INSERT OR REPLACE INTO state.watermarks VALUES (?, ?, ?)", (name, watermark_field, watermark)
+                )
+        return StepExtract(
+            name,
+            mapping.sf_object,
+            not incremental,
+            upserted - deleted,
+            deleted,
+            pages,
+            time.monotonic() - started,
+            watermark,
+        )
+
+    def _merge_statements(self, mapping: MappingStep, columns: List[str], lookups: dict) -> list:
+        """(sql, parameters) that apply the staged page to the dataset table."""
+        table = _quote(mapping.table)
+        values = [
+            f"COALESCE((SELECT p.local_id FROM state.ids p WHERE p.tbl = ? AND p.sf_id = s.c{i}), s.c{i})"
+            if i in lookups
+            else f"s.c{i}"
+            for i in range(len(columns))
+        ]
+        lookup_tables = [lookups[i] for i in range(len(columns)) if i in lookups]
+        column_list = ", ".join(_quote(column) for column in columns)
+
+        if mapping.get_oid_as_pk():
+            pk = _quote(mapping.fields["Id"])
+            return [
+                (f"DELETE FROM main.{table} WHERE {pk} IN (SELECT sf_id FROM temp.stage WHERE deleted)", ()),
+                (
+                    f"INSERT OR REPLACE INTO main.{table} ({pk}, {column_list}) "
+                    f"SELECT s.sf_id, {', '.join(values)} FROM temp.stage s WHERE NOT s.deleted",
+                    lookup_tables,
+                ),
+            ]
+
+        known = "i.tbl = ? AND i.sf_id = s.sf_id"
+        return [
+            (
+                f"DELETE FROM main.{table} WHERE id IN "
+                f"(SELECT i.local_id FROM temp.stage s JOIN state.ids i ON {known} WHERE s.deleted)",
+                (mapping.table,),
+            ),
+            (
+                "DELETE FROM state.ids WHERE tbl = ? AND sf_id IN (SELECT sf_id FROM temp.stage WHERE deleted)",
+                (mapping.table,),
+            ),
+            # New records get the ids after the highest one in use.  Every row
+            # this task writes has its id in state.ids, which holds them as
+            # integers; the table's id column is text, so its MAX is a string's
+            (
+                "INSERT INTO state.ids (tbl, sf_id, local_id) "
+                "SELECT ?, s.sf_id, ROW_NUMBER() OVER (ORDER BY s.rowid) + "
+                "(SELECT COALESCE(MAX(local_id), 0) FROM state.ids WHERE tbl = ?) "
+                "FROM temp.stage s WHERE NOT s.deleted AND NOT EXISTS "
+                f"(SELECT 1 FROM state.ids i WHERE {known})",
+                (mapping.table, mapping.table, mapping.table),
+            ),
+            (
+                f"INSERT OR REPLACE INTO main.{table} (id, {column_list}) "
+                f"SELECT i.local_id, {', '.join(values)} "
+                f"FROM temp.stage s JOIN state.ids i ON {known} WHERE NOT s.deleted",
+                lookup_tables + [mapping.table],
+            ),
+        ]
+
+    def _resolve_lookups(self, conn: sqlite3.Connection) -> None:
+        """Rewrites lookups still holding a Salesforce id whose record is now in the
+        dataset, such as lookups to records extracted by a later step."""
+        with _transaction(conn):
+            for mapping in self.mapping.values():
+                if mapping.get_oid_as_pk():
+                    continue
+                table = _quote(mapping.table)
+                for lookup in mapping.lookups.values():
+                    column = _quote(lookup.get_lookup_key_field())
+                    conn.execute(
+                        f"UPDATE main.{table} SET {column} = (SELECT p.local_id FROM state.ids p "
+                        f"WHERE p.tbl = ? AND p.sf_id = main.{table}.{column}) "
+                        f"WHERE {column} IN (SELECT sf_id FROM state.ids WHERE tbl = ?)",
+                        (lookup.table, lookup.table),
+                    )
+
+    def _refresh_record_types(self, conn: sqlite3.Connection) -> None:
+        for mapping in self.mapping.values():
+            if "RecordTypeId" not in mapping.fields:
+                continue
+            table = _quote(mapping.get_source_record_type_table())
+            result = self.sf.query(
+                f"SELECT Id, DeveloperName FROM RecordType WHERE SObjectType='{mapping.sf_object}'"
+            )
+            with _transaction(conn):
+                conn.execute(f"DELETE FROM main.{table}")
+                conn.executemany(
+                    f"INSERT INTO main.{table} VALUES (?, ?)",
+                    [(rt["Id"], rt["DeveloperName"]) for rt in result["records"]],
+                )
+
+    def _dump(self, conn: sqlite3.Connection, sql_path: Path) -> None:
+        """Writes the dataset as extract_dataset does, replacing the file only once it's complete."""
+        with atomic_writer(sql_path) as f:
+            for line in conn.iterdump():
+                f.write(line.encode("utf-8") + b"\n")
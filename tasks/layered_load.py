@@ -0,0 +1,342 @@
+import math
+import tempfile
+import time
+from collections import defaultdict
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from typing import Dict, FrozenSet, List, NamedTuple, Optional
+
+from cumulusci.core.exceptions import BulkDataException, TaskOptionsError
+from cumulusci.tasks.bulkdata.load import (
+    LoadData,
+    SetRecentlyViewedInfo,
+    StepResultInfo,
+)
+from cumulusci.tasks.bulkdata.mapping_parser import MappingStep
+from cumulusci.tasks.bulkdata.step import (
+    DEFAULT_BULK_BATCH_SIZE,
+    BulkApiDmlOperation,
+    DataOperationJobResult,
+    DataOperationResult,
+    DataOperationStatus,
+)
+
+from tasks.task_logging import PrefixedTask
+
+# Bulk API (v1) limit on records per batch.
+MAX_BULK_BATCH_SIZE = DEFAULT_BULK_BATCH_SIZE
+
+
+class LoadNode(NamedTuple):
+    """One mapping step (or synthesized post-load step) and the steps it waits for."""
+
+    name: str
+    mapping: MappingStep
+    depends_on: FrozenSet[str]
+    # Post-load steps carry the name of the step they follow
+    after: Optional[str] = None
+
+
+class StepThroughput(NamedTuple):
+    step: str
+    sobject: str
+    api: str
+    rows: int
+    batches: int
+    seconds: float
+
+    @property
+    def rows_per_second(self) -> float:
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def simplify(self) -> dict:
+        return {**self._asdict(), "rows_per_second": round(self.rows_per_second, 1)}
+
+
+def dependency_layers(
+    mapping: Dict[str, MappingStep], after_steps: Dict[str, Dict[str, MappingStep]]
+) -> List[List[LoadNode]]:
+    """Groups the steps into layers that can each be loaded all at once.
+
+    A step depends on the earlier steps that load the tables its lookups
+    point at (lookups deferred with ``after`` are left to the post-load
+    step), and on earlier steps loading its own table.  A post-load step
+    depends on the step it follows and on every step up to that one that
+    loads a table it looks up.  Lookups to tables loaded later in the
+    mapping stay unresolved, as they do when the steps run one by one.
+    Each step goes in the first layer after all of its dependencies.
+    """
+    order = {name: index for index, name in enumerate(mapping)}
+    loaders = defaultdict(list)
+    for name, step in mapping.items():
+        loaders[step.table].append(name)
+
+    def loaded_before(table: str, index: int) -> set:
+        return {name for name in loaders[table] if order[name] < index}
+
+    nodes = []
+    for name, step in mapping.items():
+        index = order[name]
+        depends_on = loaded_before(step.table, index)
+        for lookup in step.lookups.values():
+            if not lookup.after:
+                depends_on |= loaded_before(lookup.table, index)
+        nodes.append(LoadNode(name, step, frozenset(depends_on)))
+
+        for after_name, after_step in after_steps.get(name, {}).items():
+            depends_on = {name}
+            for lookup in after_step.lookups.values():
+                depends_on |= loaded_before(lookup.table, index + 1)
+            nodes.append(LoadNode(after_name, after_step, frozenset(depends_on), after=name))
+
+    levels = {}
+    for node in nodes:
+        # Dependencies always come earlier in the list
+        levels[node.name] = 1 + max((levels[dep] for dep in node.depends_on), default=-1)
+    layers = [[] for _ in range(max(levels.values(), default=-1) + 1)]
+    for node in nodes:
+        layers[levels[node.name]].append(node)
+    return layers
+
+
+def bulk_batch_size(rows: int, limit: int = MAX_BULK_BATCH_SIZE) -> int:
+    """The largest even batch size that loads ``rows`` in as few batches as
+    the Bulk API allows: 25,000 rows go as 3 batches of 8,334 rather than two
+    full batches and a small one."""
+    if rows <= limit:
+        return max(rows, 1)
+    return math.ceil(rows / math.ceil(rows / limit))
+
+
+class _PreparedStep(NamedTuple):
+    node: LoadNode
+    step: object
+    rows: list
+    local_ids: object
+
+
+class _LoadedStep(NamedTuple):
+    """What _process_job_results needs of a step, once its job is done."""
+
+    job_result: DataOperationJobResult
+    results: List[DataOperationResult]
+    seconds: float
+
+    def get_results(self):
+        return iter(self.results)
+
+
+class _BulkStep(BulkApiDmlOperation):
+    """BulkApiDmlOperation that checks on its job every ``poll_interval``
+    seconds (growing by half up to ten) instead of every ten seconds, so
+    small jobs don't hold up the next layer."""
+
+    def __init__(self, *, poll_interval: float = 1.0, **kwargs):
+        super().__init__(**kwargs)
+        self.poll_interval = poll_interval
+
+    def _wait_for_job(self, job_id):
+        interval = self.poll_interval
+        while True:
+            result = self._job_state_from_batches(job_id)
+            if result.status is not DataOperationStatus.IN_PROGRESS:
+                break
+            time.sleep(interval)
+            interval = min(interval * 1.5, 10)
+        errors = f": {result.total_row_errors} row errors" if result.total_row_errors else ""
+        self.logger.info(f"Job {job_id} finished with result: {result.status.value}{errors}")
+        for state_message in result.job_errors:
+            self.logger.error(f"Batch failure message: {state_message}")
+        return result
+
+
+class LayeredLoadData(LoadData):
+    """Loads a dataset one dependency layer at a time, with every step in a
+    layer loading at the same time.
+
+    The lookups in the mapping decide the layers: steps that don't look
+    anything up load first, then the steps that only look up those, and so
+    on, with post-load steps for deferred lookups scheduled as soon as the
+    records they update and point at are in.  Within a layer each step's
+    rows are read from the local database first, then the Bulk or REST jobs
+    run in parallel (up to ``max_workers``), and the new record ids are
+    saved to the local id table, keyed by local id, for the next layer's
+    lookups to join against.  Bulk jobs without a batch_size
+    in the mapping use the fewest, evenly sized batches the row count
+    allows.  Rows, time and rows per second for each step are logged and
+    returned as ``step_throughput``.
+    """
+
+    task_options = {
+        **LoadData.task_options,
+        "max_workers": {
+            "description": "How many steps of a layer to load at once.  Defaults to 4."
+        },
+        "poll_interval": {
+            "description": "Seconds before the first check on a Bulk API job; later checks "
+            "back off to every 10 seconds.  Defaults to 1."
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        try:
+            self.max_workers = int(self.options.get("max_workers", 4))
+            self.poll_interval = float(self.options.get("poll_interval", 1))
+        except ValueError as e:
+            raise TaskOptionsError(f"max_workers and poll_interval must be numbers: {e}")
+        if self.max_workers < 1 or self.poll_interval <= 0:
+            raise TaskOptionsError("max_workers and poll_interval must be positive")
+
+    def _run_task(self):
+        if not self.has_dataset:
+            return super()._run_task()
+        self._init_mapping()
+        started = time.monotonic()
+        throughput = []
+        with self._init_db():
+            self._expand_mapping()
+            self._initialize_id_table(self.reset_oids)
+            layers = self._plan_layers()
+            results = {}
+            with ThreadPoolExecutor(max_workers=self.max_workers, thread_name_prefix="load") as pool:
+                for number, layer in enumerate(layers, 1):
+                    self.logger.info(
+                        f"Layer {number} of {len(layers)}: {', '.join(node.name for node in layer)}"
+                    )
+                    for node, result, stats in self._run_layer(layer, pool):
+                        throughput.append(stats)
+                        if node.after is None:
+                            results[node.name] = StepResultInfo(
+                                node.mapping.sf_object, result, node.mapping.record_type
+                            )
+        elapsed = time.monotonic() - started
+        self._log_throughput(throughput, elapsed)
+
+        if self.options["set_recently_viewed"]:
+            try:
+                self.logger.info("Setting records to 'recently viewed'.")
+                set_recently_viewed = self._set_viewed()
+            except Exception as e:
+                self.logger.warning(f"Could not set recently viewed because {e}")
+                set_recently_viewed = [SetRecentlyViewedInfo("ALL", e)]
+        else:
+            set_recently_viewed = False
+
+        self.return_values = {
+            "step_results": {
+                # In mapping order, as the stock task returns them
+                name: results[name].simplify()
+                for name in self.mapping
+                if name in results
+            },
+            "step_throughput": [stats.simplify() for stats in throughput],
+        }
+        if set_recently_viewed is not False:
+            self.return_values["set_recently_viewed"] = set_recently_viewed
+
+    def _plan_layers(self) -> List[List[LoadNode]]:
+        mapping = self.mapping
+        start_step = self.options.get("start_step")
+        if start_step:
+            names = list(mapping)
+            if start_step not in names:
+                raise TaskOptionsError(f"start_step {start_step} is not in the mapping")
+            for name in names[: names.index(start_step)]:
+                self.logger.info(f"Skipping step: {name}")
+            mapping = {name: mapping[name] for name in names[names.index(start_step) :]}
+        return dependency_layers(mapping, self.after_steps)
+
+    def _run_layer(self, layer: List[LoadNode], pool: ThreadPoolExecutor):
+        """Loads the layer's steps in parallel; yields (node, job result,
+        throughput) for each as its ids are saved."""
+        # The local database session isn't shared with the workers: rows are
+        # read before the jobs start and ids are written after they finish
+        prepared = [self._prepare_step(node) for node in layer]
+        futures = {pool.submit(self._load_step, item): item for item in prepared}
+        failures = []
+        try:
+            for future in as_completed(futures):
+                item = futures[future]
+                loaded = future.result()
+                if loaded.job_result.status is DataOperationStatus.JOB_FAILURE:
+                    failures.append(
+                        f"Step {item.node.name} did not complete successfully: "
+                        f"{','.join(loaded.job_result.job_errors)}"
+                    )
+                    continue
+                item.local_ids.seek(0)
+                self._process_job_results(item.node.mapping, loaded, item.local_ids)
+                stats = StepThroughput(
+                    item.node.name,
+                    item.node.mapping.sf_object,
+                    "bulk" if isinstance(item.step, BulkApiDmlOperation) else "rest",
+                    len(item.rows),
+                    len(getattr(item.step, "batch_ids", ()))
+                    or math.ceil(len(item.rows) / item.step.api_options["batch_size"]),
+                    loaded.seconds,
+                )
+                self.logger.info(
+                    f"{stats.step}: {stats.rows} rows in {stats.seconds:.1f}s "
+                    f"({stats.rows_per_second:.0f} rows/s)"
+                )
+                yield item.node, loaded.job_result, stats
+        finally:
+            for item in prepared:
+                item.local_ids.close()
+        if failures:
+            raise BulkDataException("\n".join(failures))
+
+    def _prepare_step(self, node: LoadNode) -> _PreparedStep:
+        mapping = node.mapping
+        self.logger.info(
+            f"{'Running post-load step' if node.after else 'Running step'}: {node.name}"
+        )
+        if "RecordTypeId" in mapping.fields:
+            conn = self.session.connection()
+            self._load_record_types([mapping.sf_object], conn)
+            self.session.commit()
+
+        step, query = self.configure_step(mapping)
+        context = PrefixedTask(self, node.name)
+        if isinstance(step, BulkApiDmlOperation):
+            step = _BulkStep(
+                sobject=step.sobject,
+                operation=step.operation,
+                api_options=step.api_options,
+                context=context,
+                fields=step.fields,
+                poll_interval=self.poll_interval,
+            )
+        else:
+            # The REST step describes its object when it's made; only its logger changes
+            step.context, step.logger = context, context.logger
+        local_ids = tempfile.TemporaryFile(mode="w+t")
+        rows = list(self._stream_queried_data(mapping, local_ids, query))
+        if isinstance(step, _BulkStep) and not mapping.batch_size:
+            step.api_options["batch_size"] = bulk_batch_size(len(rows))
+        return _PreparedStep(node, step, rows, local_ids)
+
+    def _load_step(self, item: _PreparedStep) -> _LoadedStep:
+        """Runs one step's job, in a worker thread."""
+        started = time.monotonic()
+        step = item.step
+        step.start()
+        step.load_records(iter(item.rows))
+        step.end()
+        results = []
+        if step.job_result.status is not DataOperationStatus.JOB_FAILURE:
+            results = list(step.get_results())
+        return _LoadedStep(step.job_result, results, time.monotonic() - started)
+
+    def _log_throughput(self, throughput: List[StepThroughput], elapsed: float) -> None:
+        if not throughput:
+            return
+        width = max(len(stats.step) for stats in throughput)
+        self.logger.info(f"{'Step':<{width}}  {'API':<4} {'Rows':>8} {'Batches':>7} {'Seconds':>8} {'Rows/s':>8}")
+        for stats in throughput:
+            self.logger.info(
+                f"{stats.step:<{width}}  {stats.api:<4} {stats.rows:>8} {stats.batches:>7} "
+                f"{stats.seconds:>8.1f} {stats.rows_per_second:>8.0f}"
+            )
+        rows = sum(stats.rows for stats in throughput)
+        self.logger.info(f"Loaded {rows} rows in {elapsed:.1f}s ({rows / elapsed if elapsed else 0:.0f} rows/s)")
@@ -0,0 +1,128 @@
+import math
+import os
+import zipfile
+from collections import Counter
+
+# Formats that are already compressed, so deflating them again gains nothing.
+COMPRESSED_EXTENSIONS = {
+    ".7z",
+    ".bz2",
+    ".docx",
+    ".gif",
+    ".gz",
+    ".jar",
+    ".jpeg",
+    ".jpg",
+    ".mp3",
+    ".mp4",
+    ".png",
+    ".pptx",
+    ".tgz",
+    ".webp",
+    ".woff",
+    ".woff2",
+    ".xlsx",
+    ".xz",
+    ".zip",
+}
+BINARY_EXTENSIONS = COMPRESSED_EXTENSIONS | {
+    ".bmp",
+    ".eot",
+    ".ico",
+    ".otf",
+    ".pdf",
+    ".tif",
+    ".tiff",
+    ".ttf",
+}
+
+# Leading bytes of compressed formats.  Static resources are all named
+# .resource, so their content is the only way to tell what they are.
+COMPRESSED_MAGIC = (
+    b"PK\x03\x04",  # zip (and jar, docx, ...)
+    b"PK\x05\x06",  # empty zip
+    b"\x1f\x8b",  # gzip
+    b"BZh",  # bzip2
+    b"\xfd7zXZ\x00",  # xz
+    b"7z\xbc\xaf\x27\x1c",  # 7z
+    b"\x28\xb5\x2f\xfd",  # zstd
+    b"\x89PNG",
+    b"\xff\xd8\xff",  # jpeg
+    b"GIF8",
+    b"wOFF",
+    b"wOF2",
+)
+# Signatures short enough for text to start with ("BM" for bmp) are left out;
+# those formats have NUL bytes in their headers, which is_binary() also checks.
+BINARY_MAGIC = COMPRESSED_MAGIC + (
+    b"%PDF-",
+    b"\x00\x00\x01\x00",  # ico
+    b"\x00\x01\x00\x00",  # ttf
+    b"OTTO\x00",  # otf, with the high byte of its table count
+)
+
+# How much of a member to look at for NUL bytes or entropy.
+SAMPLE_SIZE = 8192
+
+# Deflate can't do much with data above this many bits of entropy per byte.
+INCOMPRESSIBLE_ENTROPY = 7.5
+
+# Every member of the archives we build gets this timestamp (the earliest a
+# zip can hold) and these permissions, rather than the time it was written
+# or the mode of a checkout, so the same content gives the same bytes.
+ARCHIVE_DATE_TIME = (1980, 1, 1, 0, 0, 0)
+ARCHIVE_FILE_ATTR = 0o644 << 16
+
+
+def _extension(name: str) -> str:
+    return os.path.splitext(name)[1].lower()
+
+
+def entropy(data: bytes) -> float:
+    """Shannon entropy of data in bits per byte (0 to 8)."""
+    if not data:
+        return 0.0
+    length = len(data)
+    return -sum(
+        count / length * math.log2(count / length) for count in Counter(data).values()
+    )
+
+
+def is_binary(name: str, content: bytes) -> bool:
+    """Whether a package member is binary, and so not for text find/replace.
+
+    Decided by extension, then by magic bytes, then by a NUL byte in the
+    first SAMPLE_SIZE bytes, the same heuristic git uses.
+    """
+    if _extension(name) in BINARY_EXTENSIONS:
+        return True
+    if content.startswith(BINARY_MAGIC):
+        return True
+    return b"\0" in content[:SAMPLE_SIZE]
+
+
+def is_incompressible(name: str, content: bytes) -> bool:
+    """Whether deflating a package member is a waste of CPU.
+
+    True for known compressed formats (by extension or magic bytes) and for
+    anything whose sampled entropy is close to random.  Minified JavaScript
+    and CSS still deflate to about a third of their size, so they are not
+    incompressible.
+    """
+    if _extension(name) in COMPRESSED_EXTENSIONS:
+        return True
+    if content.startswith(COMPRESSED_MAGIC):
+        return True
+    if len(content) < SAMPLE_SIZE:
+        return False
+    middle = len(content) // 2
+    return entropy(content[middle : middle + SAMPLE_SIZE]) > INCOMPRESSIBLE_ENTROPY
+
+
+def member_info(name: str, content: bytes) -> zipfile.ZipInfo:
+    """A ZipInfo to write a package member with: the fixed timestamp and
+    permissions, stored rather than deflated if it is incompressible."""
+    info = zipfile.ZipInfo(name, date_time=ARCHIVE_DATE_TIME)
+    info.external_attr = ARCHIVE_FILE_ATTR
+    info.compress_type = zipfile.ZIP_STORED if is_incompressible(name, content) else zipfile.ZIP_DEFLATED
+    return info
@@ -0,0 +1,255 @@
+import hashlib
+import os
+import sqlite3
+import xml.etree.ElementTree as ET
+from pathlib import Path
+from typing import Iterable, List, NamedTuple, Optional, Sequence, Tuple
+
+from tasks.deploy_manifest import METADATA_DIRECTORIES, component_for_path
+
+# Bump when the schema or the meaning of a column changes; the index is
+# rebuilt from scratch rather than migrated.
+SCHEMA_VERSION = 2
+
+# Source-format subdirectories of objects/<Object>/ -> the type of their files.
+OBJECT_CHILD_DIRECTORIES = {
+    "businessProcesses": "BusinessProcess",
+    "compactLayouts": "CompactLayout",
+    "fieldSets": "FieldSet",
+    "fields": "CustomField",
+    "indexes": "Index",
+    "listViews": "ListView",
+    "recordTypes": "RecordType",
+    "sharingReasons": "SharingReason",
+    "validationRules": "ValidationRule",
+    "webLinks": "WebLink",
+}
+
+# Top-level elements of a -meta.xml file that are copied into the index.
+ATTRIBUTES = ("description", "inlineHelpText", "externalId")
+
+_SCHEMA = """
+CREATE TABLE components (
+    path TEXT PRIMARY KEY,
+    type TEXT NOT NULL,
+    object TEXT,
+    name TEXT NOT NULL,
+    mtime_ns INTEGER NOT NULL,
+    size INTEGER NOT NULL,
+    hash TEXT NOT NULL,
+    description TEXT,
+    inline_help_text TEXT,
+    external_id INTEGER
+);
+CREATE INDEX components_type ON components (type, object);
+"""
+
+_COLUMNS = "path, type, object, name, description, inline_help_text, external_id"
+
+
+class IndexedComponent(NamedTuple):
+    """One file of a component, with the attributes read from its XML.
+
+    Attributes are None when the element is absent; an element that is
+    present but empty is "".  external_id is True, False or None.
+    """
+
+    path: str
+    type: str
+    object: Optional[str]
+    name: str
+    description: Optional[str]
+    inline_help_text: Optional[str]
+    external_id: Optional[bool]
+
+    @classmethod
+    def from_row(cls, row: Sequence) -> "IndexedComponent":
+        external_id = row[6]
+        return cls(*row[:6], None if external_id is None else bool(external_id))
+
+
+class RefreshResult(NamedTuple):
+    scanned: int
+    changed: List[str]
+    removed: List[str]
+
+
+def source_component(parts: Sequence[str]) -> Tuple[str, Optional[str], str]:
+    """Map the parts of a source-format path to (type, object, name).
+
+    The metadata directory is found anywhere in the path, so both
+    force-app/main/default/classes/Foo.cls and classes/Foo.cls work.  Files
+    outside a known metadata directory are typed by the directory they are
+    in, so every file gets a row.
+    """
+    for i, directory in enumerate(parts):
+        if directory in METADATA_DIRECTORIES and i + 1 < len(parts):
+            break
+    else:
+        mdtype, name = component_for_path("/".join(parts[-2:])) or ("", parts[-1])
+        return mdtype, None, name
+    rest = parts[i + 1 :]
+
+    if directory == "objects" and len(rest) == 3:
+        child_type = OBJECT_CHILD_DIRECTORIES.get(rest[1])
+        if child_type is not None:
+            obj = rest[0]
+            name = rest[2].split(".", 1)[0]
+            return child_type, obj, f"{obj}.{name}"
+
+    mdtype, name = component_for_path("/".join(parts[i:]))
+    if directory == "objects":
+        return mdtype, rest[0], rest[0]
+    return mdtype, None, name
+
+
+def read_attributes(content: bytes) -> Tuple[Optional[str], Optional[str], Optional[int]]:
+    """Read description, inlineHelpText and externalId from a -meta.xml file.
+
+    Only direct children of the root element count, so a <description> on a
+    picklist value isn't mistaken for the field's own.
+    """
+    values = {}
+    try:
+        root = ET.fromstring(content)
+    except ET.ParseError:
+        return None, None, None
+    for element in root:
+        tag = element.tag.rsplit("}", 1)[-1]
+        if tag in ATTRIBUTES and tag not in values:
+            values[tag] = element.text or ""
+    external_id = values.get("externalId")
+    return (
+        values.get("description"),
+        values.get("inlineHelpText"),
+        None if external_id is None else int(external_id.strip() == "true"),
+    )
+
+
+class MetadataIndex:
+    """A persistent SQLite index of the components in a source directory.
+
+    refresh() stats every file under ``root`` but only reads the ones whose
+    mtime or size changed since the last refresh, so keeping the index up to
+    date is cheap and queries never touch the source tree:
+
+        with MetadataIndex(".cci/metadata_index.sqlite", "force-app") as index:
+            index.refresh()
+            for field in index.fields_missing("inline_help_text"):
+                print(field.path)
+
+    Paths are stored as given (``root`` joined with the relative path, using
+    forward slashes), so one database can hold several source directories.
+    """
+
+    def __init__(self, db_path, root):
+        self.db_path = Path(db_path)
+        self.root = Path(root)
+        self.db_path.parent.mkdir(parents=True, exist_ok=True)
+        self._db = sqlite3.connect(str(self.db_path))
+        version = self._db.execute("PRAGMA user_version").fetchone()[0]
+        if version != SCHEMA_VERSION:
+            with self._db:
+                self._db.execute("DROP TABLE IF EXISTS components")
+                self._db.executescript(_SCHEMA)
+                self._db.execute(f"PRAGMA user_version = {SCHEMA_VERSION}")
+
+    def __enter__(self) -> "MetadataIndex":
+        return self
+
+    def __exit__(self, *exc) -> None:
+        self.close()
+
+    def close(self) -> None:
+        self._db.close()
+
+    def _prefix(self) -> str:
+        return self.root.as_posix().rstrip("/") + "/"
+
+    def _known(self) -> dict:
+        """path -> (mtime_ns, size, hash) for every file indexed under root."""
+        prefix = self._prefix()
+        rows = self._db.execute(
+            "SELECT path, mtime_ns, size, hash FROM components "
+            "WHERE substr(path, 1, ?) = ?",
+            (len(prefix), prefix),
+        )
+        return {path: (mtime_ns, size, digest) for path, mtime_ns, size, digest in rows}
+
+    def refresh(self, paths: Optional[Iterable[str]] = None) -> RefreshResult:
+        """Bring the index up to date with the files under root.
+
+        Pass ``paths`` to look at just those files (e.g. ones a task has
+        just written); otherwise the whole of root is walked and files that
+        no longer exist are dropped.  The result lists the paths whose
+        content actually changed, so touching a file isn't a change.
+        """
+        known = self._known()
+        if paths is None:
+            candidates = []
+            for dirpath, dirnames, filenames in os.walk(self.root):
+                dirnames.sort()
+                for filename in sorted(filenames):
+                    candidates.append(Path(dirpath, filename).as_posix())
+            removed = sorted(set(known) - set(candidates))
+        else:
+            candidates = [Path(path).as_posix() for path in paths]
+            removed = [path for path in candidates if path in known and not os.path.isfile(path)]
+
+        upserts = []
+        changed = []
+        for path in candidates:
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            previous = known.get(path)
+            if previous is not None and previous[:2] == (stat.st_mtime_ns, stat.st_size):
+                continue
+            component = source_component(Path(path).relative_to(self.root).parts)
+            with open(path, "rb") as f:
+                content = f.read()
+            digest = hashlib.blake2b(content, digest_size=20).hexdigest()
+            attributes = (
+                read_attributes(content) if path.endswith("-meta.xml") else (None, None, None)
+            )
+            upserts.append(
+                (path, *component, stat.st_mtime_ns, stat.st_size, digest, *attributes)
+            )
+            if previous is None or previous[2] != digest:
+                changed.append(path)
+
+        with self._db:
+            self._db.executemany(
+                "INSERT OR REPLACE INTO components VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?)",
+                upserts,
+            )
+            self._db.executemany(
+                "DELETE FROM components WHERE path = ?", [(path,) for path in removed]
+            )
+        return RefreshResult(len(candidates), changed, removed)
+
+    def query(self, where: str = "1", params: Sequence = ()) -> List[IndexedComponent]:
+        """Components under root matching an SQL condition on the columns."""
+        prefix = self._prefix()
+        rows = self._db.execute(
+            f"SELECT {_COLUMNS} FROM components "
+            f"WHERE substr(path, 1, ?) = ? AND ({where}) ORDER BY path",
+            (len(prefix), prefix, *params),
+        )
+        return [IndexedComponent.from_row(row) for row in rows]
+
+    def components(self, mdtype: str, obj: Optional[str] = None) -> List[IndexedComponent]:
+        if obj is None:
+            return self.query("type = ?", (mdtype,))
+        return self.query("type = ? AND object = ?", (mdtype, obj))
+
+    def fields_missing(self, column: str) -> List[IndexedComponent]:
+        """Custom fields without a description or inline_help_text element."""
+        if column not in ("description", "inline_help_text"):
+            raise ValueError(f"Not a text attribute column: {column}")
+        return self.query(f"type = 'CustomField' AND {column} IS NULL")
+
+    def external_id_fields(self) -> List[IndexedComponent]:
+        """Fields marked as external IDs, each of which gets a CustomIndex."""
+        return self.query("type = 'CustomField' AND external_id = 1")
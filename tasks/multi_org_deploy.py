@@ -0,0 +1,295 @@
+import base64
+import copy
+import io
+import json
+import threading
+import time
+import zipfile
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.core.dependencies.utils import TaskContext
+from cumulusci.core.exceptions import CumulusCIException, TaskOptionsError
+from cumulusci.core.source_transforms.transforms import (
+    FindReplaceCurrentUserSpec,
+    FindReplaceIdSpec,
+    FindReplaceOrgUrlSpec,
+)
+from cumulusci.core.utils import process_list_arg
+
+from tasks.deploy import (
+    Deploy,
+    DeployApi,
+    FindReplaceWithFilename,
+    StreamingTransformPipeline,
+    _archive_base64,
+)
+from tasks.deploy_profile import profile_span
+from tasks.file_utils import write_atomic
+from tasks.task_logging import PrefixedLogger
+
+# find_replace patterns whose replacement depends on the target org.
+PER_ORG_SPECS = (FindReplaceCurrentUserSpec, FindReplaceOrgUrlSpec, FindReplaceIdSpec)
+
+
+class RateLimiter:
+    """Token bucket shared by threads: at most ``rate`` calls per second on average,
+    in bursts of up to ``burst``."""
+
+    def __init__(self, rate: float, burst: Optional[float] = None):
+        self.rate = rate
+        self.burst = burst or max(1.0, rate)
+        self._tokens = self.burst
+        self._updated = time.monotonic()
+        self._lock = threading.Lock()
+
+    def acquire(self) -> float:
+        """Take a token, sleeping until one is free; returns the seconds waited."""
+        with self._lock:
+            now = time.monotonic()
+            self._tokens = min(self.burst, self._tokens + (now - self._updated) * self.rate)
+            self._updated = now
+            # Reserve the token now so waiting threads queue in order
+            self._tokens -= 1
+            wait = -self._tokens / self.rate if self._tokens < 0 else 0.0
+        if wait:
+            time.sleep(wait)
+        return wait
+
+
+class OrgDeployTarget:
+    """Stands in for the task when deploying to one of several orgs.
+
+    The Metadata API call classes only use their task's org_config,
+    project_config and logger; this supplies those for one org, plus the
+    shared rate limiter and the task's profiler, polling settings and
+    progress listeners.
+    """
+
+    def __init__(self, name, org_config, task, rate_limiter):
+        self.name = name
+        self.org_config = org_config
+        self.project_config = task.project_config
+        self.logger = PrefixedLogger(task.logger, {"prefix": name})
+        self.rate_limiter = rate_limiter
+        self.profiler = task.profiler
+        self.poll_intervals = task.poll_intervals
+        self.progress_listeners = task.progress_listeners
+
+
+class OrgDeployApi(DeployApi):
+    """DeployApi that waits on its target's shared rate limiter before each call."""
+
+    def _call_mdapi(self, headers, envelope, refresh=None):
+        limiter = getattr(self.task, "rate_limiter", None)
+        if limiter is not None:
+            limiter.acquire()
+        return super()._call_mdapi(headers, envelope, refresh)
+
+
+class OrgDeployResult(NamedTuple):
+    org: str
+    username: Optional[str]
+    status: str
+    seconds: float
+    payload_bytes: int
+    error: Optional[str] = None
+
+
+class MultiOrgDeploy(Deploy):
+    """Deploys the same package to several orgs at once.
+
+    The source is converted and transformed once, up to the first
+    find_replace with a pattern that depends on the org (inject_username,
+    inject_org_url or replace_record_id_query).  That find_replace and the
+    transforms after it are held back and applied, in the configured order,
+    to a copy of the built package for each org.  Deploys then
+    run concurrently, sharing one limit on Metadata API calls per second,
+    and the outcome for every org is merged into one report:
+
+        cci task run deploy_orgs --orgs dev,beta,qa
+
+    Anything the build itself needs from an org (namespace checks) comes
+    from the first org listed.  With skip_unchanged, each org whose last
+    successful deploy was of the same package is reported as Unchanged.
+    """
+
+    salesforce_task = False
+    api_class = OrgDeployApi
+
+    task_options = {
+        **Deploy.task_options,
+        "orgs": {
+            "description": "Names of the orgs to deploy to, separated by commas.",
+            "required": True,
+        },
+        "max_workers": {
+            "description": "How many orgs to deploy to at once.  Defaults to all of them."
+        },
+        "api_calls_per_second": {
+            "description": "Limit on Metadata API calls (deploy starts and status checks) "
+            "per second, shared by all orgs.  Defaults to 4."
+        },
+        "report_path": {
+            "description": "Where to write a JSON report of the results for every org.  "
+            "Defaults to .cci/multi_org_deploys/."
+        },
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        self.orgs = process_list_arg(self.options.get("orgs")) or []
+        if not self.orgs:
+            raise TaskOptionsError("The orgs option must name at least one org.")
+        if self.incremental or self.chunked:
+            raise TaskOptionsError("The incremental and chunked options can't be used with multiple orgs.")
+        try:
+            self.max_workers = int(self.options.get("max_workers") or len(self.orgs))
+            self.api_calls_per_second = float(self.options.get("api_calls_per_second") or 4)
+        except ValueError:
+            raise TaskOptionsError("The max_workers and api_calls_per_second options must be numbers.")
+        if self.max_workers < 1 or self.api_calls_per_second <= 0:
+            raise TaskOptionsError("The max_workers and api_calls_per_second options must be positive.")
+
+        self._org_transforms = self._split_org_transforms()
+        self.org_configs: Dict[str, OrgConfig] = {}
+
+    def _split_org_transforms(self) -> list:
+        """Hold back the transforms from the first org-dependent find_replace on.
+
+        The shared transforms stop before the first find_replace stage with
+        a pattern in PER_ORG_SPECS.  That stage, the rest of its pipeline and
+        every later transform are returned, to be run for each org.
+        """
+        for i, transform in enumerate(self.transforms):
+            if not isinstance(transform, StreamingTransformPipeline):
+                continue
+            for j, stage in enumerate(transform.stages):
+                if isinstance(stage, FindReplaceWithFilename) and any(
+                    isinstance(pattern, PER_ORG_SPECS) for pattern in stage.options.patterns
+                ):
+                    held = StreamingTransformPipeline(transform.stages[j:], spool_threshold=transform.spool_threshold)
+                    org_transforms = [held, *self.transforms[i + 1 :]]
+                    transform.stages = transform.stages[:j]
+                    self.transforms = self.transforms[:i] + ([transform] if transform.stages else [])
+                    return org_transforms
+        return []
+
+    def _init_task(self):
+        keychain = self.project_config.keychain
+        for name in self.orgs:
+            org_config = keychain.get_org(name)
+            with org_config.save_if_changed():
+                org_config.refresh_oauth_token(keychain)
+            self.org_configs[name] = org_config
+
+    def _deploy(self):
+        if self.org_config is None:
+            self.org_config = self.org_configs[self.orgs[0]]
+
+        package_zip = self._get_package_zip(self.options.get("path"))
+        if package_zip is None:
+            self.logger.warning("Deployment package is empty; skipping deployment.")
+            return
+        package = base64.b64decode(package_zip)
+        self.logger.info(
+            f"Built the package once ({len(package)} bytes); deploying to "
+            f"{len(self.orgs)} orgs: {', '.join(self.orgs)}"
+        )
+
+        rate_limiter = RateLimiter(self.api_calls_per_second)
+        with ThreadPoolExecutor(
+            max_workers=min(self.max_workers, len(self.orgs)), thread_name_prefix="deploy"
+        ) as pool:
+            futures = [
+                pool.submit(self._deploy_to_org, name, package, package_zip, rate_limiter)
+                for name in self.orgs
+            ]
+            results = [future.result() for future in futures]
+
+        self._report(results)
+        self.return_values = {"orgs": {result.org: result._asdict() for result in results}}
+        failed = [result.org for result in results if result.status not in ("Success", "Unchanged")]
+        if failed:
+            raise CumulusCIException(f"Deploy failed for {len(failed)} of {len(results)} orgs: {', '.join(failed)}")
+        return self.return_values
+
+    def _deploy_to_org(self, name: str, package: bytes, package_zip: str, rate_limiter) -> OrgDeployResult:
+        org_config = self.org_configs[name]
+        target = OrgDeployTarget(name, org_config, self, rate_limiter)
+        started = time.perf_counter()
+        payload_bytes = 0
+        with profile_span(self.profiler, "org_deploy", org=name):
+            try:
+                org_zip = self._org_package(target, package, package_zip)
+                payload_bytes = len(org_zip)
+                fingerprint = None if self.check_only else self._fingerprint(org_zip, org_config)
+                record = self._get_fingerprint(org_config)
+                if self.skip_unchanged and fingerprint and record.fingerprint == fingerprint:
+                    target.logger.info("The org already has this package; skipping deployment.")
+                    return OrgDeployResult(
+                        name, org_config.username, "Unchanged", time.perf_counter() - started, payload_bytes
+                    )
+                if fingerprint:
+                    record.clear()
+                api = self.api_class(
+                    target,
+                    org_zip,
+                    purge_on_delete=False,
+                    check_only=self.check_only,
+                    test_level=self.test_level,
+                    run_tests=self.specified_tests,
+                )
+                status = api()
+                org_config.reset_installed_packages()
+                if fingerprint:
+                    record.record(fingerprint)
+                error = None
+            except Exception as e:
+                target.logger.error(f"Deploy failed: {e}")
+                status, error = "Failed", str(e)
+        return OrgDeployResult(
+            name, org_config.username, status, time.perf_counter() - started, payload_bytes, error
+        )
+
+    def _org_package(self, target: OrgDeployTarget, package: bytes, package_zip: str) -> str:
+        """The built package with this org's find_replace patterns applied, as base64."""
+        if not self._org_transforms:
+            return package_zip
+        zf = zipfile.ZipFile(io.BytesIO(package))
+        context = TaskContext(target.org_config, self.project_config, target.logger)
+        result = zf
+        for transform in self._org_transforms:
+            # Transforms keep per-run state, and orgs deploy concurrently
+            transform = copy.copy(transform)
+            if isinstance(transform, StreamingTransformPipeline):
+                transform.stages = [copy.copy(stage) for stage in transform.stages]
+            result = transform.process(result, context)
+        if result is zf:
+            return package_zip
+        return _archive_base64(result)
+
+    def _report(self, results: List[OrgDeployResult]) -> None:
+        for result in results:
+            message = f"{result.org}: {result.status} in {result.seconds:.1f}s ({result.payload_bytes} bytes)"
+            if result.error:
+                self.logger.error(f"{message}: {result.error}")
+            else:
+                self.logger.info(message)
+
+        path = self.options.get("report_path")
+        if path:
+            path = Path(path)
+        else:
+            stamp = datetime.now(timezone.utc).strftime("%Y%m%dT%H%M%SZ")
+            path = Path(self.project_config.cache_dir, "multi_org_deploys", f"{stamp}.json")
+        report = {
+            "task": self.name,
+            "check_only": self.check_only,
+            "orgs": [result._asdict() for result in results],
+        }
+        write_atomic(path, json.dumps(report, indent=1).encode("utf-8"))
+        self.logger.info(f"Deploy report written to {path}")
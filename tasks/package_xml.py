@@ -0,0 +1,152 @@
+import xml.etree.ElementTree as ET
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from xml.sax.saxutils import escape
+
+METADATA_NAMESPACE = "http://soap.sforce.com/2006/04/metadata"
+
+_INDENT = "    "
+
+
+def _local_name(tag: str) -> str:
+    return tag.rsplit("}", 1)[-1]
+
+
+def _write_element(element: ET.Element, depth: int, out: List[str]) -> None:
+    """Serialize an element (without namespace prefixes) in Salesforce's layout."""
+    indent = _INDENT * depth
+    tag = _local_name(element.tag)
+    children = list(element)
+    if not children:
+        out.append(f"{indent}<{tag}>{escape(element.text or '')}</{tag}>\n")
+        return
+    out.append(f"{indent}<{tag}>\n")
+    for child in children:
+        _write_element(child, depth + 1, out)
+    out.append(f"{indent}</{tag}>\n")
+
+
+class PackageXml:
+    """A package.xml manifest, parsed once and indexed by metadata type.
+
+    Members are kept per type in their original order, with a set alongside
+    for constant-time lookups, so removing, adding or filtering members is
+    linear in the size of the manifest.  Elements other than <types>
+    (<fullName>, <version>, ...) are kept as they were and written back in
+    their original position relative to the types.
+
+        package = PackageXml.parse(zf.read("package.xml"))
+        package.remove_type("CustomIndex")
+        zip_dest.writestr("package.xml", package.tobytes())
+    """
+
+    def __init__(self, version: Optional[str] = None):
+        self._types: Dict[str, List[str]] = {}
+        self._member_sets: Dict[str, set] = {}
+        # Non-<types> elements that come before and after the <types> section
+        self._head: List[ET.Element] = []
+        self._tail: List[ET.Element] = []
+        if version is not None:
+            element = ET.Element("version")
+            element.text = version
+            self._tail.append(element)
+
+    @classmethod
+    def parse(cls, content: bytes) -> "PackageXml":
+        package = cls()
+        root = ET.fromstring(content)
+        seen_types = False
+        for element in root:
+            if _local_name(element.tag) != "types":
+                (package._tail if seen_types else package._head).append(element)
+                continue
+            seen_types = True
+            name = None
+            members = []
+            for child in element:
+                tag = _local_name(child.tag)
+                if tag == "name":
+                    name = (child.text or "").strip()
+                elif tag == "members":
+                    members.append((child.text or "").strip())
+            if name is not None:
+                for member in members:
+                    package.add(name, member)
+                if not members:
+                    package._types.setdefault(name, [])
+                    package._member_sets.setdefault(name, set())
+        return package
+
+    @property
+    def version(self) -> Optional[str]:
+        for element in self._head + self._tail:
+            if _local_name(element.tag) == "version":
+                return element.text
+        return None
+
+    def __contains__(self, mdtype: str) -> bool:
+        return mdtype in self._types
+
+    def __iter__(self) -> Iterator[Tuple[str, str]]:
+        """Iterate over (type, member) pairs."""
+        for mdtype, members in self._types.items():
+            for member in members:
+                yield mdtype, member
+
+    @property
+    def types(self) -> Dict[str, List[str]]:
+        return {mdtype: list(members) for mdtype, members in self._types.items()}
+
+    def members(self, mdtype: str) -> List[str]:
+        return list(self._types.get(mdtype, ()))
+
+    def has_member(self, mdtype: str, member: str) -> bool:
+        return member in self._member_sets.get(mdtype, ())
+
+    def add(self, mdtype: str, member: str) -> None:
+        member_set = self._member_sets.setdefault(mdtype, set())
+        if member not in member_set:
+            member_set.add(member)
+            self._types.setdefault(mdtype, []).append(member)
+
+    def remove(self, mdtype: str, member: str) -> None:
+        member_set = self._member_sets.get(mdtype)
+        if member_set and member in member_set:
+            member_set.discard(member)
+            self._types[mdtype].remove(member)
+            if not member_set:
+                self.remove_type(mdtype)
+
+    def remove_type(self, mdtype: str) -> None:
+        self._types.pop(mdtype, None)
+        self._member_sets.pop(mdtype, None)
+
+    def filter(self, keep: Callable[[str, str], bool]) -> None:
+        """Keep only the (type, member) pairs for which keep() is true.
+
+        Types left without members are removed.
+        """
+        for mdtype in list(self._types):
+            members = [member for member in self._types[mdtype] if keep(mdtype, member)]
+            if members:
+                self._types[mdtype] = members
+                self._member_sets[mdtype] = set(members)
+            else:
+                self.remove_type(mdtype)
+
+    def tobytes(self) -> bytes:
+        out = [
+            '<?xml version="1.0" encoding="UTF-8"?>\n',
+            f'<Package xmlns="{METADATA_NAMESPACE}">\n',
+        ]
+        for element in self._head:
+            _write_element(element, 1, out)
+        for mdtype, members in self._types.items():
+            out.append(f"{_INDENT}<types>\n")
+            for member in members:
+                out.append(f"{_INDENT * 2}<members>{escape(member)}</members>\n")
+            out.append(f"{_INDENT * 2}<name>{escape(mdtype)}</name>\n")
+            out.append(f"{_INDENT}</types>\n")
+        for element in self._tail:
+            _write_element(element, 1, out)
+        out.append("</Package>\n")
+        return "".join(out).encode("utf-8")
@@ -0,0 +1,247 @@
+import json
+import os
+import subprocess
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import List, NamedTuple
+
+from robot import rebot
+from robot.api import ExecutionResult, TestSuiteBuilder
+
+import cumulusci.robotframework
+from cumulusci.core.exceptions import (
+    NamespaceNotFoundError,
+    RobotTestFailure,
+    TaskOptionsError,
+)
+from cumulusci.tasks.robotframework.robotframework import Robot
+from cumulusci.utils.xml.robot_xml import log_perf_summary_from_xml
+
+from tasks.sharded_apex_tests import Shard, TestDurations, plan_shards
+
+# Robot options that only make sense for the merged results, not for a worker.
+MERGED_ONLY_OPTIONS = ("outputdir", "output", "log", "report", "xunit")
+
+
+class WorkerRun(NamedTuple):
+    shard: Shard
+    output: Path
+    returncode: int
+    elapsed: float
+
+
+class ParallelRobot(Robot):
+    """Runs Robot suites in parallel worker processes, scheduled by past durations.
+
+    The suites (or, with testlevelsplit, the tests) are split into
+    ``processes`` groups of about equal expected run time, using durations
+    recorded by earlier runs, and each group runs in its own robot process
+    with its own output directory (worker-1, worker-2... under outputdir).
+    The workers' output.xml files are then merged into one output.xml,
+    log.html and report.html in outputdir, and the durations from the merged
+    results are remembered for the next run.
+
+    With processes set to 1 this runs the suites serially, like robot.  The
+    ordering option isn't used: the order comes from the recorded durations.
+    """
+
+    task_options = {
+        **Robot.task_options,
+        "processes": {
+            "description": "Number of robot processes to run at the same time.  With 1 (the "
+            "default) the suites run serially in this process, as with the robot task."
+        },
+        "testlevelsplit": {
+            "description": "If true, schedule individual tests across the processes rather than "
+            "whole suites.  Suite setups then run once per process that has tests from the suite."
+        },
+        "durations_path": {
+            "description": "JSON file of suite and test durations used to balance the processes, "
+            "and updated after every run.  Defaults to .cci/robot_durations.json."
+        },
+    }
+    task_options.pop("ordering")
+
+    def _run_task(self):
+        if self.options["processes"] <= 1:
+            return super()._run_task()
+
+        options = self._robot_options()
+        output_dir = Path(options.pop("outputdir"))
+        self.return_values["robot_outputdir"] = str(output_dir)
+        durations = TestDurations(
+            self.options.get("durations_path")
+            or Path(self.project_config.cache_dir, "robot_durations.json")
+        )
+
+        units = self._get_units(options)
+        if not units:
+            raise RobotTestFailure("No tests matched the given suites and filters.")
+        shards = plan_shards(units, durations, self.options["processes"])
+        for shard in shards:
+            self.logger.info(
+                f"Worker {shard.number}: {len(shard.classes)} "
+                f"{'tests' if self.options.get('testlevelsplit') else 'suites'}, "
+                f"about {shard.expected_ms / 1000:.0f}s"
+            )
+
+        worker_options = {
+            option: value for option, value in options.items() if option not in MERGED_ONLY_OPTIONS
+        }
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="robot") as pool:
+            runs = list(
+                pool.map(lambda shard: self._run_worker(shard, worker_options, output_dir), shards)
+            )
+
+        for run in runs:
+            # Robot returns the number of failed tests, or 251 and up for errors
+            if run.returncode > 250 or not run.output.exists():
+                raise RobotTestFailure(
+                    f"Worker {run.shard.number} did not complete (robot exited with "
+                    f"{run.returncode}); see {run.output.parent / 'console.txt'}"
+                )
+            self.logger.info(f"Worker {run.shard.number} finished in {run.elapsed:.0f}s")
+
+        num_failed = self._merge(runs, options, output_dir)
+        if num_failed > 250:
+            raise RobotTestFailure(
+                f"Merging the workers' results failed; see {output_dir / 'rebot.txt'}"
+            )
+        self._record_durations(durations, output_dir / "output.xml")
+
+        log_perf_summary_from_xml(output_dir / "output.xml", self.logger.info)
+        if num_failed == 250:
+            raise RobotTestFailure("250 or more tests failed.")
+        elif num_failed:
+            raise RobotTestFailure(f"{num_failed} test{'' if num_failed == 1 else 's'} failed.")
+
+    def _robot_options(self) -> dict:
+        """The robot options for this run, as Robot._run_task prepares them.
+
+        Also resolves source-prefixed suite paths and sets up the
+        environment the robot processes inherit.
+        """
+        self.options["vars"].append("org:{}".format(self.org_config.name))
+        options = self.options["options"].copy()
+        for option in ("test", "include", "exclude", "xunit", "name", "skip"):
+            if option in self.options:
+                options[option] = self.options[option]
+        options["variable"] = self.options.get("vars") or []
+        options["outputdir"] = str((Path(self.working_path) / options.get("outputdir", ".")).resolve())
+        options["tagstatexclude"] = options.get("tagstatexclude", []) + [
+            "cci_metric_elapsed_time",
+            "cci_metric",
+        ]
+        # Listeners given as objects (verbose, robot_debug) only work in-process
+        options["listener"] = [
+            listener for listener in options.get("listener", []) if isinstance(listener, str)
+        ]
+
+        self.source_paths = []
+        for source in self.options["sources"]:
+            try:
+                self.source_paths.append(self.project_config.get_namespace(source).repo_root)
+            except NamespaceNotFoundError:
+                raise TaskOptionsError(f"robot source '{source}' could not be found")
+            for i, path in enumerate(self.options["suites"]):
+                prefix, _, path = path.rpartition(":")
+                if prefix == source:
+                    self.options["suites"][i] = os.path.join(self.source_paths[-1], path)
+        options["pythonpath"] = [str(self.project_config.repo_root)] + self.source_paths
+
+        os.environ["CCI_CONTEXT"] = json.dumps(
+            {
+                "project_config": {
+                    "repo_name": self.project_config.repo_name,
+                    "repo_root": self.project_config.repo_root,
+                },
+                "org": {
+                    "name": self.org_config.name,
+                    "instance_url": self.org_config.instance_url,
+                    "org_id": self.org_config.org_id,
+                },
+            }
+        )
+        os.environ["NODE_PATH"] = str(Path(cumulusci.robotframework.__path__[0]) / "javascript")
+        return options
+
+    def _get_units(self, options: dict) -> List[str]:
+        """Long names of the suites (or tests) to schedule, after the include,
+        exclude and test filters."""
+        suite = TestSuiteBuilder().build(*self.options["suites"])
+        if options.get("name"):
+            suite.name = options["name"]
+        suite.filter(
+            included_tests=options.get("test"),
+            included_tags=options.get("include"),
+            excluded_tags=options.get("exclude"),
+        )
+        if self.options.get("testlevelsplit"):
+            return [test.longname for test in _walk_tests(suite)]
+        return [child.longname for child in _walk_suites(suite) if child.tests]
+
+    def _run_worker(self, shard: Shard, options: dict, output_dir: Path) -> WorkerRun:
+        worker_dir = output_dir / f"worker-{shard.number}"
+        worker_dir.mkdir(parents=True, exist_ok=True)
+        select = "--test" if self.options.get("testlevelsplit") else "--suite"
+        lines = [f"--outputdir {worker_dir}", "--log NONE", "--report NONE"]
+        for option, value in options.items():
+            if option == "test" and select == "--test":
+                # Already applied when choosing the worker's tests
+                continue
+            for item in value if isinstance(value, list) else [value]:
+                lines.append(f"--{option} {item}")
+        lines.extend(f"{select} {name}" for name in shard.classes)
+        lines.extend(self.options["suites"])
+        argument_file = worker_dir / "arguments.txt"
+        argument_file.write_text("\n".join(lines) + "\n", "utf-8")
+
+        started = time.monotonic()
+        with open(worker_dir / "console.txt", "wb") as console:
+            result = subprocess.run(
+                [sys.executable, "-m", "robot", "--argumentfile", str(argument_file)],
+                stdout=console,
+                stderr=subprocess.STDOUT,
+                cwd=self.working_path,
+            )
+        return WorkerRun(shard, worker_dir / "output.xml", result.returncode, time.monotonic() - started)
+
+    def _merge(self, runs: List[WorkerRun], options: dict, output_dir: Path) -> int:
+        """Merges the workers' results into outputdir; returns the number of failed tests."""
+        merged = {
+            option: options[option] for option in ("log", "report", "xunit", "name") if option in options
+        }
+        with open(output_dir / "rebot.txt", "w", encoding="utf-8") as console:
+            return rebot(
+                *(str(run.output) for run in sorted(runs, key=lambda run: run.shard.number)),
+                merge=True,
+                outputdir=str(output_dir),
+                output=options.get("output", "output.xml"),
+                tagstatexclude=options["tagstatexclude"],
+                stdout=console,
+                stderr=console,
+                **merged,
+            )
+
+    def _record_durations(self, durations: TestDurations, output_xml: Path) -> None:
+        suite = ExecutionResult(str(output_xml)).suite
+        if self.options.get("testlevelsplit"):
+            items = _walk_tests(suite)
+        else:
+            items = [child for child in _walk_suites(suite) if child.tests]
+        durations.record(
+            {item.longname: item.elapsedtime for item in items if item.status != "SKIP"}
+        )
+        durations.save()
+
+
+def _walk_suites(suite):
+    yield suite
+    for child in suite.suites:
+        yield from _walk_suites(child)
+
+
+def _walk_tests(suite) -> list:
+    return [test for child in _walk_suites(suite) for test in child.tests]
@@ -1,8 +1,9 @@
 import json
 from pathlib import Path
-from typing import Dict, List, Optional, Union
+from typing import Dict, List, Optional, Tuple, Union
+from urllib.parse import quote, urlparse
 
-from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.core.exceptions import CumulusCIException, TaskOptionsError
 from cumulusci.core.source_transforms.transforms import (
     FindReplaceTransform, 
     FindReplaceSpec,
@@ -13,6 +14,36 @@ from cumulusci.tasks.salesforce.users.permsets import (
     AssignPermissionSetLicenses,
     AssignPermissionSetGroups,
 )
+from cumulusci.core.utils import process_bool_arg, process_list_arg
+
+from tasks.find_replace import CompiledReplacements
+
+# Kinds of permission the bulk mode can assign, in the order they are
+# inserted, with the option naming extra permissions of that kind.
+BULK_KINDS = (
+    (AssignPermissionSetLicenses, "permission_set_licenses"),
+    (AssignPermissionSets, "permission_sets"),
+    (AssignPermissionSetGroups, "permission_set_groups"),
+)
+
+# Options holding permission names that transforms apply to
+NAME_OPTIONS = ("api_names",) + tuple(option for _, option in BULK_KINDS)
+
+# Composite API limits: records per sObject collection, and collection or
+# query subrequests per composite call.
+COLLECTION_SIZE = 200
+COLLECTIONS_PER_COMPOSITE = 5
+
+
+def _soql_escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("'", "\\'")
+
+
+def _name_fields(kind: type) -> List[str]:
+    """The fields a kind of permission is named by: licenses go by their
+    DeveloperName or their PermissionSetLicenseKey."""
+    fields = kind.permission_name_field
+    return list(fields) if isinstance(fields, (list, tuple)) else [fields]
 
 
 class AssignPermissionSetsWithFindReplace(AssignPermissionSets):
@@ -33,6 +64,18 @@ class AssignPermissionSetsWithFindReplace(AssignPermissionSets):
                           patterns:
                               - find: "__PROJECT_NAME__"
                                 replace: $project_config.project__package__name
+
+    With bulk: True, permission sets, licenses and groups are assigned to
+    every user together, in a handful of composite API calls:
+
+        onboard_users:
+            class_path: tasks.permsets.AssignPermissionSetsWithFindReplace
+            options:
+                bulk: True
+                user_alias: alice,bob,carol
+                api_names: DeliveryHubUser
+                permission_set_licenses: SalesforceCPQ_CPQStandardPerm
+                permission_set_groups: DeliveryHubAdmin
     """
     
     task_options = {
@@ -41,20 +84,46 @@ class AssignPermissionSetsWithFindReplace(AssignPermissionSets):
             "description": "A list of transformations to apply to the permission sets.",
             "required": False,
         },
+        "bulk": {
+            "description": "Look up and assign everything in as few composite API calls as possible. "
+            "Combine with permission_sets, permission_set_licenses and permission_set_groups "
+            "to assign all three kinds to every user in user_alias in one run.",
+            "required": False,
+        },
+        "permission_sets": {
+            "description": "In bulk mode, Names of additional Permission Sets to assign, separated by commas.",
+            "required": False,
+        },
+        "permission_set_licenses": {
+            "description": "In bulk mode, Developer Names of additional Permission Set Licenses to assign, separated by commas.",
+            "required": False,
+        },
+        "permission_set_groups": {
+            "description": "In bulk mode, Developer Names of additional Permission Set Groups to assign, separated by commas.",
+            "required": False,
+        },
     }
     
     def _init_options(self, kwargs):
         super()._init_options(kwargs)
         # Process transforms if provided
         self.transforms = self.options.get("transforms", [])
+        self.bulk = process_bool_arg(self.options.get("bulk") or False)
+        for _, option in BULK_KINDS:
+            self.options[option] = process_list_arg(self.options.get(option) or [])
+            if self.options[option] and not self.bulk:
+                raise TaskOptionsError(f"The {option} option can only be used with bulk: True")
     
     def _run_task(self):
         # Process any transforms before running the standard task
         if self.transforms:
             self._apply_transforms()
         
-        # Run the standard permission set assignment
-        super()._run_task()
+        if self.bulk:
+            self._run_bulk()
+        else:
+            # Run the standard permission set assignment
+            super()._run_task()
     
     def _apply_transforms(self):
         """
@@ -76,38 +145,211 @@ class AssignPermissionSetsWithFindReplace(AssignPermissionSets):
     def _apply_find_replace(self, options):
         """
         Apply find_replace transform to permission set names.
+        
+        The patterns are resolved once, then applied in order to every name.
         """
-        patterns = options.get("patterns", [])
-        if not patterns:
+        replacements = CompiledReplacements(self._resolve_find_replace(options))
+        if not replacements:
             return
             
-        # Apply each pattern to the api_names
-        for i, api_name in enumerate(self.options["api_names"]):
-            for pattern in patterns:
-                find = pattern.get("find")
-                replace = pattern.get("replace")
-                
-                if find and replace:
-                    # Handle dynamic replacement with project config values
-                    if isinstance(replace, str) and replace.startswith("$project_config."):
-                        attr = replace.replace("$project_config.", "")
-                        parts = attr.split("__")
-                        value = self.project_config
-                        for part in parts:
-                            if hasattr(value, part):
-                                value = getattr(value, part)
-                            elif isinstance(value, dict) and part in value:
-                                value = value[part]
-                            else:
-                                value = None
-                                break
-                        if value:
-                            replace = value
-                    
-                    # Apply the replacement
-                    self.options["api_names"][i] = api_name.replace(find, str(replace))
+        for option in NAME_OPTIONS:
+            self.options[option] = [
+                replacements.replace_text(api_name) for api_name in self.options[option]
+            ]
                     
         self.logger.info(f"Transformed permission set names: {', '.join(self.options['api_names'])}")
+    
+    def _resolve_find_replace(self, options) -> List[Tuple[str, str]]:
+        """
+        Resolve find_replace patterns to (find, replace) pairs.
+        
+        Replacements of the form $project_config.attr__path are looked up on
+        the project config; a path that doesn't resolve is used literally.
+        """
+        pairs = []
+        for pattern in options.get("patterns", []):
+            find = pattern.get("find")
+            replace = pattern.get("replace")
+            
+            if find and replace:
+                # Handle dynamic replacement with project config values
+                if isinstance(replace, str) and replace.startswith("$project_config."):
+                    attr = replace.replace("$project_config.", "")
+                    value = self.project_config
+                    for part in attr.split("__"):
+                        if hasattr(value, part):
+                            value = getattr(value, part)
+                        elif isinstance(value, dict) and part in value:
+                            value = value[part]
+                        else:
+                            value = None
+                            break
+                    if value:
+                        replace = value
+                pairs.append((find, str(replace)))
+        return pairs
+    
+    def _names_by_kind(self) -> List[Tuple[type, List[str]]]:
+        """The names to assign for each kind of permission, in insert order."""
+        kinds = []
+        for kind, option in BULK_KINDS:
+            names = list(self.options[option])
+            if kind.permission_name == self.permission_name:
+                names = self.options["api_names"] + [
+                    name for name in names if name not in self.options["api_names"]
+                ]
+            if names:
+                kinds.append((kind, names))
+        return kinds
+    
+    def _run_bulk(self):
+        """
+        Assign every kind of permission to every user with the composite API.
+        
+        One composite call looks up the users, their existing assignments and
+        the permissions by name; the missing assignments are then inserted
+        COLLECTIONS_PER_COMPOSITE x COLLECTION_SIZE records per call.
+        Licenses are inserted first, since permission sets can depend on them.
+        """
+        kinds = self._names_by_kind()
+        
+        subrequests = [self._query_subrequest("users", self._users_query(kinds))]
+        for kind, names in kinds:
+            quoted = "','".join(_soql_escape(name) for name in names)
+            fields = _name_fields(kind)
+            subrequests.append(
+                self._query_subrequest(
+                    kind.permission_name,
+                    f"SELECT Id,{','.join(fields)} FROM {kind.permission_name} WHERE "
+                    + " OR ".join(f"{field} IN ('{quoted}')" for field in fields),
+                )
+            )
+        bodies = self._composite(subrequests)
+        
+        users = self._all_records(bodies["users"])
+        if not users:
+            raise CumulusCIException("No Users were found matching the specified aliases.")
+        
+        license_records = []
+        other_records = []
+        for kind, names in kinds:
+            fields = _name_fields(kind)
+            # Each permission by the name it was asked for, as the stock tasks do
+            perms_by_id = {
+                p["Id"]: next((p[field] for field in fields if p[field] in names), p[fields[0]])
+                for p in self._all_records(bodies[kind.permission_name])
+            }
+            missing_perms = [name for name in names if name not in perms_by_id.values()]
+            if missing_perms:
+                raise CumulusCIException(
+                    f"The following {kind.permission_label}s were not found: {', '.join(missing_perms)}."
+                )
+            
+            records = license_records if kind is AssignPermissionSetLicenses else other_records
+            for user in users:
+                assigned = {
+                    r[kind.assignment_lookup]
+                    for r in (user[kind.assignment_child_relationship] or {}).get("records", [])
+                    if r.get(kind.assignment_lookup)
+                }
+                for perm, perm_name in perms_by_id.items():
+                    if perm in assigned:
+                        self.logger.warning(
+                            f'{kind.permission_label} "{perm_name}" is already assigned to {user["Id"]}.'
+                        )
+                        continue
+                    self.logger.info(
+                        f'Assigning {kind.permission_label} "{perm_name}" to {user["Id"]}.'
+                    )
+                    records.append(
+                        {
+                            "attributes": {"type": kind.assignment_name},
+                            "AssigneeId": user["Id"],
+                            kind.assignment_lookup: perm,
+                        }
+                    )
+        
+        results = []
+        for records in (license_records, other_records):
+            results.extend(self._insert_bulk(records))
+        self._process_composite_results(results)
+    
+    def _users_query(self, kinds) -> str:
+        # Permission sets and groups share a child relationship; query it once
+        lookups = {}
+        for kind, _ in kinds:
+            lookups.setdefault(kind.assignment_child_relationship, []).append(kind.assignment_lookup)
+        subqueries = ",".join(
+            f"(SELECT {','.join(fields)} FROM {relationship})"
+            for relationship, fields in lookups.items()
+        )
+        if self.options["user_alias"]:
+            aliases = "','".join(_soql_escape(alias) for alias in self.options["user_alias"])
+            where = f"Alias IN ('{aliases}')"
+        else:
+            where = f"Username = '{_soql_escape(self.org_config.username)}'"
+        return f"SELECT Id,{subqueries} FROM User WHERE {where}"
+    
+    def _api_path(self) -> str:
+        """The REST API path (/services/data/vXX.X) that subrequest URLs start with."""
+        return urlparse(self.sf.base_url).path.rstrip("/")
+    
+    def _query_subrequest(self, reference_id: str, soql: str) -> Dict:
+        return {
+            "method": "GET",
+            "url": f"{self._api_path()}/query?q={quote(soql)}",
+            "referenceId": reference_id,
+        }
+    
+    def _composite(self, subrequests: List[Dict]) -> Dict[str, Union[Dict, List]]:
+        """
+        Send subrequests in one composite API call; returns bodies by referenceId.
+        """
+        response = self.sf.restful(
+            "composite",
+            method="POST",
+            data=json.dumps({"allOrNone": False, "compositeRequest": subrequests}),
+        )
+        bodies = {}
+        for result in response["compositeResponse"]:
+            body = result["body"]
+            if result["httpStatusCode"] >= 400:
+                message = body[0].get("message") if isinstance(body, list) and body else body
+                raise CumulusCIException(
+                    f"Composite subrequest {result['referenceId']} failed: {message}"
+                )
+            bodies[result["referenceId"]] = body
+        return bodies
+    
+    def _all_records(self, body: Dict) -> List[Dict]:
+        records = list(body["records"])
+        while not body.get("done", True):
+            body = self.sf.query_more(body["nextRecordsUrl"], identifier_is_url=True)
+            records.extend(body["records"])
+        return records
+    
+    def _insert_bulk(self, records: List[Dict]) -> List[Dict]:
+        """Insert records as sObject collections, several per composite call."""
+        batches = [
+            records[i : i + COLLECTION_SIZE] for i in range(0, len(records), COLLECTION_SIZE)
+        ]
+        results = []
+        for i in range(0, len(batches), COLLECTIONS_PER_COMPOSITE):
+            group = batches[i : i + COLLECTIONS_PER_COMPOSITE]
+            bodies = self._composite(
+                [
+                    {
+                        "method": "POST",
+                        "url": f"{self._api_path()}/composite/sobjects",
+                        "referenceId": f"insert{j}",
+                        "body": {"allOrNone": False, "records": batch},
+                    }
+                    for j, batch in enumerate(group)
+                ]
+            )
+            for j in range(len(group)):
+                results.extend(bodies[f"insert{j}"])
+        return results
 
 
 class AssignPermissionSetLicensesWithFindReplace(AssignPermissionSetsWithFindReplace, AssignPermissionSetLicenses):
@@ -121,4 +363,4 @@ class AssignPermissionSetGroupsWithFindReplace(AssignPermissionSetsWithFindRepla
     """
     Extends the standard AssignPermissionSetGroups task to add find_replace functionality.
     """
-    pass 
\ No newline at end of file
+    pass
@@ -1,14 +1,90 @@
-from cumulusci.tasks.salesforce.sourcetracking import RetrieveChanges
-from cumulusci.utils import process_text_in_directory
+from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.salesforce_api.metadata import ApiRetrieveUnpackaged
+from cumulusci.tasks.salesforce.sourcetracking import (
+    KNOWN_BAD_MD_TYPES,
+    RetrieveChanges,
+    retrieve_components,
+)
+from collections import defaultdict
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+import contextlib
 import os
-import re
+import time
+
+from tasks.deploy_manifest import DeployManifest, component_hash
+from tasks.find_replace import CompiledReplacements
+from tasks.metadata_index import MetadataIndex, source_component
+from tasks.package_xml import PackageXml
+from tasks.source_format import (
+    DEFAULT_IGNORE_PATTERNS,
+    is_ignored,
+    read_forceignore,
+    retrieved_objects,
+    source_files,
+    writes_as_source,
+)
+from tasks.file_utils import write_atomic
+
+# Tokens deploys resolve to a value a retrieve can recognize and put back.
+PRESERVABLE_TOKENS = ("%%%CURRENT_USER%%%",)
+
+
+def map_bounded(pool, fn, items, limit):
+    """Like pool.map, but with at most ``limit`` calls queued or running.
+
+    Results are yielded as they complete rather than in order, and items
+    are only pulled from ``items`` as slots free up.
+    """
+    pending = set()
+    for item in items:
+        if len(pending) >= limit:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                yield future.result()
+        pending.add(pool.submit(fn, item))
+    while pending:
+        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+        for future in done:
+            yield future.result()
+
+
+def _is_text(content: bytes) -> bool:
+    try:
+        content.decode("utf-8")
+    except UnicodeDecodeError:
+        return False
+    return True
+
 
 class RetrieveChanges(RetrieveChanges):
-    """Retrieves changed components from a scratch org while preserving specified tokens."""
+    """Retrieves changed components from a scratch org while preserving specified tokens.
+
+    Into a source-format package directory, the components whose source
+    tracking revision moved since the last retrieve are fetched with one
+    Metadata API retrieve and written straight from the zip: tokens are put
+    back as each file is extracted, objects are split into their field,
+    list view... files, and only files whose content differs are written.
+    Alongside the revision snapshot, a hash of each component as it was
+    written is kept (.cci/snapshot/<org>.hashes.json); a component whose
+    revision moved but whose content didn't (e.g. after a deploy) is left
+    alone.  Files matched by .forceignore are left out, as sfdx would.
+    Types that sfdx lays out according to what's already on disk (labels,
+    static resources...), complete profiles, metadata-format directories
+    and retrieves that tokenize a namespace are retrieved with sfdx as before.
+
+    _run_task() follows the stock task's flow (snapshot, changes, filter,
+    store) through its private methods, as of CumulusCI 3.90.
+    """
 
     task_options = RetrieveChanges.task_options.copy()
     task_options["preserve_tokens"] = {
-        "description": "Comma-separated list of tokens to preserve (e.g. __PROJECT_NAME__,__PROJECT_LABEL__)",
+        "description": "Comma-separated list of tokens to put back in place of their deployed values. "
+        "Only %%%CURRENT_USER%%% (the org's username) is supported.",
+        "required": False,
+    }
+    task_options["workers"] = {
+        "description": "Number of files to post-process in parallel. Defaults to the number of CPUs plus 4, up to 32.",
         "required": False,
     }
 
@@ -17,45 +93,281 @@ class RetrieveChanges(RetrieveChanges):
         self.tokens_to_preserve = []
         if "preserve_tokens" in self.options:
             self.tokens_to_preserve = [
-                token.strip() for token in self.options["preserve_tokens"].split(",")
+                token.strip() for token in self.options["preserve_tokens"].split(",") if token.strip()
             ]
+        unsupported = [token for token in self.tokens_to_preserve if token not in PRESERVABLE_TOKENS]
+        if unsupported:
+            raise TaskOptionsError(
+                f"preserve_tokens can't preserve {', '.join(unsupported)}: "
+                f"supported tokens are {', '.join(PRESERVABLE_TOKENS)}"
+            )
+        try:
+            self.workers = int(self.options.get("workers") or min(32, (os.cpu_count() or 1) + 4))
+        except ValueError:
+            raise TaskOptionsError(f"workers must be a number: {self.options['workers']}")
+        if self.workers < 1:
+            raise TaskOptionsError(f"workers must be at least 1: {self.workers}")
+
+    def _get_metadata_index(self):
+        return MetadataIndex(
+            self.project_config.cache_dir / "metadata_index.sqlite", self.options["path"]
+        )
+
+    @property
+    @contextlib.contextmanager
+    def _hashes_file(self):
+        with self.project_config.open_cache("snapshot") as parent_dir:
+            yield parent_dir / f"{self.org_config.name}.hashes.json"
+
+    def _source_root(self) -> Path:
+        """Where new source-format components go: main/default, as sfdx puts them."""
+        path = Path(self.options["path"])
+        default = path / "main" / "default"
+        return default if default.is_dir() or not path.exists() else path
 
     def _run_task(self):
-        # Run the standard retrieve
-        super()._run_task()
+        self._load_snapshot()
+        self.logger.info("Querying Salesforce for changed source members")
+        changes = self._get_changes()
+        filtered, ignored = self._filter_changes(changes)
+        if not filtered:
+            self.logger.info("No changes to retrieve")
+            return
+        for change in filtered:
+            self.logger.info("{MemberType}: {MemberName}".format(**change))
+
+        with_sfdx = filtered
+        extracted = []
+        if not self.md_format and not self.options.get("namespace_tokenize"):
+            extracted = [change for change in filtered if self._extracts(change["MemberType"])]
+            with_sfdx = [change for change in filtered if not self._extracts(change["MemberType"])]
+
+        timings = {}
+        hashes = new_hashes = None
+        with self._get_metadata_index() as index:
+            if extracted:
+                with self._hashes_file as path:
+                    hashes = DeployManifest(path)
+                new_hashes = self._retrieve_and_extract(extracted, index, hashes, timings)
+            if with_sfdx:
+                self._retrieve_with_sfdx(with_sfdx, index, timings)
+        self.logger.info(
+            "Timings: " + ", ".join(f"{phase} {seconds:.2f}s" for phase, seconds in timings.items())
+        )
+
+        if self.options["snapshot"]:
+            self.logger.info("Storing snapshot of changes")
+            self._store_snapshot(filtered)
+            if hashes is not None:
+                hashes.record(new_hashes)
+
+            if not ignored:
+                # If all changed components were retrieved,
+                # we can reset sfdx source tracking too
+                self._reset_sfdx_snapshot()
 
-        # If we have tokens to preserve and the retrieve was successful
+    def _extracts(self, mdtype: str) -> bool:
+        """Whether changed components of a type are written from the zip
+        rather than retrieved with sfdx."""
+        if mdtype == "Profile" and self.options["retrieve_complete_profile"]:
+            return False
+        return writes_as_source(mdtype)
+
+    def _package_xml(self, changes) -> str:
+        """package.xml for the changes, as sfdx's retrieve would build it."""
+        package = PackageXml(version=str(self.options["api_version"]))
+        for change in changes:
+            mdtype = change["MemberType"]
+            if mdtype in KNOWN_BAD_MD_TYPES:
+                continue
+            # Folders are retrieved along with their contained type
+            if mdtype.endswith("Folder"):
+                mdtype = mdtype[: -len("Folder")]
+            package.add(mdtype, change["MemberName"])
+        return package.tobytes().decode("utf-8")
+
+    def _retrieve_and_extract(self, changes, index, hashes, timings):
+        """Retrieve components with the Metadata API and write them as source.
+
+        Tokens are preserved in each file as it comes out of the zip, so
+        nothing is written twice, and nothing outside the retrieved
+        components is read.  Files .forceignore matches are neither written
+        nor hashed.  Returns the hash of each retrieved component.
+        """
+        start = time.perf_counter()
+        zf = ApiRetrieveUnpackaged(self, self._package_xml(changes), self.options["api_version"])()
+        timings["retrieve"] = time.perf_counter() - start
+
+        start = time.perf_counter()
+        replacements = self._token_replacements()
+        root = self._source_root()
+        relative = root.relative_to(self.options["path"]).as_posix()
+        prefix = "" if relative == "." else f"{relative}/"
+        ignore = [
+            *DEFAULT_IGNORE_PATTERNS,
+            *read_forceignore(Path(self.project_config.repo_root or ".", ".forceignore")),
+        ]
+        ignored = 0
+        objects = retrieved_objects((change["MemberType"], change["MemberName"]) for change in changes)
+        components = defaultdict(list)
+        preserved = 0
+        for info in zf.infolist():
+            if info.is_dir() or info.filename == "package.xml":
+                continue
+            name = info.filename
+            content = zf.read(info)
+            if replacements:
+                new_name = replacements.replace_text(name)
+                new_content = content
+                if replacements.matches_bytes(content) and _is_text(content):
+                    new_content = replacements.replace_bytes(content)
+                if new_name is not name or new_content is not content:
+                    preserved += 1
+                name, content = new_name, new_content
+            for path, data in source_files(name, content, objects):
+                if is_ignored(prefix + path, ignore):
+                    ignored += 1
+                    continue
+                mdtype, _, member = source_component(path.split("/"))
+                components[f"{mdtype}:{member}"].append((path, data))
+
+        new_hashes = {}
+        writes = []
+        unchanged = 0
+        for key, files in components.items():
+            files.sort()
+            new_hashes[key] = component_hash(files)
+            paths = [(root / path).as_posix() for path, _ in files]
+            if hashes.hashes.get(key) == new_hashes[key] and all(os.path.isfile(path) for path in paths):
+                unchanged += 1
+                continue
+            writes.extend(zip(paths, (data for _, data in files)))
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = map_bounded(
+                pool, lambda item: self._write_if_changed(*item), writes, limit=2 * self.workers
+            )
+            written = [path for path in results if path is not None]
+        if written:
+            index.refresh(written)
+        timings["extract"] = time.perf_counter() - start
+        self.logger.info(
+            f"Wrote {len(written)} of {sum(len(files) for files in components.values())} retrieved files "
+            f"({unchanged} of {len(components)} components unchanged since the last retrieve); "
+            f"preserved tokens in {preserved}"
+        )
+        if ignored:
+            self.logger.info(f"Skipped {ignored} retrieved files matched by .forceignore")
+        return new_hashes
+
+    @staticmethod
+    def _write_if_changed(path, data):
+        """Write a retrieved file unless it's already on disk as is; returns its path if written."""
+        try:
+            with open(path, "rb") as f:
+                if f.read() == data:
+                    return None
+        except OSError:
+            pass
+        write_atomic(path, data)
+        return path
+
+    def _retrieve_with_sfdx(self, changes, index, timings):
+        """Retrieve components with sfdx, then preserve tokens in what it wrote."""
+        # Bring the index up to date first, so that refreshing it after the
+        # retrieve reports exactly the files the retrieve wrote.
         if self.tokens_to_preserve and os.path.exists(self.options["path"]):
-            self._preserve_tokens()
-
-    def _preserve_tokens(self):
-        """Process files to preserve specified tokens"""
-        def process_file(filename, content):
-            # Store original tokens and their values
-            token_values = {}
-            for token in self.tokens_to_preserve:
-                # Create a pattern that matches the token in filenames
-                token_in_name = re.search(re.escape(token), filename)
-                if token_in_name:
-                    # Store the resolved value
-                    resolved_part = filename[token_in_name.start():token_in_name.end()]
-                    token_values[resolved_part] = token
-
-                # Create a pattern that matches the token in content
-                token_in_content = re.search(re.escape(token), content)
-                if token_in_content:
-                    # Store the resolved value
-                    resolved_part = content[token_in_content.start():token_in_content.end()]
-                    token_values[resolved_part] = token
-
-            # Replace resolved values back with tokens
-            new_content = content
-            new_name = filename
-            for resolved, token in token_values.items():
-                new_content = new_content.replace(resolved, token)
-                new_name = new_name.replace(resolved, token)
-
-            return new_name, new_content
-
-        # Process all files in the directory
-        process_text_in_directory(self.options["path"], process_file) 
\ No newline at end of file
+            index.refresh()
+
+        package_xml_opts = {}
+        if self.options["path"] == "src":
+            package_xml_opts.update(
+                {
+                    "package_name": self.project_config.project__package__name,
+                    "install_class": self.project_config.project__package__install_class,
+                    "uninstall_class": self.project_config.project__package__uninstall_class,
+                }
+            )
+        start = time.perf_counter()
+        retrieve_components(
+            changes,
+            self.org_config,
+            os.path.realpath(self.options["path"]),
+            md_format=self.md_format,
+            namespace_tokenize=self.options.get("namespace_tokenize"),
+            api_version=self.options["api_version"],
+            extra_package_xml_opts=package_xml_opts,
+            project_config=self.project_config,
+            retrieve_complete_profile=self.options["retrieve_complete_profile"],
+        )
+        timings["sfdx retrieve"] = time.perf_counter() - start
+
+        # If the retrieve was successful, preserve tokens in what it changed
+        if self.tokens_to_preserve and os.path.exists(self.options["path"]):
+            start = time.perf_counter()
+            changed = index.refresh().changed
+            timings["scan"] = time.perf_counter() - start
+
+            start = time.perf_counter()
+            rewritten = self._preserve_tokens(changed)
+            if rewritten:
+                index.refresh()
+            timings["rewrite"] = time.perf_counter() - start
+            self.logger.info(
+                f"Preserved tokens in {len(rewritten)} of {len(changed)} retrieved files"
+            )
+
+    def _token_replacements(self):
+        """Compile (resolved value -> token) pairs for the tokens we can resolve.
+
+        Deploys replace %%%CURRENT_USER%%% with the org's username, so that is
+        what a retrieve brings back.  Tokens still present verbatim need no
+        work; _init_options() rejects tokens not in PRESERVABLE_TOKENS.
+        """
+        resolved = {"%%%CURRENT_USER%%%": getattr(self.org_config, "username", None)}
+        pairs = []
+        for token in self.tokens_to_preserve:
+            value = resolved.get(token)
+            if value and value != token:
+                pairs.append((value, token))
+        return CompiledReplacements(pairs)
+
+    def _preserve_tokens(self, paths):
+        """Put tokens back in place of their resolved values in the given files.
+
+        Every token is found in a single precompiled scan; files where it
+        finds nothing are neither decoded nor rewritten.  Files are handled
+        by a pool of ``workers`` threads and written atomically, so an
+        interrupted run never leaves a half-written file behind.
+        """
+        replacements = self._token_replacements()
+        if not replacements:
+            return []
+
+        with ThreadPoolExecutor(max_workers=self.workers) as pool:
+            results = map_bounded(
+                pool,
+                lambda path: self._preserve_tokens_in_file(path, replacements),
+                paths,
+                limit=2 * self.workers,
+            )
+            return [path for path in results if path is not None]
+
+    def _preserve_tokens_in_file(self, orig_path, replacements):
+        """Rewrite one file if it contains resolved tokens; returns its new path."""
+        with open(orig_path, "rb") as f:
+            orig_content = f.read()
+        directory, orig_name = os.path.split(orig_path)
+        new_name = replacements.replace_text(orig_name)
+        new_content = orig_content
+        # Binary files keep their content
+        if replacements.matches_bytes(orig_content) and _is_text(orig_content):
+            new_content = replacements.replace_bytes(orig_content)
+        if new_name is orig_name and new_content is orig_content:
+            return None
+
+        new_path = os.path.join(directory, new_name)
+        write_atomic(new_path, new_content, mode=os.stat(orig_path).st_mode & 0o7777)
+        if new_path != orig_path:
+            os.unlink(orig_path)
+        return new_path
@@ -0,0 +1,235 @@
+import copy
+import heapq
+import json
+import statistics
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Dict, Iterable, List, NamedTuple
+
+from cumulusci.core.exceptions import ApexTestException, TaskOptionsError
+from cumulusci.core.utils import process_list_arg
+from cumulusci.tasks.apex.testrunner import RunApexTests
+
+from tasks.file_utils import write_atomic
+from tasks.task_logging import PrefixedLogger
+
+# Assumed duration of a class with no history, when there is no history at all.
+DEFAULT_CLASS_MS = 5000
+
+# Weight of the latest run in a class's remembered duration.
+DURATION_WEIGHT = 0.5
+
+
+class TestDurations:
+    """Per-class Apex test durations from past runs, in milliseconds.
+
+    Kept as a JSON file of {class name: ms}.  Each run's duration is blended
+    into the stored one, so a single slow run doesn't skew the next plan.
+    """
+
+    def __init__(self, path):
+        self.path = Path(path)
+        try:
+            self.durations: Dict[str, float] = json.loads(self.path.read_text("utf-8"))
+        except (OSError, ValueError):
+            self.durations = {}
+
+    def estimate(self, class_name: str) -> float:
+        if class_name in self.durations:
+            return self.durations[class_name]
+        if self.durations:
+            return statistics.median(self.durations.values())
+        return DEFAULT_CLASS_MS
+
+    def record(self, durations: Dict[str, float]) -> None:
+        for class_name, ms in durations.items():
+            previous = self.durations.get(class_name)
+            self.durations[class_name] = (
+                ms if previous is None else previous + DURATION_WEIGHT * (ms - previous)
+            )
+
+    def save(self) -> None:
+        write_atomic(
+            self.path, json.dumps(self.durations, indent=1, sort_keys=True).encode("utf-8")
+        )
+
+
+class Shard(NamedTuple):
+    number: int
+    classes: List[str]
+    expected_ms: float
+
+
+def plan_shards(class_names: Iterable[str], durations: TestDurations, count: int) -> List[Shard]:
+    """Split test classes into at most ``count`` shards of similar expected duration.
+
+    Longest classes first, each to the shard with the least work so far.
+    """
+    heap = [(0.0, number, []) for number in range(1, count + 1)]
+    for class_name in sorted(class_names, key=lambda name: (-durations.estimate(name), name)):
+        total, number, classes = heapq.heappop(heap)
+        classes.append(class_name)
+        heapq.heappush(heap, (total + durations.estimate(class_name), number, classes))
+    return sorted(
+        (Shard(number, classes, total) for total, number, classes in heap if classes),
+        key=lambda shard: shard.number,
+    )
+
+
+class ShardedApexTests(RunApexTests):
+    """Runs Apex test classes in parallel shards balanced by past durations.
+
+    The classes are split into ``shards`` groups of about equal expected run
+    time, using per-class durations recorded by earlier runs, and each group
+    is enqueued as its own test run.  Failures are retried (per
+    retry_failures and retry_always, as in run_tests) within the shard they
+    happened in, without waiting for the other shards.  Results from every
+    shard are merged into one report (the usual junit and json output), and
+    code coverage is checked once all shards are done, so
+    required_org_code_coverage_percent applies to the combined run.
+
+    With test_suite_names, the classes come from those Apex test suites
+    rather than from test_name_match.
+    """
+
+    task_options = {
+        **RunApexTests.task_options,
+        "test_suite_names": {
+            "description": "Names of Apex test suites whose classes to run, separated by commas.  "
+            "Replaces test_name_match when given."
+        },
+        "shards": {"description": "How many shards to run at the same time.  Defaults to 4."},
+        "durations_path": {
+            "description": "JSON file of per-class test durations used to balance shards, and "
+            "updated after every run.  Defaults to .cci/apex_test_durations.json."
+        },
+    }
+    task_options["test_name_match"] = {
+        **RunApexTests.task_options["test_name_match"],
+        "required": False,
+    }
+
+    def _init_options(self, kwargs):
+        super()._init_options(kwargs)
+        self.options["test_suite_names"] = process_list_arg(self.options.get("test_suite_names") or [])
+        if not self.options["test_suite_names"] and not self.options["test_name_match"]:
+            raise TaskOptionsError("Either test_suite_names or test_name_match is required.")
+        try:
+            self.shard_count = int(self.options.get("shards", 4))
+        except ValueError:
+            raise TaskOptionsError("The shards option must be a number.")
+        if self.shard_count < 1:
+            raise TaskOptionsError("The shards option must be at least 1.")
+
+    def _get_durations(self) -> TestDurations:
+        path = self.options.get("durations_path")
+        return TestDurations(
+            path or Path(self.project_config.cache_dir, "apex_test_durations.json")
+        )
+
+    def _get_test_classes(self):
+        suites = self.options["test_suite_names"]
+        if not suites:
+            return super()._get_test_classes()
+        names = ",".join("'{}'".format(suite.replace("'", "\\'")) for suite in suites)
+        query = (
+            "SELECT ApexClassId, ApexClass.Name FROM TestSuiteMembership "
+            f"WHERE ApexTestSuite.TestSuiteName IN ({names})"
+        )
+        self.logger.info(f"Running query: {query}")
+        classes = {
+            record["ApexClassId"]: record["ApexClass"]["Name"]
+            for record in self.tooling.query_all(query)["records"]
+        }
+        self.logger.info(f"Found {len(classes)} test classes in {', '.join(suites)}")
+        return {
+            "totalSize": len(classes),
+            "records": [{"Id": class_id, "Name": name} for class_id, name in classes.items()],
+        }
+
+    def _run_task(self):
+        result = self._get_test_classes()
+        if result["totalSize"] == 0:
+            return
+        for test_class in result["records"]:
+            self.classes_by_id[test_class["Id"]] = test_class["Name"]
+            self.classes_by_name[test_class["Name"]] = test_class["Id"]
+            self.results_by_class_name[test_class["Name"]] = {}
+        self.counts = {"Pass": 0, "Fail": 0, "CompileFail": 0, "Skip": 0, "Retriable": 0}
+
+        durations = self._get_durations()
+        shards = plan_shards(self.classes_by_name, durations, self.shard_count)
+        for shard in shards:
+            self.logger.info(
+                f"Shard {shard.number}: {len(shard.classes)} classes, "
+                f"about {shard.expected_ms / 1000:.0f}s"
+            )
+        self.logger.info("Queuing tests for execution...")
+
+        with ThreadPoolExecutor(max_workers=len(shards), thread_name_prefix="shard") as pool:
+            runs = list(pool.map(self._run_shard, shards))
+
+        for shard, run in zip(shards, runs):
+            self.results_by_class_name.update(run.results_by_class_name)
+            for outcome, count in run.counts.items():
+                self.counts[outcome] += count
+            self.logger.info(
+                f"Shard {shard.number} finished in {run.elapsed:.0f}s "
+                f"(expected {shard.expected_ms / 1000:.0f}s)"
+            )
+
+        durations.record(
+            {
+                class_name: sum(result.get("RunTime") or 0 for result in results.values())
+                for class_name, results in self.results_by_class_name.items()
+                if results
+            }
+        )
+        durations.save()
+
+        test_results = self._process_test_results()
+        self._write_output(test_results)
+
+        if self.counts.get("Fail") or self.counts.get("CompileFail"):
+            raise ApexTestException(
+                "{} tests failed and {} tests failed compilation".format(
+                    self.counts.get("Fail"), self.counts.get("CompileFail")
+                )
+            )
+
+        if self.code_coverage_level or self.required_per_class_code_coverage_percent:
+            if self.options.get("namespace") not in self.org_config.installed_packages:
+                self._check_code_coverage()
+            else:
+                self.logger.info(
+                    "This org contains a managed installation; not checking code coverage."
+                )
+        else:
+            self.logger.info("No code coverage level specified; not checking code coverage.")
+
+    def _run_shard(self, shard: Shard) -> "ShardedApexTests":
+        """Run one shard, with its retries, on a copy of this task; returns the copy."""
+        run = copy.copy(self)
+        run.logger = PrefixedLogger(self.logger, {"prefix": f"shard {shard.number}"})
+        run.results_by_class_name = {class_name: {} for class_name in shard.classes}
+        run.counts = dict.fromkeys(self.counts, 0)
+        run.retry_details = None
+        run.poll_interval_level = 0
+
+        started = time.monotonic()
+        run.job_id = run._enqueue_test_run(
+            self.classes_by_name[class_name] for class_name in shard.classes
+        )
+        run._wait_for_tests()
+        run._get_test_results()
+
+        able_to_retry = (run.counts["Retriable"] and self.options["retry_always"]) or (
+            run.counts["Retriable"] and run.counts["Retriable"] == run.counts["Fail"]
+        )
+        if able_to_retry:
+            run._attempt_retries()
+        else:
+            run.counts["Retriable"] = 0
+        run.elapsed = time.monotonic() - started
+        return run
@@ -0,0 +1,242 @@
+import io
+import os
+import zipfile
+from collections import defaultdict
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from pathlib import Path
+from typing import Dict, Iterable, Iterator, List, NamedTuple, Optional, Set, Tuple
+
+from tasks.deploy_manifest import BUNDLE_DIRECTORIES, METADATA_DIRECTORIES, component_for_path
+from tasks.member_content import member_info
+from tasks.metadata_index import OBJECT_CHILD_DIRECTORIES
+from tasks.package_xml import PackageXml
+from tasks.source_format import (
+    DEFAULT_IGNORE_PATTERNS,
+    OBJECT_CHILD_SUFFIXES,
+    SFDX_CONVERT_DIRECTORIES,
+    in_bundle,
+    is_ignored,
+    mdapi_name,
+    object_file,
+)
+
+# Source files converted by one worker at a time: enough to outweigh handing
+# the batch to another process, few enough to spread a tree across them.
+DEFAULT_BATCH_FILES = 200
+
+
+class UnsupportedSource(Exception):
+    """A source tree with files plan_conversion() can't convert, left to sfdx."""
+
+
+class ConvertJob(NamedTuple):
+    """One file of the MDAPI package and the source files it is made from.
+
+    ``kind`` is "copy" (one source file), "object" (an object's own file
+    and its children, in order) or "resource" (the files of a static
+    resource directory, zipped).
+    """
+
+    name: str
+    kind: str
+    sources: Tuple[str, ...]
+
+
+class ConversionPlan(NamedTuple):
+    root: str
+    batches: List[List[ConvertJob]]
+    package: PackageXml
+    # MDAPI files that more than one source file converts to
+    duplicates: List[str]
+
+    @property
+    def files(self) -> int:
+        return sum(len(job.sources) for batch in self.batches for job in batch)
+
+
+def source_tree_files(root: Path, ignore_patterns: Iterable[str] = ()) -> List[str]:
+    """The files of a source tree, relative to it and sorted, less those sfdx
+    ignores by default or as told in .forceignore."""
+    patterns = [*DEFAULT_IGNORE_PATTERNS, *ignore_patterns]
+    files = []
+    for dirpath, dirnames, filenames in os.walk(root):
+        relative = Path(dirpath).relative_to(root).as_posix()
+        prefix = "" if relative == "." else f"{relative}/"
+        dirnames[:] = sorted(name for name in dirnames if not is_ignored(prefix + name, patterns))
+        files.extend(prefix + name for name in sorted(filenames) if not is_ignored(prefix + name, patterns))
+    return sorted(files)
+
+
+def _metadata_directory(parts: List[str]) -> Optional[int]:
+    """The index of the metadata directory a file is in (the first part of its
+    path that is one), if any."""
+    for i, part in enumerate(parts[:-1]):
+        if part in METADATA_DIRECTORIES:
+            return i
+    return None
+
+
+def _resource_jobs(base: str, entries: List[str]) -> Iterator[Tuple[ConvertJob, str]]:
+    """(job, member) for the static resources in one staticresources directory,
+    given the paths of the files in it.
+
+    As sfdx does, a resource's content is the first entry of the directory,
+    by name, whose name up to its first dot is the resource's: a file, copied
+    as is, or a directory, zipped.
+    """
+    top = sorted({entry.split("/", 1)[0] for entry in entries})
+    for meta in top:
+        if not meta.endswith(".resource-meta.xml"):
+            continue
+        name = meta[: -len(".resource-meta.xml")]
+        content = next(
+            (entry for entry in top if not entry.endswith("-meta.xml") and entry.split(".", 1)[0] == name),
+            None,
+        )
+        if content is None:
+            raise UnsupportedSource(f"static resource {name} has no content next to its -meta.xml")
+        yield ConvertJob(f"staticresources/{meta}", "copy", (f"{base}/{meta}",)), name
+        inside = [f"{base}/{entry}" for entry in entries if entry.startswith(f"{content}/")]
+        if inside:
+            yield ConvertJob(f"staticresources/{name}.resource", "resource", (f"{base}/{content}", *inside)), name
+        else:
+            yield ConvertJob(f"staticresources/{name}.resource", "copy", (f"{base}/{content}",)), name
+
+
+def plan_conversion(
+    root: Path,
+    version: str,
+    ignore_patterns: Iterable[str] = (),
+    batch_files: int = DEFAULT_BATCH_FILES,
+) -> ConversionPlan:
+    """Work out the MDAPI package for a source-format tree: its files, in
+    batches for convert_batch(), and its package.xml.
+
+    Files outside metadata directories (Jest mocks...) are skipped, as are
+    CustomIndex files, which sfdx converts into components Salesforce manages
+    itself.  Where package directories hold the same component, the last one
+    by path wins, as it does when sfdx writes them in turn.  Raises
+    UnsupportedSource for anything that only sfdx converts.
+    """
+    objects: Dict[str, List] = defaultdict(lambda: [None, []])
+    resources: Dict[str, List[str]] = defaultdict(list)
+    jobs: List[ConvertJob] = []
+    members: Set[Tuple[str, str]] = set()
+    duplicates: List[str] = []
+
+    for relpath in source_tree_files(root, ignore_patterns):
+        parts = relpath.split("/")
+        index = _metadata_directory(parts)
+        if index is None:
+            if relpath.endswith("-meta.xml"):
+                raise UnsupportedSource(f"{relpath} is outside the metadata directories")
+            continue
+        directory, rest = parts[index], parts[index + 1 :]
+        if directory == "customindex":
+            continue
+        if directory in SFDX_CONVERT_DIRECTORIES:
+            raise UnsupportedSource(f"{relpath} is merged with other files by sfdx")
+        if directory == "staticresources":
+            resources["/".join(parts[: index + 1])].append("/".join(rest))
+            continue
+        if directory == "objects":
+            obj = rest[0]
+            if len(rest) == 2 and rest[1] == f"{obj}.object-meta.xml":
+                if objects[obj][0] is not None:
+                    duplicates.append(f"objects/{obj}.object")
+                objects[obj][0] = relpath
+                members.add(("CustomObject", obj))
+                continue
+            suffix = OBJECT_CHILD_SUFFIXES.get(rest[1]) if len(rest) == 3 else None
+            if suffix is None or not rest[2].endswith(f".{suffix}-meta.xml"):
+                raise UnsupportedSource(f"{relpath} isn't an object or a part of one this converter knows")
+            objects[obj][1].append((rest[1], rest[2], relpath))
+            members.add((OBJECT_CHILD_DIRECTORIES[rest[1]], f"{obj}.{rest[2][: -len(f'.{suffix}-meta.xml')]}"))
+            continue
+        inner = "/".join(rest)
+        if directory in BUNDLE_DIRECTORIES and (len(rest) < 2 or not in_bundle(directory, inner)):
+            continue
+        name = mdapi_name(directory, inner)
+        if name is None:
+            raise UnsupportedSource(f"{relpath} isn't a file this converter knows")
+        jobs.append(ConvertJob(name, "copy", (relpath,)))
+        members.add(component_for_path(name))
+
+    for obj, (own, children) in objects.items():
+        # Children in the order sfdx composes them: by subdirectory, then file
+        sources = ([own] if own else []) + [relpath for _, _, relpath in sorted(children)]
+        jobs.append(ConvertJob(f"objects/{obj}.object", "object", tuple(sources)))
+    for base, entries in resources.items():
+        for job, member in _resource_jobs(base, entries):
+            jobs.append(job)
+            members.add(("StaticResource", member))
+
+    unique: Dict[str, ConvertJob] = {}
+    for job in sorted(jobs):
+        if job.name in unique:
+            duplicates.append(job.name)
+        unique[job.name] = job
+
+    package = PackageXml(version=version)
+    for mdtype, member in sorted(members):
+        package.add(mdtype, member)
+
+    batches: List[List[ConvertJob]] = []
+    size = batch_files
+    for job in unique.values():
+        if size >= batch_files:
+            batches.append([])
+            size = 0
+        batches[-1].append(job)
+        size += len(job.sources)
+    return ConversionPlan(str(root), batches, package, sorted(set(duplicates)))
+
+
+def _zip_resource(root: Path, base: str, files: Iterable[str]) -> bytes:
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for relpath in sorted(files):
+            name, content = relpath[len(base) + 1 :], (root / relpath).read_bytes()
+            zf.writestr(member_info(name, content), content)
+    return buffer.getvalue()
+
+
+def convert_job(root: Path, job: ConvertJob) -> bytes:
+    """The content of one file of the MDAPI package."""
+    if job.kind == "object":
+        own = job.sources[0] if job.sources[0].endswith(".object-meta.xml") else None
+        children = [
+            (relpath.split("/")[-2], (root / relpath).read_bytes())
+            for relpath in job.sources
+            if relpath != own
+        ]
+        return object_file((root / own).read_bytes() if own else None, children)
+    if job.kind == "resource":
+        return _zip_resource(root, job.sources[0], job.sources[1:])
+    return (root / job.sources[0]).read_bytes()
+
+
+def convert_batch(root: str, jobs: List[ConvertJob]) -> bytes:
+    """Convert a batch of jobs into a zip of their MDAPI files.
+
+    Runs in worker processes, so it takes and returns plain data; the zip's
+    members are already compressed for merging into the package as they are.
+    """
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w") as zf:
+        for job in jobs:
+            content = convert_job(Path(root), job)
+            zf.writestr(member_info(job.name, content), content)
+    return buffer.getvalue()
+
+
+def convert_source(plan: ConversionPlan, workers: int = 1) -> Iterator[bytes]:
+    """Zips of the plan's MDAPI files, batch by batch in order, converted by up
+    to ``workers`` processes (in this one if 1, or for a single batch)."""
+    if workers <= 1 or len(plan.batches) <= 1:
+        for batch in plan.batches:
+            yield convert_batch(plan.root, batch)
+        return
+    with ProcessPoolExecutor(min(workers, len(plan.batches))) as executor:
+        yield from executor.map(convert_batch, repeat(plan.root), plan.batches)
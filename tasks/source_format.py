@@ -0,0 +1,247 @@
+import fnmatch
+import re
+from pathlib import Path
+from typing import Iterable, List, Optional, Set, Tuple
+
+from tasks.deploy_manifest import CHILD_TYPES, METADATA_DIRECTORIES
+from tasks.metadata_index import OBJECT_CHILD_DIRECTORIES
+from tasks.package_xml import METADATA_NAMESPACE
+
+# Directories whose files have the same names in both formats: code files with
+# a separate -meta.xml, and bundles.
+SAME_PATH_DIRECTORIES = {"aura", "classes", "components", "email", "lwc", "pages", "triggers"}
+
+# Directories that source format splits or expands in ways that depend on what
+# is already on disk (one file per label, unzipped static resources...); these
+# are left to sfdx.
+SFDX_ONLY_DIRECTORIES = {"labels", "objectTranslations", "sharingRules", "staticresources", "workflows"}
+
+# Directories whose source files are merged into files shared with other
+# components (labels, translations, sharing and workflow rules); trees with
+# them are converted by sfdx.
+SFDX_CONVERT_DIRECTORIES = {"labels", "objectTranslations", "sharingRules", "workflows"}
+
+# Folder directories -> the suffix of a folder's own -meta.xml in source format.
+FOLDER_SUFFIXES = {"dashboards": "dashboardFolder", "email": "emailFolder", "reports": "reportFolder"}
+
+# objects/<Object>/ subdirectories (and elements of an MDAPI .object file) ->
+# the suffix of their files in source format.
+OBJECT_CHILD_SUFFIXES = {
+    "businessProcesses": "businessProcess",
+    "compactLayouts": "compactLayout",
+    "fieldSets": "fieldSet",
+    "fields": "field",
+    "indexes": "index",
+    "listViews": "listView",
+    "recordTypes": "recordType",
+    "sharingReasons": "sharingReason",
+    "validationRules": "validationRule",
+    "webLinks": "webLink",
+}
+
+# File extensions the package builder keeps in LWC bundles.
+LWC_EXTENSIONS = (".js", ".js-meta.xml", ".html", ".css", ".svg")
+
+# Files sfdx ignores in every project, on top of those in .forceignore.
+DEFAULT_IGNORE_PATTERNS = ["**/.*", "**/*.dup", "**/package2-descriptor.json", "**/package2-manifest.json"]
+
+XML_DECLARATION = '<?xml version="1.0" encoding="UTF-8"?>\n'
+
+_INDENT = "    "
+_TYPE_DIRECTORIES = {mdtype: directory for directory, mdtype in METADATA_DIRECTORIES.items()}
+_CHILD_START = re.compile(r"^    <(\w+)(?:\s[^>]*)?>")
+_FULL_NAME = re.compile(r"^        <fullName>(.*?)</fullName>", re.M)
+_ROOT_START = re.compile(r"<[A-Za-z_][^>]*?(/?)>")
+
+
+def writes_as_source(mdtype: str) -> bool:
+    """Whether retrieved components of a type can be written out with
+    source_files(), or need sfdx to place them."""
+    if mdtype.endswith("Folder"):
+        mdtype = mdtype[: -len("Folder")]
+    if mdtype in CHILD_TYPES:
+        return CHILD_TYPES[mdtype] == "CustomObject"
+    directory = _TYPE_DIRECTORIES.get(mdtype)
+    return directory is not None and directory not in SFDX_ONLY_DIRECTORIES
+
+
+def split_object(content: str) -> Tuple[List[str], List[Tuple[str, List[str]]]]:
+    """Split an MDAPI .object file into the lines that stay in the object's
+    own file and the (element, lines) of each child component (field, list
+    view...), as Salesforce lays them out: one top-level element per line at
+    four spaces, children indented four more.
+
+    Text can't hold an unescaped "<", so any line that starts with one (after
+    indentation) is markup; continuation lines of multi-line values are
+    passed through untouched.
+    """
+    own = []
+    children = []
+    lines = content.splitlines(keepends=True)
+    i = 0
+    while i < len(lines):
+        line = lines[i]
+        match = _CHILD_START.match(line)
+        if match is None:
+            own.append(line)
+            i += 1
+            continue
+        tag = match.group(1)
+        end = i
+        if line.rstrip() == f"{_INDENT}<{tag}>":
+            while lines[end].rstrip() != f"{_INDENT}</{tag}>":
+                end += 1
+        else:
+            while not (lines[end].rstrip().endswith(f"</{tag}>") or lines[end].rstrip().endswith("/>")):
+                end += 1
+        element = lines[i : end + 1]
+        if tag in OBJECT_CHILD_SUFFIXES:
+            children.append((tag, element))
+        else:
+            own.extend(element)
+        i = end + 1
+    return own, children
+
+
+def _child_file(tag: str, element: List[str]) -> Tuple[Optional[str], str]:
+    """A child element of an .object file as (fullName, source file content)."""
+    body = []
+    for line in element[1:-1]:
+        markup = line.startswith(_INDENT * 2) and line.lstrip().startswith("<")
+        body.append(line[len(_INDENT) :] if markup else line)
+    match = _FULL_NAME.search("".join(element))
+    root = OBJECT_CHILD_DIRECTORIES[tag]
+    return (
+        match.group(1) if match else None,
+        f'{XML_DECLARATION}<{root} xmlns="{METADATA_NAMESPACE}">\n{"".join(body)}</{root}>\n',
+    )
+
+
+def object_source_files(name: str, content: bytes, with_object: bool) -> List[Tuple[str, bytes]]:
+    """Decompose objects/<Object>.object into objects/<Object>/... source files.
+
+    A retrieve of just a field still returns the whole .object file, holding
+    only that field, so the object's own file is only written when the
+    object itself was retrieved (``with_object``).
+    """
+    obj = name[len("objects/") : -len(".object")]
+    own, children = split_object(content.decode("utf-8"))
+    files = []
+    for tag, element in children:
+        full_name, text = _child_file(tag, element)
+        if full_name is None:
+            own.extend(element)
+            continue
+        files.append(
+            (f"objects/{obj}/{tag}/{full_name}.{OBJECT_CHILD_SUFFIXES[tag]}-meta.xml", text.encode("utf-8"))
+        )
+    if with_object:
+        files.append((f"objects/{obj}/{obj}.object-meta.xml", "".join(own).encode("utf-8")))
+    return files
+
+
+def source_files(name: str, content: bytes, objects: Iterable[str] = ()) -> List[Tuple[str, bytes]]:
+    """The source-format files for one file of a retrieved MDAPI package, as
+    (path, content) with paths relative to the package directory's
+    main/default.  ``objects`` are the objects retrieved as a whole (see
+    object_source_files).
+    """
+    directory, _, rest = name.partition("/")
+    if directory == "objects" and rest.endswith(".object") and "/" not in rest:
+        return object_source_files(name, content, rest[: -len(".object")] in set(objects))
+    if directory in FOLDER_SUFFIXES and "/" not in rest and rest.endswith("-meta.xml"):
+        folder = rest[: -len("-meta.xml")]
+        return [(f"{directory}/{folder}.{FOLDER_SUFFIXES[directory]}-meta.xml", content)]
+    if directory in SAME_PATH_DIRECTORIES or name.endswith("-meta.xml"):
+        return [(name, content)]
+    return [(f"{name}-meta.xml", content)]
+
+
+def retrieved_objects(components: Iterable[Tuple[str, str]]) -> Set[str]:
+    """The objects among (type, member) components retrieved as a whole."""
+    return {member for mdtype, member in components if mdtype == "CustomObject"}
+
+
+def read_forceignore(path: Path) -> List[str]:
+    try:
+        lines = path.read_text("utf-8").splitlines()
+    except OSError:
+        return []
+    return [line.strip() for line in lines if line.strip() and not line.startswith("#")]
+
+
+def is_ignored(relpath: str, patterns: Iterable[str]) -> bool:
+    """Whether a path (relative to the source tree) matches an ignore pattern.
+
+    Patterns match at any depth, and "**/" also matches at the top.
+    """
+    return any(
+        fnmatch.fnmatch(relpath, pattern)
+        or fnmatch.fnmatch(relpath, f"*/{pattern}")
+        or (pattern.startswith("**/") and fnmatch.fnmatch(relpath, pattern[3:]))
+        for pattern in patterns
+    )
+
+
+def in_bundle(directory: str, inner: str) -> bool:
+    """Whether a bundle file is one the package builder keeps (no LWC tests or
+    tooling files)."""
+    if directory != "lwc":
+        return True
+    if any(part.startswith("__") for part in inner.split("/")[:-1]):
+        return False
+    return inner.lower().endswith(LWC_EXTENSIONS)
+
+
+def mdapi_name(directory: str, rest: str) -> Optional[str]:
+    """The MDAPI path of a source file that converts on its own, given its
+    metadata directory and its path within it; None if it doesn't (object and
+    static resource files, or files without a -meta.xml suffix outside the
+    code directories).
+
+    The inverse of source_files() for those files: "Name.suffix-meta.xml" is
+    "Name.suffix", folders' "Name.reportFolder-meta.xml" is "Name-meta.xml".
+    """
+    folder_suffix = FOLDER_SUFFIXES.get(directory)
+    if folder_suffix is not None and rest.endswith(f".{folder_suffix}-meta.xml"):
+        return f"{directory}/{rest[: -len(f'.{folder_suffix}-meta.xml')]}-meta.xml"
+    if directory in SAME_PATH_DIRECTORIES:
+        return f"{directory}/{rest}"
+    if directory in ("objects", "staticresources") or not rest.endswith("-meta.xml"):
+        return None
+    return f"{directory}/{rest[: -len('-meta.xml')]}"
+
+
+def _root_body(text: str) -> str:
+    """The lines between an XML file's root element tags."""
+    start = _ROOT_START.search(text)
+    if start is None or start.group(1):
+        return ""
+    end = text.rfind("</")
+    body = text[start.end() : end if end > start.end() else len(text)]
+    if body.startswith("\r\n"):
+        body = body[2:]
+    elif body.startswith("\n"):
+        body = body[1:]
+    body = body.rstrip(" \t")
+    return body if not body or body.endswith("\n") else body + "\n"
+
+
+def object_file(own: Optional[bytes], children: Iterable[Tuple[str, bytes]]) -> bytes:
+    """Compose an MDAPI .object file from an object's own source file (None
+    for an object with only child files, like fields on a standard object) and
+    its (subdirectory, content) child files, in the order given.
+
+    The inverse of object_source_files(): each child's lines go inside an
+    element named for its subdirectory, markup indented four more spaces.
+    """
+    out = [XML_DECLARATION, f'<CustomObject xmlns="{METADATA_NAMESPACE}">\n']
+    if own is not None:
+        out.append(_root_body(own.decode("utf-8")))
+    for tag, content in children:
+        out.append(f"{_INDENT}<{tag}>\n")
+        for line in _root_body(content.decode("utf-8")).splitlines(keepends=True):
+            out.append(_INDENT + line if line.lstrip().startswith("<") else line)
+        out.append(f"{_INDENT}</{tag}>\n")
+    out.append("</CustomObject>\n")
+    return "".join(out).encode("utf-8")
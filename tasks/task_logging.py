@@ -0,0 +1,20 @@
+import logging
+
+
+class PrefixedLogger(logging.LoggerAdapter):
+    """Prefixes messages with ``[extra["prefix"]]``, e.g. an org or chunk name."""
+
+    def process(self, msg, kwargs):
+        return f"[{self.extra['prefix']}] {msg}", kwargs
+
+
+class PrefixedTask:
+    """A task as seen by the API calls for one part of its work (a deploy
+    chunk, a load step...): the same task, but logging with that part's name."""
+
+    def __init__(self, task, name: str):
+        self._task = task
+        self.logger = PrefixedLogger(task.logger, {"prefix": name})
+
+    def __getattr__(self, name):
+        return getattr(self._task, name)
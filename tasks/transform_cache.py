@@ -0,0 +1,157 @@
+import hashlib
+import json
+import os
+import time
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+from tasks.file_utils import write_atomic
+
+# Bump when the entry format or the meaning of a signature changes.
+CACHE_VERSION = 2
+
+_UNCHANGED = "="
+_DROPPED = "-"
+_REWRITTEN = "+"
+
+# Rough size of an index entry, so entries without a blob still count
+# towards the size limit.
+_INDEX_ENTRY_BYTES = 100
+
+
+class CacheEntry(NamedTuple):
+    """A cached transform result: the member is unchanged, dropped or rewritten."""
+
+    unchanged: bool
+    member: Optional[Tuple[str, bytes]]
+
+
+class TransformCache:
+    """On-disk, content-addressed cache of transformed package members.
+
+    Entries are keyed by a hash of the member's name and content together with
+    a signature of the transforms that produced them (including their resolved
+    replacement strings), so a changed pattern or a different target user never
+    sees another run's output.
+
+    Most members pass through the transforms unchanged, so the cache is an
+    index (one JSON file, read once and written once per run) recording what
+    happened to each key, plus a blob file for each member that was actually
+    rewritten.  The cache is bounded to ``max_bytes``; save() evicts the least
+    recently used entries beyond that.
+    """
+
+    def __init__(self, path, max_bytes: int):
+        self.path = Path(path)
+        self.max_bytes = max_bytes
+        self.hits = 0
+        self.misses = 0
+        self.evicted = 0
+        self._now = time.time()
+        self._index: Optional[Dict[str, List]] = None
+
+    @property
+    def index(self) -> Dict[str, List]:
+        """key -> [kind, last used, blob size]"""
+        if self._index is None:
+            self._index = {}
+            try:
+                data = json.loads((self.path / "index.json").read_text("utf-8"))
+            except (OSError, ValueError):
+                pass
+            else:
+                if data.get("version") == CACHE_VERSION:
+                    self._index = data["entries"]
+        return self._index
+
+    def key(self, signature: str, name: str, content: bytes) -> str:
+        h = hashlib.blake2b(digest_size=20)
+        h.update(signature.encode("utf-8"))
+        h.update(b"\0")
+        h.update(name.encode("utf-8"))
+        h.update(b"\0")
+        h.update(content)
+        return h.hexdigest()
+
+    def _blob_path(self, key: str) -> Path:
+        return self.path / "blobs" / key[:2] / key
+
+    def get(self, key: str) -> Optional[CacheEntry]:
+        entry = self.index.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+
+        kind = entry[0]
+        if kind == _UNCHANGED:
+            result = CacheEntry(True, None)
+        elif kind == _DROPPED:
+            result = CacheEntry(False, None)
+        else:
+            try:
+                data = self._blob_path(key).read_bytes()
+            except OSError:
+                del self.index[key]
+                self.misses += 1
+                return None
+            name, _, content = data.partition(b"\n")
+            result = CacheEntry(False, (name.decode("utf-8"), content))
+
+        entry[1] = self._now
+        self.hits += 1
+        return result
+
+    def put(
+        self,
+        key: str,
+        name: str,
+        content: bytes,
+        member: Optional[Tuple[str, bytes]],
+    ) -> None:
+        if member is None:
+            self.index[key] = [_DROPPED, self._now, 0]
+        elif member[0] == name and member[1] is content:
+            self.index[key] = [_UNCHANGED, self._now, 0]
+        else:
+            data = member[0].encode("utf-8") + b"\n" + member[1]
+            try:
+                write_atomic(self._blob_path(key), data)
+            except OSError:
+                return
+            self.index[key] = [_REWRITTEN, self._now, len(data)]
+
+    def save(self) -> None:
+        """Evict least recently used entries beyond max_bytes and write the index."""
+        if self._index is None:
+            return
+
+        index = self._index
+        total = sum(size + _INDEX_ENTRY_BYTES for _, _, size in index.values())
+        if total > self.max_bytes:
+            for key in sorted(index, key=lambda k: index[k][1]):
+                if total <= self.max_bytes:
+                    break
+                kind, _, size = index.pop(key)
+                if kind == _REWRITTEN:
+                    try:
+                        os.unlink(self._blob_path(key))
+                    except OSError:
+                        pass
+                total -= size + _INDEX_ENTRY_BYTES
+                self.evicted += 1
+
+        try:
+            write_atomic(
+                self.path / "index.json",
+                json.dumps({"version": CACHE_VERSION, "entries": index}).encode("utf-8"),
+            )
+        except OSError:
+            pass
+
+    def report(self) -> str:
+        lookups = self.hits + self.misses
+        rate = (100 * self.hits / lookups) if lookups else 0
+        return (
+            f"Transform cache: {self.hits} hits, {self.misses} misses ({rate:.0f}% hit rate), "
+            f"{self.evicted} entries evicted."
+        )
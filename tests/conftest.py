@@ -0,0 +1,12 @@
+import os
+import sys
+
+# cci replaces the top-level ``tasks`` package with a synthetic one and adds
+# the project's tasks/ directory to it when it loads cumulusci.yml.
+import cumulusci.core.config.project_config  # noqa: F401
+import tasks
+
+tasks.__path__.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "tasks"))
+
+# The mock APIs in scripts/ are shared by the tests and the benchmarks.
+sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)), "..", "scripts"))
@@ -0,0 +1,69 @@
+from pathlib import Path
+
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.deploy import Deploy
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types><members>A</members><name>ApexClass</name></types>
+    <types><members>PS</members><name>PermissionSet</name></types>
+    <types><members>Reports/R</members><name>Report</name></types>
+    <version>61.0</version>
+</Package>
+"""
+
+SOURCE = {
+    "package.xml": PACKAGE_XML,
+    "classes/A.cls": "public class A {}\n",
+    "classes/A.cls-meta.xml": "<ApexClass/>\n",
+    "permissionsets/PS.permissionset": "<PermissionSet/>\n",
+    "reports/Reports/R.report": "<Report/>\n",
+}
+
+
+def deploy(tmp_path: Path, api: MockMetadataApi, **options):
+    src = tmp_path / "src"
+    for name, content in SOURCE.items():
+        (src / name).parent.mkdir(parents=True, exist_ok=True)
+        (src / name).write_text(content, "utf-8")
+    org_config = OrgConfig(
+        {"instance_url": api.url, "org_id": "00D000000000000001", "username": "u@example.com", "access_token": "T"},
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(
+        Deploy,
+        {"path": str(src), "chunked": True, "poll_min_interval": 0.01, "poll_max_interval": 0.05, **options},
+        org_config=org_config,
+    )
+    task.project_config.repo_info["root"] = str(tmp_path)
+    task.project_config._cache_dir = tmp_path / ".cci"
+    task._run_task()
+    return [(sorted(d.members), d.test_level) for d in api.deploys]
+
+
+def test_tests_run_once_with_the_last_chunk(tmp_path):
+    with MockMetadataApi(checks_until_done=1) as api:
+        deploys = deploy(tmp_path, api, test_level="RunLocalTests")
+
+    # The last tier's chunks would deploy together; the one that runs the
+    # tests waits for the other
+    assert [members for members, _ in deploys] == [
+        ["classes/A.cls", "classes/A.cls-meta.xml", "package.xml"],
+        ["package.xml", "permissionsets/PS.permissionset"],
+        ["package.xml", "reports/Reports/R.report"],
+    ]
+    assert [test_level for _, test_level in deploys] == [None, None, "RunLocalTests"]
+
+
+def test_without_a_test_level_no_chunk_sets_one(tmp_path):
+    with MockMetadataApi(checks_until_done=1) as api:
+        deploys = deploy(tmp_path, api)
+
+    assert len(deploys) == 3
+    assert {test_level for _, test_level in deploys} == {None}
@@ -0,0 +1,44 @@
+import io
+import json
+import zipfile
+
+from tasks.deploy_manifest import DeployManifest, component_hashes, filter_package
+
+PACKAGE_XML = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types>
+        <members>A</members>
+        <members>B</members>
+        <name>ApexClass</name>
+    </types>
+    <version>61.0</version>
+</Package>
+"""
+
+
+def package(**classes) -> zipfile.ZipFile:
+    zf = zipfile.ZipFile(io.BytesIO(), "w")
+    zf.writestr("package.xml", PACKAGE_XML)
+    for name, body in classes.items():
+        zf.writestr(f"classes/{name}.cls", body)
+        zf.writestr(f"classes/{name}.cls-meta.xml", b"<ApexClass/>")
+    return zf
+
+
+def test_manifest_records_what_was_deployed(tmp_path):
+    path = tmp_path / "manifests" / "00D.json"
+    hashes = component_hashes(package(A="class A {}", B="class B {}"))
+    assert DeployManifest(path).changed(hashes) == {"ApexClass:A", "ApexClass:B"}
+
+    DeployManifest(path).record(hashes)
+    assert json.loads(path.read_text("utf-8")) == hashes
+    assert not [p for p in path.parent.iterdir() if p.name.startswith(".tmp-")]
+
+    changed = component_hashes(package(A="class A {}", B="class B { }"))
+    assert DeployManifest(path).changed(changed) == {"ApexClass:B"}
+
+
+def test_filter_package_keeps_the_components_and_their_entries():
+    filtered = filter_package(package(A="class A {}", B="class B {}"), {"ApexClass:B"})
+    assert sorted(filtered.namelist()) == ["classes/B.cls", "classes/B.cls-meta.xml", "package.xml"]
+    assert b"<members>A</members>" not in filtered.read("package.xml")
@@ -0,0 +1,44 @@
+from defusedxml.minidom import parseString
+
+from tasks.deploy_polling import DeployProgress
+
+# Elements come in alphabetical order, so <details> (with the ids and
+# statuses of components and tests) precedes the deploy's own.
+RESPONSE = """<?xml version="1.0" encoding="UTF-8"?>
+<soapenv:Envelope xmlns:soapenv="http://schemas.xmlsoap.org/soap/envelope/" xmlns="http://soap.sforce.com/2006/04/metadata">
+<soapenv:Body><checkDeployStatusResponse><result>
+<checkOnly>false</checkOnly>
+<details>
+<componentSuccesses><changed>true</changed><fileName>classes/A.cls</fileName><id>01p000000000001</id></componentSuccesses>
+<runTestResult><numFailures>0</numFailures><successes><id>01p000000000002</id><name>ATest</name></successes></runTestResult>
+</details>
+<done>false</done>
+<id>0Af000000000042</id>
+<numberComponentErrors>0</numberComponentErrors>
+<numberComponentsDeployed>1</numberComponentsDeployed>
+<numberComponentsTotal>3</numberComponentsTotal>
+<numberTestErrors>0</numberTestErrors>
+<numberTestsCompleted>1</numberTestsCompleted>
+<numberTestsTotal>4</numberTestsTotal>
+<stateDetail>Running Test: ATest</stateDetail>
+<status>InProgress</status>
+</result></checkDeployStatusResponse></soapenv:Body>
+</soapenv:Envelope>
+"""
+
+
+def test_reads_the_deploy_result_not_its_details():
+    progress = DeployProgress.from_response(parseString(RESPONSE), "dev")
+    assert progress.deploy_id == "0Af000000000042"
+    assert progress.state == "InProgress"
+    assert progress.state_detail == "Running Test: ATest"
+    assert not progress.done
+    assert (progress.components_deployed, progress.components_total) == (1, 3)
+    assert (progress.tests_completed, progress.tests_total) == (1, 4)
+    assert progress.phase == "components"
+    assert progress.remaining() == 2
+
+
+def test_done():
+    response = RESPONSE.replace("<done>false</done>", "<done>true</done>").replace("InProgress", "Succeeded")
+    assert DeployProgress.from_response(parseString(response)).done
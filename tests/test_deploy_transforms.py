@@ -0,0 +1,162 @@
+import gc
+import io
+import logging
+import sys
+import zipfile
+from collections import Counter
+from types import SimpleNamespace
+
+import pytest
+
+from cumulusci.core.source_transforms.transforms import (
+    FindReplaceTransform,
+    FindReplaceTransformOptions,
+)
+
+import tasks.deploy
+from tasks.deploy import FindReplaceWithFilename, StreamingTransformPipeline, StripCustomIndexTransform
+
+USERNAME = "deploy@example.com"
+CONTEXT = SimpleNamespace(
+    org_config=SimpleNamespace(username=USERNAME), logger=logging.getLogger(__name__)
+)
+
+LAYOUT = b"""<?xml version="1.0" encoding="UTF-8"?>
+<Layout xmlns="http://soap.sforce.com/2006/04/metadata">
+    <owner name="%%%CURRENT_USER%%%">%%%CURRENT_USER%%%</owner>
+    <label>Unchanged</label>
+</Layout>
+"""
+
+
+def options(*patterns) -> FindReplaceTransformOptions:
+    return FindReplaceTransformOptions.parse_obj({"patterns": list(patterns)})
+
+
+def transform(spec_options, name, content):
+    stage = FindReplaceWithFilename(spec_options)
+    stage.stats = Counter()
+    stage.begin(CONTEXT)
+    return stage.transform_member(name, content)
+
+
+def stock(spec_options, name, content):
+    zf = zipfile.ZipFile(io.BytesIO(), "w")
+    zf.writestr(name, content)
+    return FindReplaceTransform(spec_options).process(zf, CONTEXT).read(name)
+
+
+def test_xml_members_get_the_stock_element_text_replacement():
+    spec_options = options({"find": "%%%CURRENT_USER%%%", "inject_username": True})
+    name, content = transform(spec_options, "layouts/Case-Layout.layout", LAYOUT)
+    assert content == stock(spec_options, "layouts/Case-Layout.layout", LAYOUT)
+    assert f">{USERNAME}<".encode() in content
+    assert b'name="%%%CURRENT_USER%%%"' in content
+
+
+def test_xpath_patterns():
+    spec_options = options({"xpath": "/Layout/label", "replace": "Replaced"})
+    name, content = transform(spec_options, "layouts/Case-Layout.layout", LAYOUT)
+    assert content == stock(spec_options, "layouts/Case-Layout.layout", LAYOUT)
+    assert b"<label>Replaced</label>" in content
+
+    # xpath patterns don't apply to text that isn't XML
+    apex = b"public class A {}\n"
+    assert transform(spec_options, "classes/A.cls", apex) == ("classes/A.cls", apex)
+
+
+@pytest.mark.parametrize(
+    "patterns, content, replacements",
+    [
+        # The attribute keeps its token, so one replacement of two matches
+        ([{"find": "%%%CURRENT_USER%%%", "inject_username": True}], LAYOUT, 1),
+        (
+            [{"find": "Unchanged", "replace": "Changed"}, {"xpath": "/Layout/owner[1]", "replace": "Owner"}],
+            LAYOUT,
+            2,
+        ),
+        (
+            [{"find": "%%%CURRENT_USER%%%", "inject_username": True}],
+            b"<a>%%%CURRENT_USER%%%<!--%%%CURRENT_USER%%%--></a>",
+            2,
+        ),
+        # Not well-formed: a plain replacement
+        ([{"find": "%%%CURRENT_USER%%%", "inject_username": True}], b"<a>%%%CURRENT_USER%%% <b>", 1),
+    ],
+)
+def test_xml_replacements_are_counted_as_the_stock_transform_makes_them(patterns, content, replacements):
+    spec_options = options(*patterns)
+    stage = FindReplaceWithFilename(spec_options)
+    stage.stats = Counter()
+    stage.begin(CONTEXT)
+    assert stage.transform_member("layouts/Case-Layout.layout", content)[1] == stock(
+        spec_options, "layouts/Case-Layout.layout", content
+    )
+    assert stage.stats["replacements"] == replacements
+
+
+def test_text_members_and_filenames():
+    spec_options = options({"find": "%%%CURRENT_USER%%%", "inject_username": True})
+    apex = b"String owner = '%%%CURRENT_USER%%%';\n"
+    name, content = transform(spec_options, "classes/%%%CURRENT_USER%%%.cls", apex)
+    assert name == f"classes/{USERNAME}.cls"
+    assert content == f"String owner = '{USERNAME}';\n".encode()
+
+
+def test_members_no_pattern_changes_are_untouched():
+    spec_options = options(
+        {"find": "%%%CURRENT_USER%%%", "inject_username": True, "paths": ["classes"]}
+    )
+    content = LAYOUT
+    assert transform(spec_options, "layouts/Case-Layout.layout", content)[1] is content
+    png = b"\x89PNG\r\n\x1a\n%%%CURRENT_USER%%%"
+    assert transform(spec_options, "classes/logo.png", png)[1] is png
+
+
+def test_pipeline_matches_the_stock_transforms():
+    spec_options = options({"find": "%%%CURRENT_USER%%%", "inject_username": True})
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("layouts/Case-Layout.layout", LAYOUT)
+        zf.writestr("classes/A.cls", b"// %%%CURRENT_USER%%%\n")
+        zf.writestr("customindex/Case.OrgIdTxt__c.indx", b"<CustomIndex/>")
+    pipeline = StreamingTransformPipeline(
+        [FindReplaceWithFilename(spec_options), StripCustomIndexTransform()]
+    )
+    result = pipeline.process(zipfile.ZipFile(io.BytesIO(buffer.getvalue())), CONTEXT)
+    assert sorted(result.namelist()) == ["classes/A.cls", "layouts/Case-Layout.layout"]
+    assert result.read("classes/A.cls") == f"// {USERNAME}\n".encode()
+    assert result.read("layouts/Case-Layout.layout") == stock(
+        spec_options, "layouts/Case-Layout.layout", LAYOUT
+    )
+
+
+def test_pipeline_releases_the_builders_zip_cleanly(capsys, monkeypatch):
+    # The stock hook prints "Exception ignored in ..." to stderr
+    monkeypatch.setattr(sys, "unraisablehook", sys.__unraisablehook__)
+    spec_options = options({"find": "%%%CURRENT_USER%%%", "inject_username": True})
+    # The package builder hands over the zip it is still writing
+    zf = zipfile.ZipFile(io.BytesIO(), "w", zipfile.ZIP_DEFLATED)
+    zf.writestr("classes/A.cls", b"// %%%CURRENT_USER%%%\n")
+    result = StreamingTransformPipeline([FindReplaceWithFilename(spec_options)]).process(zf, CONTEXT)
+    assert result.read("classes/A.cls") == f"// {USERNAME}\n".encode()
+    del zf
+    gc.collect()
+    assert "Exception ignored" not in capsys.readouterr().err
+
+
+def test_pipeline_without_zipfile_internals(monkeypatch):
+    monkeypatch.setattr(tasks.deploy, "_RAW_COPY", False)
+    spec_options = options({"find": "%%%CURRENT_USER%%%", "inject_username": True})
+    buffer = io.BytesIO()
+    with zipfile.ZipFile(buffer, "w", zipfile.ZIP_DEFLATED) as zf:
+        zf.writestr("classes/A.cls", b"// %%%CURRENT_USER%%%\n")
+        zf.writestr("classes/%%%CURRENT_USER%%%.cls", b"// Unchanged\n")
+    src = zipfile.ZipFile(io.BytesIO(buffer.getvalue()))
+    assert not tasks.deploy._copy_member_raw(src, zipfile.ZipFile(io.BytesIO(), "w"), src.infolist()[1])
+    pipeline = StreamingTransformPipeline([FindReplaceWithFilename(spec_options)])
+    result = pipeline.process(src, CONTEXT)
+    assert {name: result.read(name) for name in result.namelist()} == {
+        "classes/A.cls": f"// {USERNAME}\n".encode(),
+        f"classes/{USERNAME}.cls": b"// Unchanged\n",
+    }
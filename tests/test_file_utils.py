@@ -0,0 +1,50 @@
+import os
+import stat
+
+import pytest
+
+from tasks.file_utils import atomic_writer, write_atomic
+
+
+def mode(path) -> int:
+    return stat.S_IMODE(os.stat(path).st_mode)
+
+
+@pytest.fixture
+def umask():
+    previous = os.umask(0o027)
+    yield
+    os.umask(previous)
+
+
+def test_new_files_get_the_umask_mode(tmp_path, umask):
+    # Not the owner-only mode of a mkstemp() file
+    write_atomic(tmp_path / "a" / "new.txt", b"data")
+    assert (tmp_path / "a" / "new.txt").read_bytes() == b"data"
+    assert mode(tmp_path / "a" / "new.txt") == 0o640
+
+
+def test_existing_files_keep_their_mode(tmp_path):
+    path = tmp_path / "script.sh"
+    path.write_bytes(b"old")
+    os.chmod(path, 0o755)
+    write_atomic(path, b"new")
+    assert path.read_bytes() == b"new"
+    assert mode(path) == 0o755
+
+
+def test_explicit_mode(tmp_path):
+    write_atomic(tmp_path / "private.json", b"{}", mode=0o600)
+    assert mode(tmp_path / "private.json") == 0o600
+    assert [p.name for p in tmp_path.iterdir()] == ["private.json"]
+
+
+def test_atomic_writer_keeps_the_old_file_on_error(tmp_path):
+    path = tmp_path / "dataset.sql"
+    path.write_bytes(b"old")
+    with pytest.raises(RuntimeError):
+        with atomic_writer(path) as f:
+            f.write(b"half")
+            raise RuntimeError
+    assert path.read_bytes() == b"old"
+    assert [p.name for p in tmp_path.iterdir()] == ["dataset.sql"]
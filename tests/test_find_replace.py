@@ -0,0 +1,57 @@
+from hypothesis import given, settings
+from hypothesis import strategies as st
+
+from tasks.find_replace import CompiledReplacements, can_replace_in_one_pass
+
+# A small alphabet, so finds overlap, contain each other and match
+# replacements often; "é" checks that byte matching stays on characters.
+TEXT = st.text(alphabet="ab%é", max_size=30)
+PAIRS = st.lists(st.tuples(TEXT, TEXT), max_size=4)
+TOKENS = st.lists(
+    st.tuples(st.sampled_from(["%%%A%%%", "%%%B%%%", "%%%AB%%%", "%%%NAMESPACE%%%"]), TEXT),
+    max_size=4,
+)
+TOKEN_TEXT = st.lists(st.sampled_from(["%%%A%%%", "%%%B%%%", "%%%AB%%%", "%", "A", "é", " "])).map("".join)
+
+
+def sequential(text: str, pairs) -> str:
+    for find, replace in pairs:
+        text = text.replace(find, replace)
+    return text
+
+
+@settings(max_examples=500)
+@given(TEXT, PAIRS)
+def test_matches_sequential_replace(text, pairs):
+    compiled = CompiledReplacements(pairs)
+    expected = sequential(text, pairs)
+    assert compiled.replace_text(text) == expected
+    assert compiled.replace_bytes(text.encode("utf-8")) == expected.encode("utf-8")
+
+
+@settings(max_examples=500)
+@given(TOKEN_TEXT, TOKENS)
+def test_matches_sequential_replace_for_tokens(text, pairs):
+    compiled = CompiledReplacements(pairs)
+    expected = sequential(text, pairs)
+    assert compiled.replace_text(text) == expected
+    assert compiled.replace_bytes(text.encode("utf-8")) == expected.encode("utf-8")
+
+
+@given(TEXT, PAIRS)
+def test_unchanged_input_is_returned_as_is(text, pairs):
+    compiled = CompiledReplacements(pairs)
+    data = text.encode("utf-8")
+    if sequential(text, pairs) == text:
+        assert compiled.replace_text(text) is text
+        assert compiled.replace_bytes(data) is data
+    if not compiled.matches_bytes(data):
+        assert compiled.replace_bytes(data) is data
+
+
+def test_one_pass_only_for_independent_finds():
+    assert can_replace_in_one_pass([("%%%A%%%", "x"), ("%%%B%%%", "y")])
+    assert not can_replace_in_one_pass([("%%%A%%%", "%%%B%%%"), ("%%%B%%%", "y")])
+    assert not can_replace_in_one_pass([("ab", "x"), ("b", "y")])
+    assert not can_replace_in_one_pass([("", "x")])
+    assert not CompiledReplacements([]).matches_bytes(b"anything")
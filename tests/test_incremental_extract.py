@@ -0,0 +1,55 @@
+import json
+import os
+import sqlite3
+import stat
+
+import pytest
+from benchmark_incremental_extract import MAPPING, contents, extract
+from mock_bulk_api import MockBulkApi
+
+
+@pytest.fixture
+def api(tmp_path):
+    (tmp_path / "mapping.yml").write_text(json.dumps(MAPPING), "utf-8")
+    with MockBulkApi(rest_seconds=0.0) as api:
+        yield api
+
+
+def local_ids(sql_path):
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(sql_path.read_text("utf-8"))
+    ids = [int(row[0]) for row in conn.execute('SELECT id FROM "Account"')]
+    conn.close()
+    return ids
+
+
+def test_refresh_with_new_parent_records(tmp_path, api):
+    # Enough accounts that their ids sort differently as text and as numbers
+    accounts = [api.insert("Account", {"Name": f"Account {i}", "Industry": "Technology"}) for i in range(12)]
+    for i, account in enumerate(accounts):
+        api.insert("Contact", {"LastName": f"Contact {i}", "Email": f"c{i}@example.com", "AccountId": account})
+    api.age(3600)
+    sql_path, state_dir = tmp_path / "dataset.sql", tmp_path / "state"
+    assert extract(api, tmp_path, sql_path, state_dir)[1]["full"]
+
+    for i in range(3):
+        account = api.insert("Account", {"Name": f"New account {i}", "Industry": "Energy"})
+        api.insert("Contact", {"LastName": f"New contact {i}", "Email": f"n{i}@example.com", "AccountId": account})
+    _, result = extract(api, tmp_path, sql_path, state_dir)
+    assert not result["full"]
+
+    ids = local_ids(sql_path)
+    assert sorted(ids) == list(range(1, 16))
+    fresh = tmp_path / "fresh.sql"
+    extract(api, tmp_path, fresh, tmp_path / "fresh-state")
+    assert contents(sql_path) == contents(fresh)
+
+
+def test_dataset_keeps_its_mode(tmp_path, api):
+    api.insert("Account", {"Name": "Account", "Industry": "Technology"})
+    sql_path = tmp_path / "dataset.sql"
+    sql_path.write_text("", "utf-8")
+    os.chmod(sql_path, 0o664)
+    extract(api, tmp_path, sql_path, tmp_path / "state")
+    assert stat.S_IMODE(os.stat(sql_path).st_mode) == 0o664
+    assert "Account" in sql_path.read_text("utf-8")
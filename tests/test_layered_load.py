@@ -0,0 +1,44 @@
+import json
+
+import pytest
+from mock_bulk_api import MockBulkApi, check_load, generate_dataset, make_task
+
+from cumulusci.core.exceptions import BulkDataException
+
+from tasks.layered_load import LayeredLoadData, bulk_batch_size
+
+
+@pytest.fixture
+def api():
+    with MockBulkApi(batch_seconds=0.05, rest_seconds=0.0) as api:
+        yield api
+
+
+def test_layered_load(tmp_path, api):
+    rows = generate_dataset(tmp_path, 0.05)
+    task = make_task(LayeredLoadData, tmp_path, api, poll_interval=0.05)
+    task._run_task()
+
+    assert check_load(api, rows) == []
+    assert list(task.return_values["step_results"]) == [f"Insert {table}" for table in rows]
+    throughput = {stats["step"]: stats["rows"] for stats in task.return_values["step_throughput"]}
+    assert throughput["Insert Contact"] == len(rows["Contact"])
+    assert throughput["Update Account Dependencies After Insert Account"] > 0
+
+
+def test_missing_required_field_fails_validation(tmp_path, api):
+    generate_dataset(tmp_path, 0.01)
+    mapping = json.loads((tmp_path / "mapping.yml").read_text("utf-8"))
+    mapping["Insert Opportunity"]["fields"].remove("StageName")
+    (tmp_path / "mapping.yml").write_text(json.dumps(mapping), "utf-8")
+
+    task = make_task(LayeredLoadData, tmp_path, api, poll_interval=0.05)
+    with pytest.raises(BulkDataException):
+        task._run_task()
+    assert not api.records
+
+
+def test_bulk_batch_size():
+    assert bulk_batch_size(0) == 1
+    assert bulk_batch_size(10_000) == 10_000
+    assert bulk_batch_size(25_000) == 8_334
@@ -0,0 +1,29 @@
+import os
+import zipfile
+
+from tasks.member_content import ARCHIVE_DATE_TIME, is_binary, is_incompressible, member_info
+
+
+def test_text_that_starts_like_a_signature_is_text():
+    assert not is_binary("staticresources/notes.resource", b"BMW fleet notes for %%%CURRENT_USER%%%\n")
+    assert not is_binary("classes/Otto.cls", b"OTTO_CONSTANT = 1;\n")
+    assert not is_binary("staticresources/guide.resource", b"%PDF files are attached separately\n")
+
+
+def test_binary_formats():
+    bmp = b"BM" + (54).to_bytes(4, "little") + b"\x00\x00\x00\x00" + b"\x36\x00\x00\x00"
+    assert is_binary("staticresources/logo.resource", bmp)
+    assert is_binary("staticresources/logo.resource", b"\x89PNG\r\n\x1a\n")
+    assert is_binary("staticresources/font.resource", b"OTTO\x00\x0c\x00\x80")
+    assert is_binary("staticresources/manual.pdf", b"anything")
+
+
+def test_compressed_members_are_stored():
+    assert is_incompressible("staticresources/lib.resource", b"PK\x03\x04rest")
+    assert not is_incompressible("classes/A.cls", b"public class A {}\n" * 1000)
+    assert is_incompressible("staticresources/random.resource", os.urandom(20000))
+
+    info = member_info("staticresources/lib.resource", b"PK\x03\x04rest")
+    assert info.compress_type == zipfile.ZIP_STORED
+    assert info.date_time == ARCHIVE_DATE_TIME
+    assert member_info("classes/A.cls", b"class A {}").compress_type == zipfile.ZIP_DEFLATED
@@ -0,0 +1,64 @@
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+from tasks.multi_org_deploy import MultiOrgDeploy, OrgDeployApi
+
+PACKAGE_XML = """<?xml version="1.0" encoding="UTF-8"?>
+<Package xmlns="http://soap.sforce.com/2006/04/metadata">
+    <types><members>A</members><name>ApexClass</name></types>
+    <version>61.0</version>
+</Package>
+"""
+
+
+def test_find_replace_runs_in_the_configured_order(tmp_path, monkeypatch):
+    monkeypatch.setattr(OrgDeployApi, "check_interval", 0.01)
+    src = tmp_path / "src"
+    (src / "classes").mkdir(parents=True)
+    (src / "package.xml").write_text(PACKAGE_XML, "utf-8")
+    (src / "classes" / "A.cls").write_text("// Owned by %%%CURRENT_USER%%%\npublic class A {}\n", "utf-8")
+    (src / "classes" / "A.cls-meta.xml").write_text("<ApexClass/>\n", "utf-8")
+
+    with MockMetadataApi(checks_until_done=1) as api:
+        task = create_task(
+            MultiOrgDeploy,
+            {
+                "path": str(src),
+                "orgs": "one,two",
+                "report_path": str(tmp_path / "report.json"),
+                "transforms": [
+                    {
+                        "transform": "find_replace",
+                        "options": {
+                            "patterns": [
+                                {"find": "%%%CURRENT_USER%%%", "inject_username": True},
+                                {"find": "@example.com", "replace": "@example.org"},
+                            ]
+                        },
+                    }
+                ],
+            },
+        )
+        task.org_configs = {
+            name: OrgConfig(
+                {
+                    "instance_url": api.url,
+                    "org_id": f"00D00000000000000{i}",
+                    "username": f"{name}@example.com",
+                    "access_token": "T",
+                },
+                name,
+                keychain=DummyKeychain(),
+            )
+            for i, name in enumerate(["one", "two"])
+        }
+        task._run_task()
+
+    classes = {deploy.org_id: deploy.members["classes/A.cls"] for deploy in api.deploys}
+    assert classes == {
+        "00D000000000000000": b"// Owned by one@example.org\npublic class A {}\n",
+        "00D000000000000001": b"// Owned by two@example.org\npublic class A {}\n",
+    }
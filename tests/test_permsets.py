@@ -0,0 +1,90 @@
+import logging
+
+import pytest
+from cumulusci.core.config import OrgConfig
+from cumulusci.core.exceptions import CumulusCIException
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+from mock_composite_api import MockCompositeApi
+
+from tasks.permsets import (
+    AssignPermissionSetLicensesWithFindReplace,
+    AssignPermissionSetsWithFindReplace,
+)
+
+PERMISSIONS = {
+    "PermissionSet": [{"Name": "DeliveryHubUser"}, {"Name": "DeliveryHubAdmin"}],
+    "PermissionSetLicense": [
+        {"DeveloperName": "SalesforceCPQ_CPQStandardPerm", "PermissionSetLicenseKey": "SalesforceCPQ_CPQStandardPerm"},
+        {"DeveloperName": "SFDCCRMAnalytics", "PermissionSetLicenseKey": "EinsteinAnalyticsPlusPsl"},
+    ],
+    "PermissionSetGroup": [{"DeveloperName": "DeliveryHubAdmins"}],
+}
+
+
+def make_task(task_class, api, **options):
+    org_config = OrgConfig(
+        {"instance_url": "https://test.salesforce.com", "username": "admin@example.com", "access_token": "T"},
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(task_class, {"bulk": True, **options}, org_config=org_config)
+    task.sf = api
+    task.logger = logging.getLogger(__name__)
+    return task
+
+
+def assigned(api, sobject, lookup):
+    return sorted((row["AssigneeId"][-1], row[lookup]) for row in api.assignments[sobject] if lookup in row)
+
+
+def test_bulk_assigns_licenses_by_developer_name_or_key():
+    api = MockCompositeApi(PERMISSIONS, users=2)
+    make_task(
+        AssignPermissionSetsWithFindReplace,
+        api,
+        api_names="DeliveryHubUser",
+        user_alias="u0,u1",
+        # One license by DeveloperName, one by PermissionSetLicenseKey
+        permission_set_licenses="SalesforceCPQ_CPQStandardPerm,EinsteinAnalyticsPlusPsl",
+        permission_set_groups="DeliveryHubAdmins",
+    )._run_task()
+
+    licenses = [record["Id"] for record in api.records["PermissionSetLicense"]]
+    assert assigned(api, "PermissionSetLicenseAssign", "PermissionSetLicenseId") == sorted(
+        (user, license) for user in "01" for license in licenses
+    )
+    permission_set = api.records["PermissionSet"][0]["Id"]
+    group = api.records["PermissionSetGroup"][0]["Id"]
+    assert assigned(api, "PermissionSetAssignment", "PermissionSetId") == [("0", permission_set), ("1", permission_set)]
+    assert assigned(api, "PermissionSetAssignment", "PermissionSetGroupId") == [("0", group), ("1", group)]
+    # Licenses are inserted before what may depend on them
+    assert [r["attributes"]["type"] for r in api.inserted[:4]] == ["PermissionSetLicenseAssign"] * 4
+    # One call to look everything up, then one for the licenses and one for the rest
+    assert api.calls == 3
+
+
+def test_license_task_in_bulk_skips_existing_assignments():
+    api = MockCompositeApi(PERMISSIONS, users=2)
+    task = make_task(
+        AssignPermissionSetLicensesWithFindReplace, api, api_names="EinsteinAnalyticsPlusPsl", user_alias="u0,u1"
+    )
+    task._run_task()
+    assert len(api.inserted) == 2
+    make_task(
+        AssignPermissionSetLicensesWithFindReplace, api, api_names="EinsteinAnalyticsPlusPsl", user_alias="u0,u1"
+    )._run_task()
+    assert len(api.inserted) == 2
+
+
+def test_missing_license_is_reported():
+    api = MockCompositeApi(PERMISSIONS, users=1)
+    task = make_task(
+        AssignPermissionSetsWithFindReplace,
+        api,
+        api_names="DeliveryHubUser",
+        user_alias="u0",
+        permission_set_licenses="NoSuchLicense",
+    )
+    with pytest.raises(CumulusCIException, match="NoSuchLicense"):
+        task._run_task()
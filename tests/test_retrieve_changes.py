@@ -0,0 +1,87 @@
+import inspect
+import json
+
+import pytest
+from benchmark_incremental_retrieve import FakeTooling
+from mock_metadata_api import MockMetadataApi
+
+from cumulusci.core.config import OrgConfig
+from cumulusci.core.exceptions import TaskOptionsError
+from cumulusci.tasks.salesforce import sourcetracking
+from cumulusci.tasks.salesforce.tests.util import create_task
+from cumulusci.tests.util import DummyKeychain
+
+import tasks.retrieve_changes
+from tasks.retrieve_changes import RetrieveChanges
+
+CLASS_META = b"""<?xml version="1.0" encoding="UTF-8"?>
+<ApexClass xmlns="http://soap.sforce.com/2006/04/metadata">
+    <apiVersion>61.0</apiVersion>
+    <status>Active</status>
+</ApexClass>
+"""
+
+
+@pytest.fixture
+def api():
+    with MockMetadataApi() as api:
+        for name in ("Kept", "Ignored"):
+            api.org_source[("ApexClass", name)] = [
+                (f"classes/{name}.cls", f"public class {name} {{}}\n".encode("utf-8")),
+                (f"classes/{name}.cls-meta.xml", CLASS_META),
+            ]
+        yield api
+
+
+def retrieve(tmp_path, monkeypatch, api, **options):
+    monkeypatch.chdir(tmp_path)
+    (tmp_path / "force-app" / "main" / "default").mkdir(parents=True)
+    (tmp_path / "sfdx-project.json").write_text(
+        json.dumps({"packageDirectories": [{"path": "force-app", "default": True}]}), "utf-8"
+    )
+    org_config = OrgConfig(
+        {"instance_url": api.url, "org_id": "00D000000000000001", "username": "u@example.com", "access_token": "T"},
+        "dev",
+        keychain=DummyKeychain(),
+    )
+    task = create_task(RetrieveChanges, {"path": "force-app", **options}, org_config=org_config)
+    task.project_config.repo_info["root"] = str(tmp_path)
+    task.project_config._cache_dir = tmp_path / ".cci"
+    task.tooling = FakeTooling()
+    for component in api.org_source:
+        task.tooling.bump(component)
+    task._run_task()
+    return tmp_path / "force-app" / "main" / "default" / "classes"
+
+
+def test_forceignored_files_are_not_written(tmp_path, monkeypatch, api):
+    (tmp_path / ".forceignore").write_text("# Not ours\n**/Ignored.cls*\n", "utf-8")
+    classes = retrieve(tmp_path, monkeypatch, api)
+    assert sorted(path.name for path in classes.iterdir()) == ["Kept.cls", "Kept.cls-meta.xml"]
+
+
+def test_namespace_tokenize_retrieves_with_sfdx(tmp_path, monkeypatch, api):
+    calls = []
+    monkeypatch.setattr(tasks.retrieve_changes, "retrieve_components", lambda *args, **kwargs: calls.append(kwargs))
+    retrieve(tmp_path, monkeypatch, api, namespace_tokenize="ns")
+
+    assert api.retrieves == []
+    [kwargs] = calls
+    assert kwargs["namespace_tokenize"] == "ns"
+    assert kwargs["project_config"] is not None
+    assert kwargs["retrieve_complete_profile"] is False
+
+
+def test_tokens_that_cant_be_preserved_are_rejected():
+    with pytest.raises(TaskOptionsError, match="__PROJECT_NAME__"):
+        create_task(RetrieveChanges, {"path": "force-app", "preserve_tokens": "%%%CURRENT_USER%%%, __PROJECT_NAME__"})
+    task = create_task(RetrieveChanges, {"path": "force-app", "preserve_tokens": "%%%CURRENT_USER%%%,"})
+    assert task.tokens_to_preserve == ["%%%CURRENT_USER%%%"]
+
+
+def test_stock_flow_still_uses_the_hooks_we_follow():
+    # _run_task() reproduces the stock flow; if it changes, so must ours
+    source = inspect.getsource(sourcetracking.RetrieveChanges._run_task)
+    for hook in ("_load_snapshot", "_get_changes", "_filter_changes", "_store_snapshot", "_reset_sfdx_snapshot"):
+        assert f"self.{hook}(" in source
+    assert "retrieve_complete_profile=" in source
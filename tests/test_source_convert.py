@@ -0,0 +1,102 @@
+import io
+import zipfile
+
+import pytest
+from check_source_convert import FIXTURE, compare, convert, expected_files
+
+from cumulusci.tasks.salesforce.tests.util import create_task
+
+from tasks.deploy import Deploy
+from tasks.source_convert import UnsupportedSource, convert_source, plan_conversion
+from tasks.source_format import object_file, object_source_files
+
+FIELD = b"""<?xml version="1.0" encoding="UTF-8"?>
+<CustomField xmlns="http://soap.sforce.com/2006/04/metadata">
+    <fullName>Summary__c</fullName>
+    <label>Summary</label>
+    <type>Text</type>
+    <length>%d</length>
+</CustomField>
+"""
+
+
+def write(root, files):
+    for name, content in files.items():
+        path = root / name
+        path.parent.mkdir(parents=True, exist_ok=True)
+        path.write_bytes(content)
+
+
+def converted(plan) -> dict:
+    files = {}
+    for fragment in convert_source(plan):
+        with zipfile.ZipFile(io.BytesIO(fragment)) as zf:
+            files.update((name, zf.read(name)) for name in zf.namelist())
+    return files
+
+
+def test_fixture_project_converts_to_the_expected_tree():
+    _, actual = convert(FIXTURE / "force-app", FIXTURE)
+    problems = []
+    assert compare(actual, expected_files(FIXTURE / "expected"), "expected", problems) > 0
+    assert problems == []
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_object_round_trip(workers):
+    source = FIXTURE / "force-app" / "main" / "default" / "objects" / "Ticket__c"
+    _, files = convert(FIXTURE / "force-app", FIXTURE, workers)
+    split = dict(object_source_files("objects/Ticket__c.object", files["objects/Ticket__c.object"], True))
+    expected = {
+        path.relative_to(source.parent.parent).as_posix(): path.read_bytes()
+        for path in source.rglob("*-meta.xml")
+    }
+    problems = []
+    compare(split, expected, "round trip", problems)
+    assert problems == []
+
+
+def test_object_file_without_its_own_file():
+    content = object_file(None, [("fields", FIELD % 255)])
+    assert dict(object_source_files("objects/Account.object", content, False)) == {
+        "objects/Account/fields/Summary__c.field-meta.xml": FIELD % 255
+    }
+
+
+@pytest.mark.parametrize(
+    "name",
+    [
+        "force-app/main/default/labels/CustomLabels.labels-meta.xml",
+        "force-app/main/default/objects/Ticket__c/unknown/Thing.thing-meta.xml",
+        "force-app/main/default/unknownDirectory/Thing.thing-meta.xml",
+    ],
+)
+def test_unsupported_source(tmp_path, name):
+    write(tmp_path, {name: b"<x/>\n"})
+    with pytest.raises(UnsupportedSource):
+        plan_conversion(tmp_path / "force-app", "61.0")
+
+
+def test_duplicates_last_by_path_wins(tmp_path):
+    meta = b"<ApexClass/>\n"
+    write(
+        tmp_path,
+        {
+            "force-app/b/classes/A.cls": b"// b\n",
+            "force-app/b/classes/A.cls-meta.xml": meta,
+            "force-app/a/classes/A.cls": b"// a\n",
+            "force-app/a/classes/A.cls-meta.xml": meta,
+        },
+    )
+    plan = plan_conversion(tmp_path / "force-app", "61.0")
+    assert plan.duplicates == ["classes/A.cls", "classes/A.cls-meta.xml"]
+    assert converted(plan)["classes/A.cls"] == b"// b\n"
+    assert list(plan.package) == [("ApexClass", "A")]
+
+
+@pytest.mark.parametrize("options, converted_in_process", [({}, False), ({"source_convert": "python"}, True)])
+def test_deploy_converts_with_sfdx_unless_asked(options, converted_in_process):
+    task = create_task(Deploy, {"path": str(FIXTURE / "force-app"), **options})
+    task.project_config.repo_info["root"] = str(FIXTURE)
+    zf = task._convert_source(FIXTURE / "force-app")
+    assert (zf is not None) == converted_in_process